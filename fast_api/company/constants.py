@@ -36,6 +36,7 @@ class Warehouses:
     cell_not_found = "cell not found"
     condition_not_found = "condition not found"
     box_not_found_id = "box not found by id"
+    products_not_placed = "no cell has room for these products"
 
 
 class Locations:
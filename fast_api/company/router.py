@@ -86,7 +86,7 @@ async def create_company(
             DBUserWithoutId(
                 **{
                     **user,
-                    Users.hashed_password: hash_password(founder.password),
+                    Users.hashed_password: await hash_password(founder.password),
                     Users.role: Roles.director,
                     Users.company: company.company_name,
                 }
@@ -25,6 +25,7 @@ from ..exceptions import (
 from . import constants
 from ..product.constants import Products
 from ..report.constants import Reports
+from ..user.cache import invalidate_users
 
 # Configure logging
 logger = logging.getLogger("company_service")
@@ -96,10 +97,12 @@ async def update_data(name: str, data: dict):
             constants.Company.company_name in data
             and data[constants.Company.company_name] != name
         ):
+            emails = await users_collection.distinct("email", {constants.Company.company: name})
             await users_collection.update_many(
                 {constants.Company.company: name},
                 {"$set": {constants.Company.company: data[constants.Company.company_name]}},
             )
+            await invalidate_users(emails)
     except DuplicateKeyError as e:
         logger.error(f"Duplicate key error: {e}")
         raise CompanyAlredyExist()
@@ -9,6 +9,13 @@ SMTP_PORT = int(config('SMTP_PORT', default=587))
 MAIL_USERNAME = config('MAIL_USERNAME',default="noreply@prometeochain.io")
 MAIL_PASSWORD = config('MAIL_PASSWORD',default="Prometeo-2023!!")
 MAIL_SERVER = config('MAIL_SERVER',default="smtp.hostinger.com")
+REDIS_HOST = config('REDIS_HOST', default="app_redis")
+REDIS_PORT = int(config('REDIS_PORT', default=6379))
+REDIS_PASSWORD = config('REDIS_PASSWORD', default="Qr_@20")
+REDIS_DB = int(config('REDIS_DB', default=0))
+REDIS_MAX_CONNECTIONS = int(config('REDIS_MAX_CONNECTIONS', default=50))
+REDIS_TIMEOUT = float(config('REDIS_TIMEOUT', default=0.5))  # seconds per call
+NOTIFY_CONCURRENCY = int(config('NOTIFY_CONCURRENCY', default=10))  # team notifications delivered at once
 
 
 RACK_SIZE = 20
@@ -4,6 +4,7 @@ class Errors:
     not_found = "Not Found Error"
     invalid_token = "Invalid token or expired token."
     cntv_credentials = "Could not validate credentials"
+    token_revoked = "Token was revoked, log in again."
     permission = "You do not have permissions."
     not_auth = "Not authenticated"
     alr_exists = "Already Exists"
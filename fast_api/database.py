@@ -37,10 +37,18 @@ conditions_collection = db["conditions"]
 racks_collection = db["racks"]
 floors_collection =db["floors"]
 cells_collection = db["cells"]
+occupancy_collection = db["cell_occupancy"]
 boxes_collection = db["boxes"]
 types_collection = db["types"]
 roles_collection = db["roles"]
 permissions_collection =db["permissions"]
+device_keys_collection = db["device_keys"]
+notifications_collection = db["notifications"]
+notification_counters_collection = db["notification_counters"]
+email_outbox_collection = db["email_outbox"]
+email_templates_collection = db["email_templates"]
+scheduled_jobs_collection = db["scheduled_jobs"]
+migrations_collection = db["migrations"]
 # shipment_order_collection = db ["shipments"]
 ###Shutdown event database
 
@@ -348,6 +356,9 @@ async def setup_db():
     {"permission_name":"confirm_location"},
     {"permission_name":"unalocate_product"},
     {"permission_name":"send_to_customer"},
+    ###Device key permissions
+    {"permission_name":"issue_device_key"},
+    {"permission_name":"revoke_device_key"},
     # {"permission_name":""},
     # {"permission_name":""},
     # {"permission_name":""},    
@@ -1,20 +1,25 @@
 # Installed packages
 from fastapi import UploadFile,Cookie
-from typing import Type, List
+from typing import Type, List, Optional
 import uuid
 import magic
 import string
 import random
 import os
 import shutil
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, Request
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError
 from bson.objectid import ObjectId
 
 # Local packages
-from .user.service import get_user_by,get_all_roles_in_company
-from .user.constants import Users, Roles
+from .user.service import get_user_by
+from .user.models import DBUser, Principal
+from .user.permissions import role_permissions
+from .user.cache import get_cached_user, cache_user
+from .user.constants import Users, Roles, Token, DeviceKeys
+from .user.versions import user_version
+from .user.device_keys import verify_device_request
 from .user import utils as user_utils
 from . import utils
 from .exceptions import (
@@ -36,6 +41,8 @@ from .constants import Errors
 from .database import users_collection
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/users/login")
+# Same scheme for routes that also accept signed device requests
+oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="/users/login", auto_error=False)
 
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
@@ -50,10 +57,47 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
             raise HTTPException(status_code=401, detail=Errors.cntv_credentials)
     except JWTError:
         raise HTTPException(status_code=401, detail=Errors.cntv_credentials)
-    user = await get_user_by(Users.email, username)
+    if payload.get(Token.format) == Token.claims:
+        principal = await principal_from_claims(username, payload)
+        if principal is not None:
+            return principal
+    user = await get_cached_user(username)
+    if user is None:
+        user = await cache_user(username, await get_user_by(Users.email, username))
     return user
 
 
+# Scanners sign their requests with a device key instead of sending a bearer token.
+async def get_current_user_or_device(
+    request: Request, token: Optional[str] = Depends(oauth2_scheme_optional)
+):
+    if request.headers.get(DeviceKeys.key_header):
+        return await verify_device_request(request)
+    if token is None:
+        raise HTTPException(status_code=401, detail=Errors.not_auth, headers={"WWW-Authenticate": "Bearer"})
+    return await get_current_user(token)
+
+
+# Principal of a claims token; None when the version is unknown (Redis down or evicted)
+# so the caller falls back to the user lookup.
+async def principal_from_claims(username: str, payload: dict):
+    version = await user_version(username)
+    if version is None:
+        return None
+    if version != payload.get(Token.version):
+        raise HTTPException(status_code=401, detail=Errors.token_revoked)
+    return Principal(
+        id=payload[Token.user_id],
+        email=username,
+        role=payload[Users.role],
+        company=payload[Users.company],
+        warehouse=payload.get(Users.warehouse),
+        firstname=payload.get(Users.firstname),
+        lastname=payload.get(Users.lastname),
+        telephone=payload.get(Users.telephone),
+    )
+
+
 def get_exception_responses(*args: Type[BaseAPIException]) -> dict:
     """Given BaseAPIException classes, return a dict of responses used on FastAPI endpoint definition, with the format:
     {statuscode: schema, statuscode: schema, ...}"""
@@ -68,17 +112,21 @@ def check_role_access(user_role: str, roles: list):
         raise PermissionException
 
 async def user_has_permission(query:dict, required_permission: str):
-    roles = await get_all_roles_in_company(query=query)
-    if len(roles)==0:
+    permissions = await role_permissions(query["company_name"], query["role_name"])
+    if permissions is None:
         raise HTTPException(status_code=403,detail="in company not found this role")
-    role = roles[0]
-    # role = await get_role_by_id(id=role_id)
-    # Получение списка разрешений из объекта роли
-    permissions = [perm["permission_name"] for perm in role["permissions"]]
     if required_permission not in permissions:
         raise PermissionException
 
 
+# Route dependency: Depends(require("create_invoice")) returns the current user if their role has the permission.
+def require(required_permission: str):
+    async def dependency(current_user: DBUser = Depends(get_current_user)) -> DBUser:
+        query = {"role_name": current_user.role, "company_name": current_user.company}
+        await user_has_permission(query, required_permission)
+        return current_user
+
+    return dependency
 
 
 def check_admin_n_manager_access_without_exc(role):
@@ -88,7 +136,7 @@ def check_admin_n_manager_access_without_exc(role):
 async def check_access_n_credentials(
     username, current_username, password, hashed_password, user_role
 ):
-    if username != current_username or not user_utils.verify_password(
+    if username != current_username or not await user_utils.verify_password(
         password, hashed_password
     ):
         if user_role == Roles.admin or user_role == Roles.manager:
@@ -23,6 +23,13 @@ class BadRequest(DetailHttpExceptionn):
     STATUS_CODE = status.HTTP_400_BAD_REQUEST
     DETAIL ="Bad request"
 
+class InvalidPageToken(BadRequest):
+    DETAIL = "Invalid page token"
+
+class InvalidFieldSelector(DetailHttpExceptionn):
+    STATUS_CODE = status.HTTP_422_UNPROCESSABLE_ENTITY
+    DETAIL = "Invalid fields selector"
+
 class AllReadyExists(DetailHttpExceptionn):
     STATUS_CODE = status.HTTP_208_ALREADY_REPORTED
     DETAIL ="Duplicate keys"
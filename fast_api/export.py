@@ -0,0 +1,114 @@
+# Installed packages
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from enum import Enum
+from typing import AsyncIterator, List, Optional
+from bson.objectid import ObjectId
+from fastapi import Query
+from fastapi.responses import StreamingResponse
+
+# Rows are sent in chunks of about this many bytes.
+CHUNK_SIZE = 64 * 1024
+# Documents fetched from Mongo per round trip.
+BATCH_SIZE = 1000
+
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+MEDIA_TYPES = {
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.csv: "text/csv",
+}
+
+
+class ExportParams:
+    """Query parameters shared by the export endpoints."""
+
+    def __init__(
+        self,
+        export_format: ExportFormat = Query(ExportFormat.ndjson, alias="format"),
+        date_from: Optional[datetime] = Query(None, description="created at or after"),
+        date_to: Optional[datetime] = Query(None, description="created before"),
+        status: Optional[str] = Query(None, description="only documents with this status"),
+        compress: bool = Query(False, alias="gzip", description="gzip the stream"),
+    ):
+        self.format = export_format
+        self.date_from = date_from
+        self.date_to = date_to
+        self.status = status
+        self.compress = compress
+
+
+# Narrow a query by creation date (read from _id, so the _id index serves it) and status.
+def apply_export_filters(query: dict, params: ExportParams) -> dict:
+    query = dict(query)
+    created = {}
+    if params.date_from:
+        created["$gte"] = ObjectId.from_datetime(params.date_from)
+    if params.date_to:
+        created["$lt"] = ObjectId.from_datetime(params.date_to)
+    if created:
+        query["_id"] = created
+    if params.status:
+        query["status"] = params.status
+    return query
+
+
+def _csv_value(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str, ensure_ascii=False)
+    return value
+
+
+async def _rows(cursor, export_format: ExportFormat, columns: Optional[List[str]]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = None
+    async for doc in cursor:
+        doc["id"] = str(doc.pop("_id"))
+        if export_format == ExportFormat.ndjson:
+            buffer.write(json.dumps(doc, default=str, ensure_ascii=False))
+            buffer.write("\n")
+        else:
+            if writer is None:
+                fieldnames = ["id"] + [c for c in (columns or doc) if c != "id"]
+                writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction="ignore")
+                writer.writeheader()
+            writer.writerow({key: _csv_value(value) for key, value in doc.items()})
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+async def _gzip(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=31)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+# Stream the documents of a query as NDJSON or CSV without holding them in memory.
+def export_response(
+    collection, query: dict, params: ExportParams, name: str, projection: dict = None
+) -> StreamingResponse:
+    cursor = collection.find(apply_export_filters(query, params), projection).batch_size(BATCH_SIZE)
+    columns = list(projection) if projection else None
+    body = _rows(cursor, params.format, columns)
+    filename = f"{name}.{params.format.value}"
+    media_type = MEDIA_TYPES[params.format]
+    if params.compress:
+        body = _gzip(body)
+        filename += ".gz"
+        media_type = "application/gzip"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    return StreamingResponse(body, media_type=media_type, headers=headers)
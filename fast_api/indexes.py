@@ -0,0 +1,76 @@
+# Installed packages
+import logging
+from typing import Dict, List
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure
+
+# Local packages
+from .database import db
+from .mail.indexes import INDEXES as MAIL_INDEXES
+from .order.indexes import INDEXES as ORDER_INDEXES
+from .product.indexes import INDEXES as PRODUCT_INDEXES
+from .report.indexes import INDEXES as REPORT_INDEXES
+from .scheduler.indexes import INDEXES as SCHEDULER_INDEXES
+from .user.indexes import INDEXES as USER_INDEXES
+from .warehouse.indexes import INDEXES as WAREHOUSE_INDEXES
+from .websocket.indexes import INDEXES as WEBSOCKET_INDEXES
+
+logger = logging.getLogger("indexes")
+
+# Every module declares its indexes next to its service, keyed by collection name.
+REGISTRY = [
+    MAIL_INDEXES,
+    ORDER_INDEXES,
+    PRODUCT_INDEXES,
+    REPORT_INDEXES,
+    SCHEDULER_INDEXES,
+    USER_INDEXES,
+    WAREHOUSE_INDEXES,
+    WEBSOCKET_INDEXES,
+]
+
+# Index options that make two indexes with the same name different.
+INDEX_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+
+def registered_indexes() -> Dict[str, List[IndexModel]]:
+    indexes: Dict[str, List[IndexModel]] = {}
+    for module_indexes in REGISTRY:
+        for collection_name, models in module_indexes.items():
+            indexes.setdefault(collection_name, []).extend(models)
+    return indexes
+
+
+def _same_index(existing: dict, document: dict) -> bool:
+    if [tuple(key) for key in existing["key"]] != [tuple(key) for key in document["key"].items()]:
+        return False
+    return all(existing.get(option) == document.get(option) for option in INDEX_OPTIONS)
+
+
+# Create the declared indexes that are missing and rebuild the ones whose definition changed.
+# Indexes that are not in the registry are left alone.
+async def reconcile_indexes(database=db):
+    for collection_name, models in registered_indexes().items():
+        collection = database[collection_name]
+        existing = await collection.index_information()
+        missing = []
+        for model in models:
+            document = model.document
+            current = existing.get(document["name"])
+            if current is not None and _same_index(current, document):
+                continue
+            if current is not None:
+                logger.info(f"Rebuilding index {collection_name}.{document['name']}")
+                await collection.drop_index(document["name"])
+            missing.append(model)
+        if not missing:
+            continue
+        try:
+            await collection.create_indexes(missing)
+        except OperationFailure as error:
+            logger.warning(f"Could not create indexes on {collection_name}: {error}")
+            continue
+        logger.info(
+            f"Created indexes on {collection_name}: "
+            f"{', '.join(model.document['name'] for model in missing)}"
+        )
@@ -0,0 +1,15 @@
+# Sender of all outgoing mail
+MAIL_FROM = "noreply@prometeochain.io"
+MAIL_STARTTLS = False
+MAIL_SMTP_TIMEOUT = 30  # seconds one SMTP command may take
+MAIL_SMTP_IDLE = 60  # seconds an idle worker keeps its SMTP connection open
+# Outbox workers
+MAIL_WORKERS = 4  # concurrent SMTP connections per process
+MAIL_POLL_INTERVAL = 5  # seconds between outbox polls when nothing was enqueued locally
+MAIL_LEASE_SECONDS = 120  # a claimed email is retried by any worker after this long
+MAIL_MAX_ATTEMPTS = 6
+MAIL_RETRY_BASE = 30  # seconds before the first retry, doubled on every attempt
+MAIL_RETRY_MAX = 3600  # seconds between retries at most
+MAIL_OUTBOX_TTL = 7 * 86400  # seconds sent and failed emails (and their keys) are kept
+# Templates
+MAIL_RENDER_CACHE_SIZE = 256  # rendered emails kept for reminders that resend the same content
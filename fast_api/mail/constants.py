@@ -0,0 +1,28 @@
+class Emails:
+    key = "key"
+    recipient = "recipient"
+    subject = "subject"
+    body = "body"
+    office_email = "office_email"
+    status = "status"
+    attempts = "attempts"
+    next_attempt_at = "next_attempt_at"
+    locked_until = "locked_until"
+    last_error = "last_error"
+    created_at = "created_at"
+    finished_at = "finished_at"
+
+
+class EmailStatus:
+    pending = "pending"
+    sending = "sending"
+    sent = "sent"
+    failed = "failed"
+
+
+# Per-company overrides of the built-in templates
+class Templates:
+    company_name = "company_name"
+    template = "template"
+    subject = "subject"
+    body = "body"
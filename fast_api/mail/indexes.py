@@ -0,0 +1,38 @@
+# Installed packages
+from pymongo import IndexModel, ASCENDING
+
+# Local packages
+from ..database import email_outbox_collection, email_templates_collection
+from .config import MAIL_OUTBOX_TTL
+from .constants import Emails, Templates
+
+INDEXES = {
+    email_outbox_collection.name: [
+        IndexModel(
+            [(Emails.key, ASCENDING)],
+            name="email_outbox_key",
+            unique=True,
+            partialFilterExpression={Emails.key: {"$type": "string"}},
+        ),
+        IndexModel(
+            [(Emails.status, ASCENDING), (Emails.next_attempt_at, ASCENDING)],
+            name="email_outbox_due",
+        ),
+        IndexModel(
+            [(Emails.status, ASCENDING), (Emails.locked_until, ASCENDING)],
+            name="email_outbox_lease",
+        ),
+        IndexModel(
+            [(Emails.finished_at, ASCENDING)],
+            name="email_outbox_ttl",
+            expireAfterSeconds=MAIL_OUTBOX_TTL,
+        ),
+    ],
+    email_templates_collection.name: [
+        IndexModel(
+            [(Templates.company_name, ASCENDING), (Templates.template, ASCENDING)],
+            name="email_templates_company",
+            unique=True,
+        ),
+    ],
+}
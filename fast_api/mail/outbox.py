@@ -0,0 +1,268 @@
+# Installed packages
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import List, Optional
+
+import aiosmtplib
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+# Local packages
+from ..config import MAIL_USERNAME, MAIL_PASSWORD, MAIL_SERVER, SMTP_PORT
+from ..database import email_outbox_collection
+from .config import (
+    MAIL_FROM,
+    MAIL_STARTTLS,
+    MAIL_SMTP_TIMEOUT,
+    MAIL_SMTP_IDLE,
+    MAIL_WORKERS,
+    MAIL_POLL_INTERVAL,
+    MAIL_LEASE_SECONDS,
+    MAIL_MAX_ATTEMPTS,
+    MAIL_RETRY_BASE,
+    MAIL_RETRY_MAX,
+)
+from .constants import Emails, EmailStatus
+
+logger = logging.getLogger("mail")
+
+
+class PermanentMailError(Exception):
+    """The server refused the message for good (5xx); retrying will not help."""
+
+
+class SmtpSender:
+    """One SMTP connection, opened on first use and kept for the following messages.
+
+    A dropped connection is reopened on the next send; `close_if_idle` closes
+    it after MAIL_SMTP_IDLE seconds without mail.
+    """
+
+    def __init__(
+        self,
+        hostname: str = MAIL_SERVER,
+        port: int = SMTP_PORT,
+        username: Optional[str] = MAIL_USERNAME,
+        password: Optional[str] = MAIL_PASSWORD,
+        start_tls: bool = MAIL_STARTTLS,
+        sender: str = MAIL_FROM,
+    ):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.start_tls = start_tls
+        self.sender = sender
+        self._client: Optional[aiosmtplib.SMTP] = None
+        self.used_at = 0.0
+        self.connections = 0
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        client = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            timeout=MAIL_SMTP_TIMEOUT,
+            start_tls=self.start_tls,
+        )
+        await client.connect()
+        if self.username:
+            await client.login(self.username, self.password)
+        self.connections += 1
+        return client
+
+    def message(self, recipient: str, subject: str, body: str) -> EmailMessage:
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = recipient
+        message["Subject"] = subject
+        message.set_content(body, subtype="html")
+        return message
+
+    async def send(self, recipient: str, subject: str, body: str):
+        if self._client is None or not self._client.is_connected:
+            self._client = await self._connect()
+        try:
+            await self._client.send_message(self.message(recipient, subject, body))
+        except aiosmtplib.SMTPRecipientsRefused as error:
+            raise PermanentMailError(str(error))
+        except aiosmtplib.SMTPResponseException as error:
+            if 500 <= error.code < 600:
+                raise PermanentMailError(f"{error.code} {error.message}")
+            await self.close()
+            raise
+        except (aiosmtplib.SMTPException, OSError, asyncio.TimeoutError):
+            await self.close()
+            raise
+        self.used_at = time.monotonic()
+
+    async def close_if_idle(self):
+        if self._client is not None and time.monotonic() - self.used_at > MAIL_SMTP_IDLE:
+            await self.close()
+
+    async def close(self):
+        client, self._client = self._client, None
+        if client is None or not client.is_connected:
+            return
+        try:
+            await client.quit()
+        except (aiosmtplib.SMTPException, OSError, asyncio.TimeoutError):
+            client.close()
+
+
+def backoff(attempts: int, base: float = MAIL_RETRY_BASE, limit: float = MAIL_RETRY_MAX) -> float:
+    return min(base * 2 ** (attempts - 1), limit)
+
+
+class MailOutbox:
+    """Emails waiting in Mongo, sent by a pool of workers that each keep one SMTP connection.
+
+    Handlers only `enqueue`. A worker claims the next due email with one
+    find_one_and_update that leases it for MAIL_LEASE_SECONDS, so workers of
+    all processes share the collection and an email whose worker died is
+    picked up again. Failures are retried with exponential backoff up to
+    MAIL_MAX_ATTEMPTS; 5xx answers fail at once. An idempotency key makes a
+    repeated enqueue a no-op while the first email is kept (MAIL_OUTBOX_TTL).
+    """
+
+    def __init__(
+        self,
+        collection=email_outbox_collection,
+        workers: int = MAIL_WORKERS,
+        sender_factory=SmtpSender,
+        max_attempts: int = MAIL_MAX_ATTEMPTS,
+        retry_base: float = MAIL_RETRY_BASE,
+        poll_interval: float = MAIL_POLL_INTERVAL,
+    ):
+        self.collection = collection
+        self.workers = workers
+        self.sender_factory = sender_factory
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.poll_interval = poll_interval
+        self.senders: List[SmtpSender] = []
+        self._tasks: List[asyncio.Task] = []
+        self._wake = asyncio.Event()
+
+    # Store an email for the workers; returns its id, or the id of the email already stored under `key`.
+    async def enqueue(
+        self,
+        recipient: str,
+        subject: str,
+        body: str,
+        key: Optional[str] = None,
+        office_email: Optional[str] = None,
+    ) -> str:
+        now = datetime.utcnow()
+        email = {
+            Emails.recipient: recipient,
+            Emails.subject: subject,
+            Emails.body: body,
+            Emails.office_email: office_email,
+            Emails.status: EmailStatus.pending,
+            Emails.attempts: 0,
+            Emails.next_attempt_at: now,
+            Emails.created_at: now,
+        }
+        if key is not None:
+            email[Emails.key] = key
+        try:
+            result = await self.collection.insert_one(email)
+        except DuplicateKeyError:
+            existing = await self.collection.find_one({Emails.key: key}, {"_id": 1})
+            return str(existing["_id"])
+        self._wake.set()
+        return str(result.inserted_id)
+
+    async def claim(self) -> Optional[dict]:
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            {
+                "$or": [
+                    {Emails.status: EmailStatus.pending, Emails.next_attempt_at: {"$lte": now}},
+                    {Emails.status: EmailStatus.sending, Emails.locked_until: {"$lt": now}},
+                ]
+            },
+            {
+                "$set": {
+                    Emails.status: EmailStatus.sending,
+                    Emails.locked_until: now + timedelta(seconds=MAIL_LEASE_SECONDS),
+                },
+                "$inc": {Emails.attempts: 1},
+            },
+            sort=[(Emails.next_attempt_at, 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def deliver(self, sender: SmtpSender, email: dict):
+        try:
+            await sender.send(email[Emails.recipient], email[Emails.subject], email[Emails.body])
+        except Exception as error:
+            await self._failed(email, error)
+            return
+        await self.collection.update_one(
+            {"_id": email["_id"]},
+            {
+                "$set": {Emails.status: EmailStatus.sent, Emails.finished_at: datetime.utcnow()},
+                "$unset": {Emails.locked_until: ""},
+            },
+        )
+
+    async def _failed(self, email: dict, error: Exception):
+        now = datetime.utcnow()
+        attempts = email[Emails.attempts]
+        update = {Emails.last_error: repr(error)}
+        if isinstance(error, PermanentMailError) or attempts >= self.max_attempts:
+            logger.error(f"email {email['_id']} to {email[Emails.recipient]} failed: {error!r}")
+            update.update({Emails.status: EmailStatus.failed, Emails.finished_at: now})
+        else:
+            delay = backoff(attempts, self.retry_base)
+            logger.warning(f"email {email['_id']} attempt {attempts} failed, retry in {delay}s: {error!r}")
+            update.update({
+                Emails.status: EmailStatus.pending,
+                Emails.next_attempt_at: now + timedelta(seconds=delay),
+            })
+        await self.collection.update_one(
+            {"_id": email["_id"]}, {"$set": update, "$unset": {Emails.locked_until: ""}}
+        )
+
+    async def _work(self, sender: SmtpSender):
+        while True:
+            # Cleared before the claim, so an enqueue after a miss still wakes the wait below.
+            self._wake.clear()
+            try:
+                email = await self.claim()
+            except PyMongoError as error:
+                logger.warning(f"email outbox claim failed: {error!r}")
+                email = None
+            if email is not None:
+                try:
+                    await self.deliver(sender, email)
+                except PyMongoError as error:
+                    # The lease runs out and another attempt is made.
+                    logger.warning(f"email outbox update failed: {error!r}")
+                continue
+            await sender.close_if_idle()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._tasks:
+            return
+        self.senders = [self.sender_factory() for _ in range(self.workers)]
+        self._tasks = [asyncio.create_task(self._work(sender)) for sender in self.senders]
+
+    async def stop(self):
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for sender in self.senders:
+            await sender.close()
+
+
+outbox = MailOutbox()
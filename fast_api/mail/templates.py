@@ -0,0 +1,117 @@
+# Installed packages
+import logging
+import os.path as path
+from functools import lru_cache
+from typing import Dict, Optional, Tuple, Type
+
+from jinja2 import Environment, FileSystemLoader, Template, TemplateError, select_autoescape
+from jinja2.exceptions import SecurityError
+from jinja2.sandbox import SandboxedEnvironment
+from pydantic import BaseModel
+
+# Local packages
+from ..database import email_templates_collection
+from .config import MAIL_RENDER_CACHE_SIZE
+from .constants import Templates
+
+logger = logging.getLogger("mail")
+
+TEMPLATE_DIRECTORY = path.join(path.dirname(__file__), "templates")
+
+
+### Contexts: the fields each template may use
+
+class OrderConfirmation(BaseModel):
+    order_id: str
+    email: str
+    password: str
+    verification_code: str
+
+
+class OrderReady(BaseModel):
+    order_id: str
+
+
+class EmailTemplate:
+    def __init__(self, name: str, context: Type[BaseModel], subject: str):
+        self.name = name
+        self.context = context
+        self.subject = subject
+
+
+TEMPLATES = {
+    template.name: template
+    for template in [
+        EmailTemplate("order_confirmation", OrderConfirmation, "Order Confirmation"),
+        EmailTemplate("order_ready", OrderReady, "Your order is ready"),
+    ]
+}
+
+
+class TemplateRegistry:
+    """Email templates compiled once, with per-company overrides.
+
+    The built-in templates are read from fast_api/mail/templates. A company
+    can replace any of them with a document in email_templates, looked up by
+    company_name; overrides come from the database, so they are compiled in a
+    sandbox when loaded at startup, and one that reaches for unsafe attributes
+    falls back to the built-in template. Rendered
+    emails can be cached (MAIL_RENDER_CACHE_SIZE) for reminders that send the
+    same content again and again.
+    """
+
+    def __init__(self, directory: str = TEMPLATE_DIRECTORY, collection=email_templates_collection):
+        self.environment = Environment(
+            loader=FileSystemLoader(directory), autoescape=select_autoescape(default=True)
+        )
+        self.sandbox = SandboxedEnvironment(autoescape=True)
+        self.collection = collection
+        self._templates: Dict[str, Template] = {}
+        # (company_name, template) -> (subject, compiled body)
+        self._overrides: Dict[Tuple[str, str], Tuple[Optional[str], Template]] = {}
+        self._render_cached = lru_cache(MAIL_RENDER_CACHE_SIZE)(self._render)
+
+    def load(self):
+        self._templates = {
+            name: self.environment.get_template(f"{name}.html") for name in TEMPLATES
+        }
+        self._render_cached.cache_clear()
+
+    async def load_overrides(self):
+        overrides = {}
+        async for document in self.collection.find({}, {"_id": 0}):
+            name = document[Templates.template]
+            if name not in TEMPLATES:
+                continue
+            try:
+                body = self.sandbox.from_string(document[Templates.body])
+            except TemplateError as error:
+                logger.warning(f"template {name} of {document[Templates.company_name]} does not compile: {error!r}")
+                continue
+            overrides[(document[Templates.company_name], name)] = (document.get(Templates.subject), body)
+        self._overrides = overrides
+        self._render_cached.cache_clear()
+
+    def _render(self, name: str, context_json: str, company: Optional[str]) -> Tuple[str, str]:
+        template = TEMPLATES[name]
+        context = template.context.model_validate_json(context_json).model_dump()
+        override = self._overrides.get((company, name))
+        if override is not None:
+            subject, body = override
+            try:
+                return subject or template.subject, body.render(**context)
+            except SecurityError as error:
+                logger.warning(f"template {name} of {company} was refused by the sandbox: {error!r}")
+        return template.subject, self._templates[name].render(**context)
+
+    # Subject and HTML body of a template for a company; `cached` only for content sent repeatedly.
+    def render(self, name: str, context: BaseModel, company: Optional[str] = None, cached: bool = False) -> Tuple[str, str]:
+        if not isinstance(context, TEMPLATES[name].context):
+            raise TypeError(f"{name} renders {TEMPLATES[name].context.__name__}, not {type(context).__name__}")
+        if not self._templates:
+            self.load()
+        render = self._render_cached if cached else self._render
+        return render(name, context.model_dump_json(), company)
+
+
+templates = TemplateRegistry()
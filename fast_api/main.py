@@ -21,8 +21,9 @@ from .report.router import router as report_router
 from .company.router import company_router
 from .order.router import router as order_router
 from .order.salesman_router import salesman_router
-from .websocket.router import router as websocket_router
+from .websocket.router import router as websocket_router, manager as websocket_manager
 from .shipment_order.shipment_router import router as shipment_router
+from .scheduler.router import router as scheduler_router
 from .warehouse.router import warehouse_router 
 from .warehouse.category_router import category_router
 from .warehouse.zone_router import zone_router
@@ -42,6 +43,14 @@ from .config import (
 )
 import logging
 from .database import setup_db,shudown_database
+from .indexes import reconcile_indexes
+from .redis import init_redis, close_redis
+from .user.passwords import password_pool
+from .mail.outbox import outbox as mail_outbox
+from .scheduler.jobs import scheduler
+from .mail.templates import templates as email_templates
+from .warehouse.occupancy import migrate_cell_products
+from .user.device_keys import DeviceBodyHashMiddleware
 
 logging.basicConfig(
     # for example logging.getLogger("example_logger")  name ="example_logger"
@@ -85,6 +94,7 @@ app.include_router(product_router)
 app.include_router(report_router)
 app.include_router(websocket_router)
 app.include_router(shipment_router)
+app.include_router(scheduler_router)
 
 
 origins = ["*"]
@@ -96,6 +106,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(DeviceBodyHashMiddleware)
 
 @app.get("/",response_model=dict)
 async def root():
@@ -104,12 +115,25 @@ async def root():
 @app.on_event("startup")
 async def startup_event():
     await setup_db()
+    await init_redis()
+    await reconcile_indexes()
+    await migrate_cell_products()
+    email_templates.load()
+    await email_templates.load_overrides()
+    await websocket_manager.start()
+    mail_outbox.start()
+    scheduler.start()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    await websocket_manager.stop()
+    await scheduler.stop()
+    await mail_outbox.stop()
     # Close the database connection
     await shudown_database()
+    await close_redis()
+    password_pool.shutdown()
 
 @app.exception_handler(BaseAPIException)
 async def base_exception_handler(request: Request, exc: BaseAPIException):
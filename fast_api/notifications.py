@@ -0,0 +1,61 @@
+# Installed packages
+import asyncio
+import logging
+from typing import List, Optional
+
+# Local packages
+from .config import NOTIFY_CONCURRENCY
+from .order.email_sender import send_email_to_client
+from .user.service import update_users_order_status
+from .websocket.router import manager
+
+logger = logging.getLogger("notifications")
+
+
+async def _deliver(semaphore: asyncio.Semaphore, channel: str, user_id: str, send) -> bool:
+    async with semaphore:
+        try:
+            await send
+            return True
+        except Exception as error:
+            logger.warning(f"{channel} notification to {user_id} failed: {error!r}")
+            return False
+
+
+# Tell a team about a new order status: the status of every member, then the WebSocket
+# messages and emails of all members at once, at most NOTIFY_CONCURRENCY calls in flight.
+# Returns what reached each member.
+async def notify_team(
+    team: List[dict],
+    order_id: str,
+    status: str,
+    message: dict,
+    subject: str,
+    description: str,
+    office_email: Optional[str] = None,
+) -> List[dict]:
+    semaphore = asyncio.Semaphore(NOTIFY_CONCURRENCY)
+    updated = await update_users_order_status(
+        [user["id"] for user in team], order_id, status, semaphore
+    )
+    deliveries = []
+    for user in team:
+        email_data = {
+            "office_email": office_email,
+            "order_id": order_id,
+            "recipient_email": user["email"],
+            "description": description,
+            "subject": subject,
+        }
+        deliveries.append(_deliver(semaphore, "websocket", user["id"], manager.send_message(user["id"], message)))
+        deliveries.append(_deliver(semaphore, "email", user["id"], send_email_to_client(email_data)))
+    delivered = await asyncio.gather(*deliveries)
+    return [
+        {
+            "user_id": user["id"],
+            "status_updated": user["id"] in updated,
+            "websocket": delivered[2 * i],
+            "email": delivered[2 * i + 1],
+        }
+        for i, user in enumerate(team)
+    ]
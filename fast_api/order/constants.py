@@ -44,3 +44,46 @@ class Messages:
     status_started = "started"
     order_not_found_by_id = "order not found by id"
     poduct_by_name = "not found product in this order"
+
+
+# Every status an order can have; the values are the ones already stored.
+class OrderStatus:
+    added = Messages.st_or_added
+    # Held by a salesman registration while it uploads the document and places the products
+    recording = "recording_order"
+    recorded = Messages.status_salesman_recorded
+    invoiced = Messages.status_invoiced
+    approved = Messages.status_approve
+    failed = Messages.status_failed
+    started = Messages.status_started
+    documents_verified = "all_documents_verifed"
+    completed = Messages.or_compl_scs
+    waiting_for_customer = "waiting_for_customer"
+    divided = "divided_order"
+    # Set when a rental order is created and never entered by a transition
+    rental = "rental_order"
+
+
+# Statuses of orders nobody works on any more
+FINISHED_STATUSES = (OrderStatus.completed, OrderStatus.failed, OrderStatus.divided)
+
+
+# Target status -> statuses an order may be in to move there.
+TRANSITIONS = {
+    OrderStatus.recording: (OrderStatus.added,),
+    # A registration that failed hands the order back
+    OrderStatus.added: (OrderStatus.recording,),
+    OrderStatus.recorded: (OrderStatus.recording,),
+    OrderStatus.invoiced: (OrderStatus.recorded,),
+    OrderStatus.divided: (OrderStatus.added, OrderStatus.recorded),
+    OrderStatus.approved: (OrderStatus.invoiced,),
+    OrderStatus.failed: (OrderStatus.invoiced,),
+    OrderStatus.started: (OrderStatus.approved,),
+    OrderStatus.documents_verified: (OrderStatus.approved, OrderStatus.started),
+    OrderStatus.completed: (OrderStatus.started, OrderStatus.documents_verified),
+    OrderStatus.waiting_for_customer: (
+        OrderStatus.documents_verified,
+        OrderStatus.completed,
+        OrderStatus.waiting_for_customer,
+    ),
+}
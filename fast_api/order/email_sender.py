@@ -1,45 +1,38 @@
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-import asyncio
-# Создайте асинхронное средство планирования
-scheduler = AsyncIOScheduler()
-from apscheduler.triggers.interval import IntervalTrigger
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from ..config import MAIL_USERNAME,MAIL_PASSWORD,MAIL_SERVER,SMTP_PORT
+from typing import Optional, Union
+from pydantic import BaseModel
+from ..mail.outbox import outbox
+from ..mail.templates import TEMPLATES, templates
 
 
-scheduler = AsyncIOScheduler()
-
-
-async def send_email_to_client(email_data:dict):
-    conf = ConnectionConfig(
-        # email_data["office_email"]
-        # email_data["office_password"]
-    MAIL_USERNAME=MAIL_USERNAME,
-    MAIL_PASSWORD=MAIL_PASSWORD,
-    MAIL_FROM="noreply@prometeochain.io",
-    MAIL_PORT=SMTP_PORT,
-    MAIL_SERVER=MAIL_SERVER,
-    MAIL_STARTTLS=False,  # Add this line
-    MAIL_SSL_TLS=False,  # Add this line 
-    )
-    print("hello worls")
-    # Конфигурация FastMail
-    fastmail = FastMail(conf)
-    message = MessageSchema(
+# Only stores the email; the outbox workers send it. Emails with the same key are sent once.
+async def send_email_to_client(email_data:dict, key: Optional[str] = None):
+    return await outbox.enqueue(
+        recipient=email_data["recipient_email"],
         subject=email_data["subject"],
-        # email_data["recipient_email"]
-        recipients=[email_data["recipient_email"]],
         body=email_data["description"],
-        subtype="html"
+        key=key,
+        office_email=email_data.get("office_email"),
     )
-    await fastmail.send_message(message, MessageType.plain)
 
-    
-scheduler.start()
 
-# Дождитесь выполнения всех задач и затем завершите приложение
-# try:
-#     asyncio.get_event_loop().run_forever()
-# except (KeyboardInterrupt, SystemExit):
-#     print("Завершение работы...")
-#     scheduler.shutdown()
\ No newline at end of file
+# Render a registered template for the company and queue it. The context may be a dict,
+# as stored in scheduled reminder jobs; reminders pass cached=True to render it once.
+async def send_template_email(
+    template: str,
+    context: Union[BaseModel, dict],
+    recipient_email: str,
+    company: Optional[str] = None,
+    office_email: Optional[str] = None,
+    key: Optional[str] = None,
+    cached: bool = False,
+):
+    if isinstance(context, dict):
+        context = TEMPLATES[template].context(**context)
+    subject, body = templates.render(template, context, company, cached=cached)
+    email_data = {
+        "office_email": office_email,
+        "recipient_email": recipient_email,
+        "description": body,
+        "subject": subject,
+    }
+    return await send_email_to_client(email_data, key=key)
@@ -0,0 +1,45 @@
+# Installed packages
+from pymongo import IndexModel, ASCENDING, DESCENDING
+
+# Local packages
+from ..database import orders_collection
+from ..user.constants import Users
+from .constants import Orders
+
+# Partial indexes cannot express the "deletionDate $exists false" soft-delete filter,
+# so deletionDate is the last key of every index used together with it, followed by _id
+# on the indexes behind paginated lists, which find_page sorts newest first.
+INDEXES = {
+    orders_collection.name: [
+        IndexModel(
+            [(Orders.recipient, ASCENDING), (Orders.deletionDate, ASCENDING), ("_id", DESCENDING)],
+            name="orders_recipient_live",
+        ),
+        IndexModel(
+            [(Orders.warehouse, ASCENDING), (Orders.deletionDate, ASCENDING), ("_id", DESCENDING)],
+            name="orders_warehouse_live",
+        ),
+        IndexModel(
+            [
+                (Orders.warehouse, ASCENDING),
+                (Orders.warehouse_team + "." + Users.id, ASCENDING),
+                (Orders.deletionDate, ASCENDING),
+                ("_id", DESCENDING),
+            ],
+            name="orders_warehouse_team_live",
+        ),
+        IndexModel(
+            [(Orders.warehouse_team + "." + Users.id, ASCENDING), (Orders.deletionDate, ASCENDING)],
+            name="orders_team_member_live",
+        ),
+        IndexModel(
+            [(Orders.salesman_id, ASCENDING), (Orders.deletionDate, ASCENDING), ("_id", DESCENDING)],
+            name="orders_salesman_live",
+        ),
+        IndexModel(
+            [(Orders.e_mail, ASCENDING), (Orders.deletionDate, ASCENDING)],
+            name="orders_client_live",
+        ),
+        IndexModel([("main_order_id", ASCENDING)], name="orders_main_order"),
+    ],
+}
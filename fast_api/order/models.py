@@ -292,4 +292,18 @@ class SubOrders(BaseModel):
                     }
                 ]
             }
-        }
\ No newline at end of file
+        }
+
+class BatchAllocation(BaseModel):
+    order_ids: List[str] = Field(..., description="orders whose products are placed together", min_length=1)
+    warehouse_name: str = Field(..., description="Warehouse name", max_length=100)
+    preview: bool = Field(default=True, description="only return the plan, do not reserve cells")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "order_ids": ["64f0c2a1e4b0a1b2c3d4e5f6", "64f0c2a1e4b0a1b2c3d4e5f7"],
+                "warehouse_name": "warehouse1",
+                "preview": True,
+            }
+        }
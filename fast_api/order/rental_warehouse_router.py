@@ -13,6 +13,7 @@ from ..user.models import DBUser
 from ..user.constants import Roles
 from ..dependencies import get_current_user, check_role_access
 from .models import RentalData,RentCellByClient
+from ..pagination import CursorPage, CursorParams, fields_projection
 
 # Create a router to handle requests related to rentals
 rental_router = APIRouter(prefix="/rental", tags=["rental"])
@@ -45,10 +46,14 @@ async def get_rental_order_by_id(order_id: str, current_user: DBUser = Depends(g
     return order_data
 
 # Handler for GET requests to retrieve all rental orders
-@rental_router.get("/", response_model=list)
-async def get_all_rental_orders(current_user: DBUser = Depends(get_current_user)):
+@rental_router.get("/", response_model=CursorPage[dict])
+async def get_all_rental_orders(
+    params: CursorParams = Depends(),
+    projection: Optional[dict] = Depends(fields_projection),
+    current_user: DBUser = Depends(get_current_user),
+):
     # Check the access for the current user based on their role
     check_role_access(current_user.role, [Roles.manager, Roles.admin, Roles.director, Roles.client])
     # Retrieve all rental orders associated with the current user
-    orders = await service.return_all_orders(user_id=current_user.id, role=current_user.role, company=current_user.company, warehouse=current_user.warehouse)
+    orders = await service.return_all_orders(user_id=current_user.id, role=current_user.role, company=current_user.company, warehouse=current_user.warehouse, params=params, projection=projection)
     return orders
@@ -1,15 +1,14 @@
 # Installed packages
 from fastapi import APIRouter, Query, File, Depends, UploadFile
 from fastapi.params import Path
+from fastapi.responses import StreamingResponse
 from typing import Union, Optional,List
 from fastapi_pagination import Page, paginate, add_pagination
 from bson import ObjectId
 from datetime import datetime,timedelta
-import json
 
 # Local packages
 # from ..websocket.manager import ConnectionManager
-from ..warehouse.service import get_product_warehouse_category
 from ..redis import redis_set, redis_verify, delete
 from ..dependencies import (
     get_exception_responses,
@@ -42,6 +41,8 @@ from ..exceptions import (
 # from ..service import check_company_warehouse
 from ..user.utils import hash_password
 from ..responses import Success
+from ..pagination import CursorPage, CursorParams, fields_projection
+from ..export import ExportParams
 from ..user.models import DBUser
 from ..product.models import ManagerSideProduct
 from ..company.service import (
@@ -51,8 +52,9 @@ from ..company.service import (
 from ..company.constants import Company, Warehouses
 from ..websocket.router import manager
 from . import service
-from .email_sender import send_email_to_client
-from .constants import Orders, Messages
+from .email_sender import send_template_email
+from ..mail.templates import OrderConfirmation
+from .constants import Orders, Messages, OrderStatus
 from .models import Order, SalesmanSideOrder, OrderWithId
 from ..config import URL_PARTS, DOCUMENTS_DIRECTORY, MAX_DOCUMENT_UPLOAD_SIZE
 from urllib.parse import quote, unquote
@@ -95,27 +97,46 @@ async def start_work(order_id: str, current_user: DBUser = Depends(get_current_u
     # Send a WebSocket message to inform the user.
     await manager.send_message(
         current_user.id,
-        json.dumps(
-            {Users.role: current_user.role, Orders.status: Messages.status_started}
-        ),
+        {Users.role: current_user.role, Orders.status: Messages.status_started},
     )
     return {"success": "started working"}
 
 # Handler to retrieve a paginated list of all orders.
 @router.get(
     "/",
-    response_model=Page[dict],
+    response_model=CursorPage[dict],
     responses=get_exception_responses(UnauthorizedException, PermissionException),
 )
-async def get_all_orders(current_user: DBUser = Depends(get_current_user)):
+async def get_all_orders(
+    params: CursorParams = Depends(),
+    projection: Optional[dict] = Depends(fields_projection),
+    current_user: DBUser = Depends(get_current_user),
+):
     # Retrieve orders based on user's role and access.
     await user_has_permission({"role_name":current_user.role,"company_name":current_user.company},
                               required_permission="view_all_orders")
     orders = await service.return_all_orders(
-        current_user.id, current_user.role, current_user.company, current_user.warehouse
+        current_user.id, current_user.role, current_user.company, current_user.warehouse, params, projection
+    )
+    return orders
+
+# Handler to stream all orders the user can see as NDJSON or CSV.
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses=get_exception_responses(UnauthorizedException, PermissionException),
+)
+async def export_orders(
+    params: ExportParams = Depends(),
+    projection: Optional[dict] = Depends(fields_projection),
+    current_user: DBUser = Depends(get_current_user),
+):
+    await user_has_permission({"role_name":current_user.role,"company_name":current_user.company},
+                              required_permission="view_all_orders")
+    return service.export_orders(
+        current_user.id, current_user.role, current_user.company, current_user.warehouse,
+        params, projection,
     )
-    # return orders
-    return paginate(orders)
 
 # Handler to retrieve detailed information about a specific order.
 @router.get(
@@ -192,7 +213,7 @@ async def create_order(
     
     # Generate a random password for the client user.
     password = await generate_random_password()
-    hashed_password = hash_password(password=password)
+    hashed_password = await hash_password(password=password)
     verification_code = await generate_random_code()
     # Create a user object for the client.
     user ={
@@ -222,44 +243,21 @@ async def create_order(
     order_id = await service.register_order(order)
     await add_order_to_salesman(salesman_id, order_id)
     
-    # Prepare an email description for the client.
-    description = f"""
-        <html>
-        <head>
-            <style>
-                /* Добавьте стили CSS по вашему усмотрению */
-            </style>
-        </head>
-        <body>
-            <p>Dear Valued Client,</p>
-            <p>Thank you for your order. We have received and saved it with the following details:</p>
-            <ul>
-                <li>Order ID: {order_id}</li>
-                <li>Your login credentials for the warehouse management system are:</li>
-                <ul>
-                    <li>Email: {user['email']}</li>
-                    <li>Password: {password}</li>
-                    <li>Verification code: {verification_code}</li>
-                </ul>
-                <li>Website: <a href="https://warehouse-main.vercel.app/auth/verification">Use this link</a></li>
-            </ul>
-            <p>Please login using these credentials to view the status of your order, track shipments, and manage any additional orders.</p>
-            <p>If you have any other questions, please contact us at <a href="mailto:noreply@prometeochain.io">noreply@prometeochain.io</a>. We're here to help!</p>
-            <p>Thank you for choosing us. Have a great day!</p>
-        </body>
-        </html>
-        """
-    
-    # Prepare email data and send an order confirmation email to the client.
-    email_data ={
-        "office_email":company_data["office_email"],
-        # "office_password":company_data["office_password"],
-        "order_id":order_id,
-        "recipient_email":order["e_mail"],
-        "description" : description,
-        "subject":"Order Confirmation",
-    }
-    await send_email_to_client(email_data=email_data)
+    # Send the order confirmation with the client's credentials.
+    context = OrderConfirmation(
+        order_id=order_id,
+        email=user["email"],
+        password=password,
+        verification_code=str(verification_code),
+    )
+    await send_template_email(
+        "order_confirmation",
+        context,
+        order["e_mail"],
+        company=company,
+        office_email=company_data["office_email"],
+        key=f"order-confirmation:{order_id}",
+    )
     # await delete(token)
     await service.delete_token(token)
 
@@ -343,10 +341,6 @@ async def manager_register(
         # )
         # Convert the ManagerSideProduct input to a dictionary.
         data = workers.dict() 
-        # Check the coherence and status of the order.
-        await service.check_coherence(
-            {Orders.id: order_id, Orders.status: Messages.status_invoiced}
-        )
         
         # Extract relevant data from the input.
         extracted_data = {
@@ -364,10 +358,9 @@ async def manager_register(
         user_order.pop("warehouse_team")
         user_order.pop("place")
         user_order.update({"status": "not started"})
-        # Update the order with the invoice data.
+        # Store the invoice data; only a recorded order can be invoiced.
         data[Users.manager_id] = current_user.id
-        data[Orders.status] = Messages.status_invoiced
-        await service.update_order_invoice(order_id, data)
+        await service.transition_order(order_id, OrderStatus.invoiced, data, projection={Orders.id: 1})
         # Get the list of users associated with the order.
         users = data[Orders.warehouse_team]
         # Add the order to the users.
@@ -387,7 +380,7 @@ async def manager_register(
     "/{order_id}/approve",
     response_model=Success,
     responses=get_exception_responses(
-        UnauthorizedException, PermissionException, DoesNotExist
+        UnauthorizedException, PermissionException, LogicBrokenException
     ),
 )
 async def approve_order_products(
@@ -402,15 +395,21 @@ async def approve_order_products(
     # check_role_access(current_user.role, [Roles.manager])
     # Determine the order status based on the approval decision.
     if approve:
-        status = Messages.status_approve
+        status = OrderStatus.approved
     else:
-        status = Messages.status_failed
-    # Update the order status.
-    await service.update_order_status(order_id, status)
+        status = OrderStatus.failed
+    # Update the order status; only an invoiced order can be approved or rejected.
+    await service.transition_order(order_id, status, projection={Orders.id: 1})
     return {Messages.message: Messages.or_approv_scs}
 
 # Handler to update the status of an order for loaders.
-@router.put("/{order_id}/loader", response_model=Success)
+@router.put(
+    "/{order_id}/loader",
+    response_model=Success,
+    responses=get_exception_responses(
+        UnauthorizedException, PermissionException, LogicBrokenException
+    ),
+)
 async def update_status(
     order_id: str, current_user: DBUser = Depends(get_current_user)
 ):
@@ -422,8 +421,8 @@ async def update_status(
     await user_has_permission(query,"update_order_status")
     # check_role_access(current_user.role, [Roles.loader])
     # Update the order status to indicate completion.
-    order_data = await service.update_order_status(order_id, Messages.or_compl_scs)
-    return order_data
+    await service.transition_order(order_id, OrderStatus.completed, projection={Orders.id: 1})
+    return {Messages.message: Messages.or_compl_scs}
 # Add pagination support to the router.
 
 add_pagination(router)
@@ -2,10 +2,12 @@
 from fastapi import APIRouter, File, Depends, UploadFile, Path
 from fastapi_pagination import Page, paginate, add_pagination
 from bson.objectid import ObjectId
+from typing import Optional
 from datetime import datetime
 
 # Import local packages and services
-from ..warehouse.service import get_product_warehouse_category, boxes_with_product
+from ..warehouse.service import allocate_products, place_all_products, boxes_with_product
+from ..warehouse.occupancy import release_placements
 from ..dependencies import (
     get_exception_responses,
     get_current_user,
@@ -18,6 +20,7 @@ from ..exceptions import (
     PermissionException,
     DoesNotExist,
     AlreadyExistsException,
+    LogicBrokenException,
     NotFoundException,
     ConflictException,
     EmptyFileUploadException,
@@ -28,8 +31,9 @@ from ..user.models import DBUser
 from ..company.service import check_order_company_and_or_warehouse
 from ..company.constants import Company
 from . import service
-from .constants import Orders, Messages
-from .models import SalesmanSideOrder, SalesmanProductTobox, SubOrders
+from .constants import Orders, Messages, OrderStatus
+from .models import SalesmanSideOrder, SalesmanProductTobox, SubOrders, BatchAllocation
+from ..pagination import CursorPage, CursorParams, fields_projection
 from ..config import URL_PARTS, DOCUMENTS_DIRECTORY, MAX_DOCUMENT_UPLOAD_SIZE
 from urllib.parse import quote
 
@@ -80,8 +84,8 @@ async def generate_url_update(
         "company_name": current_user.company
     }
     await user_has_permission(query=query, required_permission="generate_order_update_url")
-    # Retrieve the existing order by its ID
-    order = await service.get_order_by_id(order_id)
+    # Check that the order exists
+    order = await service.get_order_by_id(order_id, projection={"_id": 1})
     # Generate a unique URL token
     token = await generate_unique_url()
     encoded_token = quote(token)
@@ -97,9 +101,12 @@ async def generate_url_update(
     return {"url_link": url, "createdAt": created_at}
 
 # Endpoint to get all sub-orders by a main order ID
-@salesman_router.get("/{order_id}", response_model=Page[dict])
+@salesman_router.get("/{order_id}", response_model=CursorPage[dict])
 async def get_all_sub_order_by_order_id(
-    order_id: str, current_user: DBUser = Depends(get_current_user)
+    order_id: str,
+    params: CursorParams = Depends(),
+    projection: Optional[dict] = Depends(fields_projection),
+    current_user: DBUser = Depends(get_current_user),
 ):
     # Check for user permissions
     query = {
@@ -112,7 +119,7 @@ async def get_all_sub_order_by_order_id(
     query = {
         "main_order_id": order_id
     }
-    sub_orders = await service.get_all_sub_orders(query=query)
+    sub_orders = await service.get_all_sub_orders(query=query, params=params, projection=projection)
     return sub_orders
 
 # ... (other endpoints with comments)
@@ -125,8 +132,8 @@ async def create_sub_order(orders: SubOrders, current_user: DBUser = Depends(get
         "company_name": current_user.company
     }
     await user_has_permission(query=query, required_permission="create_sub_order")
-    # Retrieve the main order by its ID
-    _ = await service.get_order_by_id(order_id=orders.order_id)
+    # Mark the main order as divided; fails unless it is still added or recorded
+    await service.transition_order(orders.order_id, OrderStatus.divided, projection={Orders.id: 1})
     # Initialize an empty list to store sub-order IDs
     orders_id = []
     # Loop through the sub-orders and create them
@@ -135,8 +142,8 @@ async def create_sub_order(orders: SubOrders, current_user: DBUser = Depends(get
         order_id = await service.register_order(order=order)
         orders_id.append(order_id)
     # Update the main order to include the sub-order IDs
-    await service.update_order(order_id=orders.order_id, data={"sub_orders": orders_id, "status": "divided_order"})
-    return {"success": f"Successfully divided main order by {orders['order_id']}"}
+    await service.set_order_fields(orders.order_id, {"sub_orders": orders_id})
+    return {"success": f"Successfully divided main order by {orders.order_id}"}
 
 # Endpoint to record sales-related information for an order
 @salesman_router.put(
@@ -147,6 +154,7 @@ async def create_sub_order(orders: SubOrders, current_user: DBUser = Depends(get
         PermissionException,
         DoesNotExist,
         AlreadyExistsException,
+        LogicBrokenException,
         NotFoundException,
         ConflictException,
         EmptyFileUploadException,
@@ -168,10 +176,6 @@ async def salesman_register(
     await user_has_permission(query=query, required_permission="record_sales_info")
     query=None
     # check_role_access(current_user.role, [Roles.salesman])
-    # Check coherence and status of the order.
-    await service.check_coherence(
-        {Orders.id: order_id, Orders.status: Messages.status_salesman_recorded}
-    )
     # Convert the salesman_order input to a dictionary.
     salesman_order = salesman_order.dict()
     salesman_order["salesman_id"]=current_user.id
@@ -181,28 +185,85 @@ async def salesman_register(
             Company.company_name: current_user.company,
         }
     )
-    # Upload and store a document file if provided.
-    if file:
-        document_pdf = []
-        document_pdf.append(file)
-        file_paths = upload_files(
-            document_pdf, order_id, MAX_DOCUMENT_UPLOAD_SIZE, DOCUMENTS_DIRECTORY
+    # Claim the order first, so a concurrent registration is refused before it uploads or
+    # reserves anything; a failure below hands the order back as added.
+    order_data = await service.transition_order(
+        order_id, OrderStatus.recording, projection={"products": 1}
+    )
+    try:
+        # Upload and store a document file if provided.
+        if file:
+            document_pdf = []
+            document_pdf.append(file)
+            file_paths = upload_files(
+                document_pdf, order_id, MAX_DOCUMENT_UPLOAD_SIZE, DOCUMENTS_DIRECTORY
+            )
+            salesman_order[Orders.document_pdf] = file_paths
+        query ={"company_name":current_user.company,
+                "warehouse_name":salesman_order["warehouse_name"]}
+        # Place every product of the order in one planning pass and one bulk write;
+        # an order with a product that fits nowhere is not recorded.
+        for product in order_data["products"]:
+            product["order_id"] = order_id
+        plan = await place_all_products(query=query, products=order_data["products"])
+    except Exception:
+        await service.transition_order(order_id, OrderStatus.added, projection={Orders.id: 1})
+        raise
+    salesman_order["products"]=order_data["products"]
+    # Record the sales information with the placed products (and the document).
+    try:
+        await service.transition_order(
+            order_id, OrderStatus.recorded, salesman_order, projection={Orders.id: 1}
         )
-        salesman_order[Orders.document_pdf] = file_paths
-    order_data = await service.get_order_by_id(order_id = order_id)
-    salesman_order["products"]=[]
-    query ={"company_name":current_user.company,
-            "warehouse_name":salesman_order["warehouse_name"]}
-    for product in order_data["products"]:
-        product_data = await get_product_warehouse_category(query=query,product_data=product)
-        salesman_order["products"].append(product_data)
-    # Update the order status to "Salesman Recorded."
-    salesman_order[Orders.status] = Messages.status_salesman_recorded
-    # Update the order invoice in the database.
-    await service.update_order_invoice(order_id, salesman_order)
+    except LogicBrokenException:
+        # The order was deleted meanwhile; give its cells back.
+        await release_placements(plan["placements"])
+        raise
     return {Messages.message: Messages.or_rrd_scs}
 
 
+# Endpoint to plan (and optionally apply) cell placement for several orders at once
+@salesman_router.put(
+    "/allocation/batch",
+    response_model=dict,
+    responses=get_exception_responses(
+        UnauthorizedException,
+        PermissionException,
+        DoesNotExist,
+    ),
+)
+async def batch_allocation(
+    data: BatchAllocation, current_user: DBUser = Depends(get_current_user)
+):
+    # Check for user permissions
+    query = {
+        "role_name": current_user.role,
+        "company_name": current_user.company
+    }
+    await user_has_permission(query=query, required_permission="record_sales_info")
+    orders = await service.get_orders_by_ids(
+        data.order_ids, current_user.company, projection={"products": 1}
+    )
+    products = []
+    for order in orders:
+        for product in order.get("products", []):
+            # Products placed earlier keep their cells
+            if product.get("cell_id"):
+                continue
+            product["order_id"] = order["id"]
+            products.append(product)
+    query = {"company_name": current_user.company,
+             "warehouse_name": data.warehouse_name}
+    plan = await allocate_products(query=query, products=products, preview=data.preview)
+    if not data.preview:
+        # Store the newly placed products back on their orders.
+        placed = {product["order_id"] for product in plan["placements"]}
+        await service.set_orders_fields(
+            {order["id"]: {"products": order["products"]} for order in orders if order["id"] in placed}
+        )
+    return plan
+
+
 # # Endpoint to allocate products to boxes
 @salesman_router.put("/{order_id}/product/allocation",response_model=dict)
 async def product_allocate(order_id:str,
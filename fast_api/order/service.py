@@ -3,6 +3,7 @@ from fastapi import HTTPException
 import time, logging
 from bson.objectid import ObjectId
 from datetime import datetime
+from pymongo import ReturnDocument, UpdateOne
 
 # Local packages
 from ..database import orders_collection, temporary_tokens_collection
@@ -14,8 +15,10 @@ from ..exceptions import (
     LogicBrokenException,
     DoesntMatchStatus
 )
+from ..pagination import CursorParams, find_page
+from ..export import ExportParams, export_response
 from .exception import OrderNotFoundById,NoProductInOrder
-from .constants import Orders, Messages
+from .constants import Orders, Messages, TRANSITIONS
 from .models import Order
 from ..product.constants import Products, Messages as ProdMessages
 from ..user.constants import Users, Roles
@@ -25,8 +28,8 @@ from ..user.constants import Users, Roles
 # async def create_sub_orders(main_order_id:str,orders:list):
 #     res = orders_collection.insert_many(orders)
 
-# Function to return all orders based on user role and access rights.
-async def return_all_orders(user_id: str, role: str, company: str, warehouse: str):
+# Function to build the orders query for a user based on role and access rights.
+def orders_query(user_id: str, role: str, company: str, warehouse: str) -> dict:
     query = {}
     # Define the query based on the user's role and access rights.
     if role == Roles.salesman:
@@ -39,39 +42,102 @@ async def return_all_orders(user_id: str, role: str, company: str, warehouse: st
             query[Orders.warehouse_team + "." + Users.id] = user_id
     # Exclude orders marked for deletion.
     query[Orders.deletionDate] = {"$exists": False} 
-    orders = []
-    cursor = orders_collection.find(query)
-    # Convert cursor results to a list of orders.
-    for order in await cursor.to_list(None):
-        order[Users.id] = str(order.pop(Users.id_))
-        orders.append(order)
-    return orders
+    return query
+
+# Function to return one page of the orders a user has access to.
+async def return_all_orders(
+    user_id: str, role: str, company: str, warehouse: str, params: CursorParams,
+    projection: dict = None,
+) -> dict:
+    query = orders_query(user_id, role, company, warehouse)
+    return await find_page(orders_collection, query, params, projection)
+
+# Function to stream the orders a user has access to as an export.
+def export_orders(
+    user_id: str, role: str, company: str, warehouse: str, params: ExportParams,
+    projection: dict = None,
+):
+    query = orders_query(user_id, role, company, warehouse)
+    return export_response(orders_collection, query, params, "orders", projection)
 
 # Function to get an order by its ID.
-async def get_order_by_id(order_id: str) -> dict:
+async def get_order_by_id(order_id: str, projection: dict = None) -> dict:
     order = await orders_collection.find_one(
-        {Orders.id: ObjectId(order_id), Orders.deletionDate: {"$exists": False}}
+        {Orders.id: ObjectId(order_id), Orders.deletionDate: {"$exists": False}},
+        projection,
     )
     if not order:
         raise OrderNotFoundById()
     order.pop(Orders.id)
     return order
 
+# Function to fetch several orders of a company with one query; raises if any of them is missing.
+async def get_orders_by_ids(order_ids: list, company: str, projection: dict = None) -> list:
+    orders = []
+    cursor = orders_collection.find(
+        {
+            Orders.id: {"$in": [ObjectId(order_id) for order_id in order_ids]},
+            Orders.recipient: company,
+            Orders.deletionDate: {"$exists": False},
+        },
+        projection,
+    )
+    async for order in cursor:
+        order["id"] = str(order.pop(Orders.id))
+        orders.append(order)
+    if len(orders) != len(set(order_ids)):
+        raise OrderNotFoundById()
+    return orders
+
 # Function to register a new order and return its ID.
 async def register_order(order: dict) -> str:
     result = await orders_collection.insert_one(order)
     return str(result.inserted_id)
 
-# Function to update the status of an order.
-async def update_order_status(order_id: str, status: str):
-    update_result = await orders_collection.update_one(
-        {Orders.id: ObjectId(order_id), Orders.deletionDate: {"$exists": False}},
-        {"$set": {Orders.status: status}},
+# Move an order to `status` (and set `data` with it) in one conditional write; returns the updated order.
+# The filter only matches an order in one of the statuses TRANSITIONS allows before `status`, so a
+# missing order and a transition out of turn both raise LogicBrokenException without another read.
+async def transition_order(order_id: str, status: str, data: dict = None, projection: dict = None) -> dict:
+    order = await orders_collection.find_one_and_update(
+        {
+            Orders.id: ObjectId(order_id),
+            Orders.deletionDate: {"$exists": False},
+            Orders.status: {"$in": list(TRANSITIONS[status])},
+        },
+        {"$set": {**(data or {}), Orders.status: status}},
+        projection=projection,
+        return_document=ReturnDocument.AFTER,
     )
+    if not order:
+        logging.warning(f"order {order_id} cannot move to {status!r}")
+        raise LogicBrokenException
+    order.pop(Orders.id)
+    return order
 
-    if not update_result:
+# Set fields of an order after a transition; unchanged values are not an error here.
+async def set_order_fields(order_id: str, data: dict):
+    result = await orders_collection.update_one(
+        {Orders.id: ObjectId(order_id), Orders.deletionDate: {"$exists": False}},
+        {"$set": data},
+    )
+    if not result.matched_count:
         raise OrderNotFoundById()
 
+# Set fields of several orders with one bulk write; `updates` maps order ids to their fields.
+async def set_orders_fields(updates: dict):
+    if not updates:
+        return
+    await orders_collection.bulk_write(
+        [
+            UpdateOne(
+                {Orders.id: ObjectId(order_id), Orders.deletionDate: {"$exists": False}},
+                {"$set": data},
+            )
+            for order_id, data in updates.items()
+        ],
+        ordered=False,
+    )
+
 # Function to update order invoice details.
 async def update_order_invoice(order_id: str, data):
     result = await orders_collection.update_one(
@@ -200,29 +266,6 @@ async def check_salesman_record_repetition(order_id: str):
     if result[Orders.status] == Messages.status_salesman_recorded:
         raise AlreadyExistsException
 
-# Function to check the coherence of order status transitions.
-async def check_coherence(data: dict):
-    result = await orders_collection.find_one(
-        {Orders.id: ObjectId(data[Orders.id]), Orders.deletionDate: {"$exists": False}}
-    )
-
-    sequential_order = {
-        Messages.st_or_added: 1,
-        Messages.status_salesman_recorded: 2,
-        Messages.status_invoiced: 3,
-        Messages.status_approve: 4,
-        Messages.status_failed: 4,
-    }
-    if not result:
-        raise DoesNotExist
-    if result[Orders.status] == data[Orders.status]:
-        raise AlreadyExistsException
-    if (
-        sequential_order[data[Orders.status]] - sequential_order[result[Orders.status]]
-        != 1
-    ):
-        raise LogicBrokenException
-
 # Function to validate that two salesman IDs match.
 async def validate_salesman(salesman_id_1, salesman_id_2):
     if salesman_id_1 != salesman_id_2:
@@ -248,15 +291,8 @@ async def check_order_product_status(products:list,status:str)->str:
     return "ok"
 
 
-async def get_all_sub_orders(query:dict)->list:
-    orders = orders_collection.find(query)
-    if orders is None:
-        raise OrderNotFoundById
-    sub_orders =[]
-    async for order in orders:
-        order["id"]=str(order.pop("_id"))
-        sub_orders.append(order)
-    return sub_orders
+async def get_all_sub_orders(query:dict, params: CursorParams, projection: dict = None)->dict:
+    return await find_page(orders_collection, query, params, projection)
     
 
 async def delete_order_by_order_id(query:dict):
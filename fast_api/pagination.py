@@ -0,0 +1,133 @@
+# Installed packages
+import base64
+import json
+import re
+from typing import Generic, List, Optional, TypeVar
+from bson import json_util
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from fastapi import Query
+from pydantic import BaseModel, Field
+
+# Local packages
+from .exceptions import InvalidPageToken, InvalidFieldSelector
+
+T = TypeVar("T")
+
+# Upper bound for the optional total; counting stops there instead of scanning everything.
+TOTAL_COUNT_LIMIT = 10000
+
+FIELD_NAME = re.compile(r"[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*")
+
+
+class CursorParams:
+    """Query parameters of a keyset-paginated list endpoint."""
+
+    def __init__(
+        self,
+        limit: int = Query(50, ge=1, le=500, description="page size"),
+        page_token: Optional[str] = Query(None, description="next_page_token of the previous page"),
+        include_total: bool = Query(False, description="also return an estimated total"),
+    ):
+        self.limit = limit
+        self.page_token = page_token
+        self.include_total = include_total
+
+
+class CursorPage(BaseModel, Generic[T]):
+    items: List[T]
+    next_page_token: Optional[str] = Field(None, description="token of the next page, null on the last one")
+    total: Optional[int] = Field(None, description="number of matching documents, capped at TOTAL_COUNT_LIMIT")
+
+
+# Turn ?fields=a,b.c of a list endpoint into a Mongo projection; _id is always returned as id.
+def fields_projection(
+    fields: Optional[str] = Query(None, description="comma separated fields to return, e.g. status,products.product_name"),
+) -> Optional[dict]:
+    if not fields:
+        return None
+    projection = {}
+    for field in fields.split(","):
+        field = field.strip()
+        if not field or field == "id":
+            continue
+        if not FIELD_NAME.fullmatch(field):
+            raise InvalidFieldSelector()
+        projection[field] = 1
+    # Mongo refuses a path together with one inside it (products and products.x)
+    paths = sorted(projection)
+    for path, following in zip(paths, paths[1:]):
+        if following.startswith(path + "."):
+            raise InvalidFieldSelector()
+    return projection or None
+
+
+# Projection with only the fields a response model returns.
+def model_projection(model) -> dict:
+    return {name: 1 for name in model.model_fields if name != "id"}
+
+
+def encode_page_token(last_id: ObjectId) -> str:
+    raw = json.dumps({"after": str(last_id)}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_page_token(token: str) -> ObjectId:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        return ObjectId(json.loads(raw)["after"])
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise InvalidPageToken()
+
+
+# Token of a page sorted by a field: the field value and _id of the last item, in extended
+# JSON so dates and ObjectIds come back with their types.
+def encode_sort_token(last_value, last_id) -> str:
+    raw = json_util.dumps({"key": last_value, "after": last_id}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_sort_token(token: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        after = json_util.loads(raw)
+        return after["key"], after["after"]
+    except (ValueError, KeyError, TypeError):
+        raise InvalidPageToken()
+
+
+# Read one page of a query newest first, seeking past the last _id of the previous page.
+# With `sort` the page follows that field ascending, ties by _id, which an index on
+# (filter fields, sort, _id) serves; the projection has to return the field.
+async def find_page(
+    collection, query: dict, params: CursorParams, projection: dict = None, sort: Optional[str] = None
+) -> dict:
+    page_query = dict(query)
+    if sort is None:
+        order = [("_id", -1)]
+        if params.page_token:
+            after = decode_page_token(params.page_token)
+            page_query = {"$and": [query, {"_id": {"$lt": after}}]}
+    else:
+        order = [(sort, 1), ("_id", 1)]
+        if params.page_token:
+            key, after = decode_sort_token(params.page_token)
+            page_query = {"$and": [query, {"$or": [
+                {sort: {"$gt": key}}, {sort: key, "_id": {"$gt": after}}
+            ]}]}
+    cursor = collection.find(page_query, projection).sort(order).limit(params.limit + 1)
+    items = await cursor.to_list(params.limit + 1)
+    next_page_token = None
+    if len(items) > params.limit:
+        items = items[: params.limit]
+        last = items[-1]
+        if sort is None:
+            next_page_token = encode_page_token(last["_id"])
+        else:
+            next_page_token = encode_sort_token(last[sort], last["_id"])
+    for item in items:
+        item["id"] = str(item.pop("_id"))
+    total = None
+    if params.include_total:
+        total = await collection.count_documents(query, limit=TOTAL_COUNT_LIMIT)
+    return {"items": items, "next_page_token": next_page_token, "total": total}
@@ -0,0 +1,47 @@
+# Installed packages
+from pymongo import IndexModel, ASCENDING, DESCENDING
+
+# Local packages
+from ..database import products_collection
+from ..user.constants import Users
+from .constants import Products
+
+# Partial indexes cannot express the "deletionDate $exists false" soft-delete filter,
+# so deletionDate is the last key of every index used together with it, followed by _id
+# on the indexes behind paginated lists, which find_page sorts newest first.
+INDEXES = {
+    products_collection.name: [
+        IndexModel(
+            [(Products.company, ASCENDING), (Products.deletionDate, ASCENDING), ("_id", DESCENDING)],
+            name="products_company_live",
+        ),
+        IndexModel(
+            [
+                (Products.company, ASCENDING),
+                (Products.warehouse, ASCENDING),
+                (Products.deletionDate, ASCENDING),
+                ("_id", DESCENDING),
+            ],
+            name="products_warehouse_live",
+        ),
+        IndexModel(
+            [
+                (Products.company, ASCENDING),
+                (Products.warehouse, ASCENDING),
+                (Products.warehouse_team + "." + Users.id, ASCENDING),
+                (Products.deletionDate, ASCENDING),
+                ("_id", DESCENDING),
+            ],
+            name="products_company_warehouse_live",
+        ),
+        IndexModel(
+            [("client_email", ASCENDING), (Products.product_name, ASCENDING)],
+            name="products_client_email",
+        ),
+        IndexModel(
+            [(Products.order_id, ASCENDING), (Products.product_name, ASCENDING)],
+            name="products_order",
+        ),
+        IndexModel([(Products.product_name, ASCENDING)], name="products_name"),
+    ],
+}
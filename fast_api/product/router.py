@@ -1,5 +1,7 @@
 # Import necessary packages and modules
 from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from typing import Optional
 from fastapi_pagination import Page, paginate, add_pagination
 
 # Import local dependencies and exceptions
@@ -17,6 +19,8 @@ from ..exceptions import (
     InvalidIdException,
 )
 from ..responses import Success
+from ..pagination import CursorPage, CursorParams, fields_projection
+from ..export import ExportParams
 from ..user.models import DBUser
 from ..user.constants import Users, Roles
 from ..company.constants import Locations
@@ -29,6 +33,21 @@ from . import service
 # Create an API router for product-related endpoints
 router = APIRouter(prefix="/products", tags=["products"])
 
+# Endpoint to stream all products the user can see as NDJSON or CSV
+@router.get("/export", response_class=StreamingResponse)
+async def export_products(
+    params: ExportParams = Depends(),
+    projection: Optional[dict] = Depends(fields_projection),
+    current_user: DBUser = Depends(get_current_user),
+):
+    if current_user.role == Roles.client:
+        query = service.client_products_query({"client_email": current_user.email})
+    else:
+        query = service.products_query(
+            current_user.id, current_user.role, current_user.company, current_user.warehouse
+        )
+    return service.export_products(query, params, projection)
+
 # Endpoint to get product information by client email
 @router.get("/{client_email}")
 async def get_product_by_clientemail(client_email: str):
@@ -47,17 +66,19 @@ async def generate(count: int):
 # Endpoint to get a paginated list of all products based on user role and permissions
 @router.get(
     "/",
-    response_model=Page[dict],
+    response_model=CursorPage[dict],
     responses=get_exception_responses(UnauthorizedException, PermissionException),
 )
-async def get_all_products(current_user: DBUser = Depends(get_current_user)):
-    query = {Products.company: current_user.company}
-    if current_user.role != Roles.admin:
-        query[Products.warehouse] = current_user.warehouse
-        if current_user.role != Roles.manager:
-            query[Products.warehouse_team + "." + Users.id] = current_user.id
-    products = await service.return_all_products(query)
-    return paginate(products)
+async def get_all_products(
+    params: CursorParams = Depends(),
+    projection: Optional[dict] = Depends(fields_projection),
+    current_user: DBUser = Depends(get_current_user),
+):
+    query = service.products_query(
+        current_user.id, current_user.role, current_user.company, current_user.warehouse
+    )
+    products = await service.return_all_products(query, params, projection)
+    return products
 
 # Endpoint to get products for a specific order by order ID
 @router.get(
@@ -83,7 +104,7 @@ async def get_products_by_orderID(
         "warehouse": current_user.warehouse,
     }
     return_message = ""
-    products = await service.return_all_products(query)
+    products = await service.return_order_products(query)
     quantity_of_missing_product = len(order_data["products"]) - len(products)
     if quantity_of_missing_product > 0:
         return_message = f"missing in the order of {quantity_of_missing_product} goods"
@@ -12,7 +12,9 @@ from ..exceptions import (
 from ..order.constants import Orders
 from .constants import Products, Messages
 from .models import ClientSideProduct
-from ..user.constants import Users
+from ..user.constants import Users, Roles
+from ..pagination import CursorParams, find_page
+from ..export import ExportParams, export_response
 from .exceptions import ProductAllReadyExist, ProductNotFoundById, ProductNotFoundByName
 
 # Function to update product information by product ID
@@ -44,10 +46,15 @@ async def register_product(product: ClientSideProduct):
     data[Products.booking_date] = time.time() + 36000
     await products_collection.insert_one(data)
 
-# Function to retrieve all products based on a query
-async def return_all_products(query: dict) -> list:
+# Function to retrieve one page of products based on a query
+async def return_all_products(query: dict, params: CursorParams, projection: dict = None) -> dict:
     query[Products.deletionDate] = {"$exists": False}
-    result = products_collection.find(query)
+    return await find_page(products_collection, query, params, projection)
+
+# Function to retrieve all products of one order based on a query
+async def return_order_products(query: dict, projection: dict = None) -> list:
+    query[Products.deletionDate] = {"$exists": False}
+    result = products_collection.find(query, projection)
     documents = []
     async for doc in result:
         doc[Products.id] = str(doc.pop(Products.id_))
@@ -55,9 +62,10 @@ async def return_all_products(query: dict) -> list:
     return documents
 
 # Function to get product information by product ID
-async def get_product_by_id_(product_id: str):
+async def get_product_by_id_(product_id: str, projection: dict = None):
     product = await products_collection.find_one(
-        {Products.id_: ObjectId(product_id), Products.deletionDate: {"$exists": False}}
+        {Products.id_: ObjectId(product_id), Products.deletionDate: {"$exists": False}},
+        projection,
     )
 
     if not product:
@@ -123,10 +131,28 @@ async def get_total_quantity_product_by_name(product_name: str) -> dict:
     else:
         return {"product_name": product_name, "total_quantity": 0}
 
+# Function to build the products query of a client
+def client_products_query(data: dict) -> dict:
+    return {"client_email": data["client_email"]}
+
+# Function to build the products query for a user based on role and access rights
+def products_query(user_id: str, role: str, company: str, warehouse: str) -> dict:
+    query = {Products.company: company}
+    if role != Roles.admin:
+        query[Products.warehouse] = warehouse
+        if role != Roles.manager:
+            query[Products.warehouse_team + "." + Users.id] = user_id
+    return query
+
+# Function to stream the products of a query as an export
+def export_products(query: dict, params: ExportParams, projection: dict = None):
+    query[Products.deletionDate] = {"$exists": False}
+    return export_response(products_collection, query, params, "products", projection)
+
 # Function to find products by client email
-async def find_products_by_client_email(data: dict) -> list:
+async def find_products_by_client_email(data: dict, projection: dict = None) -> list:
     product_list = []
-    products = products_collection.find({"client_email": data["client_email"]})
+    products = products_collection.find(client_products_query(data), projection)
     if products is None:
         raise DoesNotExist
     async for product in products:
@@ -135,9 +161,10 @@ async def find_products_by_client_email(data: dict) -> list:
     return product_list
 
 # Function to find a product by product name and client email
-async def find_product_email(data: dict) -> dict:
+async def find_product_email(data: dict, projection: dict = None) -> dict:
     product = await products_collection.find_one(
-        {"product_name": data["product_name"], "client_email": data["client_email"]})
+        {"product_name": data["product_name"], "client_email": data["client_email"]},
+        projection)
     if product is None:
         raise DoesNotExist()
     product["id"] = str(product.pop("_id"))
@@ -1,13 +1,192 @@
-import redis, json
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Iterable, List, Optional
 from fastapi import HTTPException
-from redis.asyncio import Redis
+from redis.asyncio import ConnectionPool, Redis
+from redis.exceptions import RedisError
 
-# Создание подключения к Redis
-redis_db = redis.StrictRedis(
-    host="app_redis", port=6379, password="Qr_@20", db=0, decode_responses=True
+from .config import (
+    REDIS_HOST,
+    REDIS_PORT,
+    REDIS_PASSWORD,
+    REDIS_DB,
+    REDIS_MAX_CONNECTIONS,
+    REDIS_TIMEOUT,
 )
+
+logger = logging.getLogger("redis")
+
+# Один пул соединений на процесс, создается при старте приложения
+_client: Optional[Redis] = None
+
+
+def _create_client() -> Redis:
+    pool = ConnectionPool(
+        host=REDIS_HOST,
+        port=REDIS_PORT,
+        password=REDIS_PASSWORD,
+        db=REDIS_DB,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        decode_responses=True,
+    )
+    return Redis(connection_pool=pool)
+
+
+# Shared client; created on first use when the startup hook has not run (scripts, tests).
+def get_redis() -> Redis:
+    global _client
+    if _client is None:
+        _client = _create_client()
+    return _client
+
+
+# Replace the shared client, e.g. with fakeredis in tests.
+def set_redis(client: Optional[Redis]):
+    global _client
+    _client = client
+
+
+async def init_redis():
+    client = get_redis()
+    try:
+        await asyncio.wait_for(client.ping(), REDIS_TIMEOUT)
+    except (RedisError, OSError, asyncio.TimeoutError) as error:
+        logger.warning(f"Redis is not reachable at startup: {error!r}")
+
+
+async def close_redis():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+# Run one Redis call with a timeout.
+async def with_timeout(awaitable, timeout: Optional[float] = None):
+    return await asyncio.wait_for(awaitable, timeout or REDIS_TIMEOUT)
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, default=str)
+
+
+def _loads(value: Optional[str]) -> Any:
+    return None if value is None else json.loads(value)
+
+
+### Cache helpers: a failing or slow Redis is a cache miss, never an error.
+
+async def cache_get(key: str, timeout: Optional[float] = None) -> Any:
+    try:
+        return _loads(await with_timeout(get_redis().get(key), timeout))
+    except (RedisError, OSError, asyncio.TimeoutError) as error:
+        logger.warning(f"cache_get {key}: {error!r}")
+        return None
+
+
+async def cache_set(key: str, value: Any, ttl: Optional[int] = None, timeout: Optional[float] = None) -> bool:
+    try:
+        await with_timeout(get_redis().set(key, _dumps(value), ex=ttl), timeout)
+        return True
+    except (RedisError, OSError, asyncio.TimeoutError) as error:
+        logger.warning(f"cache_set {key}: {error!r}")
+        return False
+
+
+# One MGET for many keys; missing keys map to None.
+async def cache_get_many(keys: Iterable[str], timeout: Optional[float] = None) -> Dict[str, Any]:
+    keys = list(keys)
+    if not keys:
+        return {}
+    try:
+        values = await with_timeout(get_redis().mget(keys), timeout)
+    except (RedisError, OSError, asyncio.TimeoutError) as error:
+        logger.warning(f"cache_get_many: {error!r}")
+        return {key: None for key in keys}
+    return {key: _loads(value) for key, value in zip(keys, values)}
+
+
+# Set many keys with one pipelined round trip.
+async def cache_set_many(values: Dict[str, Any], ttl: Optional[int] = None, timeout: Optional[float] = None) -> bool:
+    if not values:
+        return True
+    try:
+        async with get_redis().pipeline(transaction=False) as pipe:
+            for key, value in values.items():
+                pipe.set(key, _dumps(value), ex=ttl)
+            await with_timeout(pipe.execute(), timeout)
+        return True
+    except (RedisError, OSError, asyncio.TimeoutError) as error:
+        logger.warning(f"cache_set_many: {error!r}")
+        return False
+
+
+async def cache_delete(*keys: str, timeout: Optional[float] = None) -> int:
+    if not keys:
+        return 0
+    try:
+        return await with_timeout(get_redis().delete(*keys), timeout)
+    except (RedisError, OSError, asyncio.TimeoutError) as error:
+        logger.warning(f"cache_delete {keys}: {error!r}")
+        return 0
+
+
+# Atomically bump a counter (e.g. a cache version) and return the new value.
+async def cache_incr(key: str, timeout: Optional[float] = None) -> Optional[int]:
+    try:
+        return await with_timeout(get_redis().incr(key), timeout)
+    except (RedisError, OSError, asyncio.TimeoutError) as error:
+        logger.warning(f"cache_incr {key}: {error!r}")
+        return None
+
+
+# Set a key only if it does not exist yet; returns the value now stored.
+async def cache_add(key: str, value: Any, ttl: Optional[int] = None, timeout: Optional[float] = None) -> Any:
+    try:
+        async with get_redis().pipeline(transaction=False) as pipe:
+            pipe.set(key, _dumps(value), ex=ttl, nx=True)
+            pipe.get(key)
+            _, stored = await with_timeout(pipe.execute(), timeout)
+        return _loads(stored)
+    except (RedisError, OSError, asyncio.TimeoutError) as error:
+        logger.warning(f"cache_add {key}: {error!r}")
+        return None
+
+
+# Set a key only if it does not exist yet; True when this call set it, None when Redis failed.
+async def cache_claim(key: str, ttl: int, timeout: Optional[float] = None) -> Optional[bool]:
+    try:
+        return bool(await with_timeout(get_redis().set(key, 1, ex=ttl, nx=True), timeout))
+    except (RedisError, OSError, asyncio.TimeoutError) as error:
+        logger.warning(f"cache_claim {key}: {error!r}")
+        return None
+
+
+# Bump many counters with one pipelined round trip; missing counters start from `start`.
+async def cache_incr_many(
+    keys: Iterable[str], start: Optional[int] = None, timeout: Optional[float] = None
+) -> bool:
+    keys = list(keys)
+    if not keys:
+        return True
+    try:
+        async with get_redis().pipeline(transaction=False) as pipe:
+            for key in keys:
+                if start is not None:
+                    pipe.set(key, start, nx=True)
+                pipe.incr(key)
+            await with_timeout(pipe.execute(), timeout)
+        return True
+    except (RedisError, OSError, asyncio.TimeoutError) as error:
+        logger.warning(f"cache_incr_many: {error!r}")
+        return False
+
+
+### Token helpers
+
 async def redis_get(set_data):
-    data = redis_db.get(set_data)
+    data = await with_timeout(get_redis().get(set_data))
     if data is None:
         raise HTTPException(status_code=401, detail="redis key is not found")
     return data
@@ -15,7 +194,9 @@ async def redis_get(set_data):
 
 async def redis_verify(token: str) -> str:
     # В функции проверки токена
-    data = redis_db.get(token)
+    data = await with_timeout(get_redis().get(token))
+    if data is None:
+        raise HTTPException(status_code=401, detail="Token is invalid")
     data = json.loads(data)
     if data["token_data"] != token:
         raise HTTPException(status_code=401, detail="Token is invalid")
@@ -31,8 +212,8 @@ async def redis_set(set_data: str, data: dict):
     else:
         ttl = 604800
     data = json.dumps(data)
-    redis_db.set(set_data, data, ttl)
+    await with_timeout(get_redis().set(set_data, data, ex=ttl))
 
 
 async def delete(token):
-    redis_db.delete(token)
+    await with_timeout(get_redis().delete(token))
@@ -0,0 +1,13 @@
+# Installed packages
+from pymongo import IndexModel, ASCENDING
+
+# Local packages
+from ..database import reports_collection
+from .constants import Reports
+
+INDEXES = {
+    reports_collection.name: [
+        IndexModel([(Reports.product_id, ASCENDING)], name="reports_product"),
+        IndexModel([(Reports.user_id, ASCENDING), ("_id", ASCENDING)], name="reports_user"),
+    ],
+}
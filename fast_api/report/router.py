@@ -1,5 +1,6 @@
 # Installed packages
 from fastapi import APIRouter, File, Depends, UploadFile, HTTPException
+from fastapi.responses import StreamingResponse
 from typing import Annotated
 from fastapi.params import Path
 import time, logging
@@ -9,12 +10,12 @@ from datetime import datetime,timedelta
 
 
 # Local packages
-from ..warehouse.service import get_product_warehouse_category
-from ..user.service import get_user_by
+from ..warehouse.service import place_all_products
+from ..warehouse.occupancy import confirm_occupancy, release_occupancy, product_key
 from ..websocket.router import manager
 from ..dependencies import (
     get_exception_responses,
-    get_current_user,
+    get_current_user_or_device,
     check_role_access,
     check_data,
     upload_files,
@@ -51,16 +52,18 @@ from ..company.service import (
     get_company
 )
 from ..company.constants import Locations, Company, Warehouses
-from ..order.email_sender import send_email_to_client,scheduler,IntervalTrigger
+from ..order.email_sender import send_template_email
+from ..mail.templates import OrderReady
+from ..scheduler.jobs import scheduler
 from ..order.service import (
     update_order_product_status,
     find_product_by_name,
     get_order_by_id,
-    update_order_status,
+    transition_order,
     check_order_status,
-    update_order,
     check_order_product_status
 )
+from ..order.constants import OrderStatus
 from .models import (
     ProductArrival,
     QualityCheck,
@@ -91,22 +94,41 @@ from ..exceptions import (
     InvalidIdException,
     NotFoundException,
     DuplicateKeyException,
+    LogicBrokenException,
 )
 from ..constants import Messages
 from ..company.models import CompanyUpdateInfo
+from ..export import ExportParams
+from ..pagination import fields_projection
 
 router = APIRouter(prefix="/reports", tags=["reports"])
 
 # wh = CusWarehouse()
 
 
+# Выгрузка отчетов в NDJSON/CSV
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses=get_exception_responses(UnauthorizedException, PermissionException),
+)
+async def export_reports(
+    params: ExportParams = Depends(),
+    projection: Optional[dict] = Depends(fields_projection),
+    current_user: DBUser = Depends(get_current_user_or_device),
+):
+    check_role_access(current_user.role, [Roles.admin, Roles.director, Roles.manager])
+    warehouse = None if current_user.role in (Roles.admin, Roles.director) else current_user.warehouse
+    return await service.export_reports(current_user.company, warehouse, params, projection)
+
+
 @router.get(
     "/{product_id}",
     response_model=list,
     responses=get_exception_responses(UnauthorizedException, PermissionException),
 )
 async def get_all_reports(
-    product_id: str, current_user: DBUser = Depends(get_current_user)
+    product_id: str, current_user: DBUser = Depends(get_current_user_or_device)
 ):
     try:
         check_role_access(
@@ -128,13 +150,13 @@ async def get_all_reports(
     "/{order_id}/check_documents",
     response_model=dict,
     responses=get_exception_responses(
-        UnauthorizedException, PermissionException, DoesNotExist
+        UnauthorizedException, PermissionException, DoesNotExist, LogicBrokenException
     ),
 )
 async def check_documents_dispatcher(
     order_id: str,
     check_data: DispatcherModel,
-    current_user: DBUser = Depends(get_current_user),
+    current_user: DBUser = Depends(get_current_user_or_device),
 ):
     # code started
     roles = [Roles.manager, Roles.dispatcher]
@@ -163,15 +185,15 @@ async def check_documents_dispatcher(
     data["order_id"] = order_id
     data["user_id"] = current_user.id
     data["status"] = status
+    # Only an approved (or started) order can have its documents verified
+    await transition_order(order_id, OrderStatus.documents_verified, projection={"_id": 1})
     await service.create_every_employee_report(data)
-    await update_order_status(order_id, "all_documents_verifed")
-    order_data = await get_order_by_id(order_id=order_id)
-    user_data = await get_user_by("email",order_data["e_mail"])
     message = {"current_user":current_user.role,
                "order_status":status,
                "order_id":order_id,
                "description":check_data.accepted_description}
-    await manager.send_message(user_id=user_data.id,message=str(message))
+    # The client, the salesman and the warehouse team follow the order's topic
+    await manager.send_to_order(order_id, message)
     return {"message": "succesfully created dispatcher report"}
 
 
@@ -188,7 +210,7 @@ async def check_documents_dispatcher(
 async def packaging_check_controller(
     order_id: str,
     packing_data: PackagingQualityCheck = Depends(PackagingQualityCheck),
-    current_user: DBUser = Depends(get_current_user),
+    current_user: DBUser = Depends(get_current_user_or_device),
     file: UploadFile = File(None),
 ):
     roles = [Roles.manager, Roles.controller]
@@ -202,7 +224,7 @@ async def packaging_check_controller(
         }
     )
     await check_user_status_for_order(current_user.id, order_id)
-    await check_order_status(order_id, "all_documents_verifed")
+    await check_order_status(order_id, OrderStatus.documents_verified)
     data = {}
     for key, value in packing_data.dict().items():
         if value is not None and value != "string" and value != "":
@@ -222,6 +244,11 @@ async def packaging_check_controller(
         order_id, packing_data.product_name, "succes_packing"
     )
     await service.create_every_employee_report(data)
+    message = {"current_user":current_user.role,
+               "order_status":"succes_packing",
+               "order_id":order_id,
+               "product_name":packing_data.product_name}
+    await manager.send_to_order(order_id, message)
     return {"message": "succesfully created controller report"}
 
 
@@ -238,7 +265,7 @@ async def packaging_check_controller(
     ),
 )
 async def product_arrival_insert(
-    product_data: ProductArrival, current_user: DBUser = Depends(get_current_user)
+    product_data: ProductArrival, current_user: DBUser = Depends(get_current_user_or_device)
 ):
     check_role_access(
         current_user.role,
@@ -331,7 +358,7 @@ async def product_arrival_insert(
 async def check_quality(
     files: Annotated[list[UploadFile], File(...)],
     report: QualityCheck = Depends(QualityCheck),
-    current_user: DBUser = Depends(get_current_user),
+    current_user: DBUser = Depends(get_current_user_or_device),
     product_id: str = Path(...),
 ):
     check_role_access(current_user.role, [Roles.controller])
@@ -393,20 +420,21 @@ async def check_quality(
         DoesNotExist,
         QualityCheckFailed,
         AlreadyExistsException,
+        ConflictException,
     ),
 )
 async def allocate_warehouse(
-    product_id, current_user: DBUser = Depends(get_current_user)
+    product_id, current_user: DBUser = Depends(get_current_user_or_device)
 ):
     check_role_access(current_user.role, [Roles.warehouseman])
     #         product = await get_product_by_id(product_id, current_user.company)
     product = await get_product_by_id_(product_id)
     is_quality_checked(product)
-    product[Products.status]=ProdMessages.status_allocated
     query ={"company_name":current_user.company,"warehouse_name":current_user.warehouse}
-    product_data = await get_product_warehouse_category(
-                query=query, product_data=product
-            )
+    # Raises before anything is written when no cell has room for the product.
+    await place_all_products(query=query, products=[product])
+    product[Products.status]=ProdMessages.status_allocated
+    product_data = product
     product_data.pop("_id")
     report = {
         Users.user_id: current_user.id,
@@ -437,7 +465,7 @@ async def allocate_warehouse(
     ),
 )
 async def confirm_location(
-    product_id, confirmed: bool, current_user: DBUser = Depends(get_current_user)
+    product_id, confirmed: bool, current_user: DBUser = Depends(get_current_user_or_device)
 ):
     check_role_access(current_user.role, [Roles.loader])
     product = await get_product_by_id_(product_id)
@@ -458,6 +486,7 @@ async def confirm_location(
     # await service.create_report(confirmation_report, Products.location_confirmed)
     await update_product(product_id,data)
     # await confirmed_location(product_id, data)
+    await confirm_occupancy(product_key(product), {Users.user_id: current_user.id})
     await unload_from_temporary(product_id)
 
     return {Messages.message: constants.Messages.pr_verf_scs}
@@ -478,7 +507,7 @@ async def unallocate_product(
     product_id:str, 
     shipment_order_id : str,
     report: ProductUnload,
-      current_user: DBUser = Depends(get_current_user)
+      current_user: DBUser = Depends(get_current_user_or_device)
 ):
     check_role_access(current_user.role, [Roles.loader])
     #         product = await get_product_by_id(product_id, current_user.company)
@@ -495,9 +524,7 @@ async def unallocate_product(
         Products.timestamp: time.time(),
     }
     product["quantity_un"]= unload_report["quantity"]
-    await unload_product_in_cell(current_user.company,
-                                 current_user.warehouse,
-                                 product_data=product)
+    await release_occupancy(product_key(product), unload_report["quantity"])
     await temporarily_place(temporary_place)
     await service.create_report(unload_report, Products.is_unloaded)
     product["quantity"]=product["quantity"]-unload_report["quantity"]
@@ -535,7 +562,7 @@ async def unallocate_product(
 async def return_suppliers(
     product_id: str,
     report: ProductReturn,
-    current_user: DBUser = Depends(get_current_user),
+    current_user: DBUser = Depends(get_current_user_or_device),
 ):
     check_role_access(current_user.role, [Roles.director, Roles.admin, Roles.manager])
 
@@ -563,11 +590,12 @@ async def return_suppliers(
         PermissionException,
         DuplicateKeyException,
         QualityCheckFailed,
+        LogicBrokenException,
     ),
 )
 async def send_to_customer(
     order_id:str, 
-    current_user: DBUser = Depends(get_current_user)
+    current_user: DBUser = Depends(get_current_user_or_device)
 ):
     check_role_access(
         current_user.role, [Roles.manager, Roles.controller, Roles.warehouseman]
@@ -583,66 +611,43 @@ async def send_to_customer(
     # report[Users.user_id] = current_user.id
     # # is_quality_checked(product)
     # await service.create_report(report, Products.destination)
+    # Получите текущее время
+    current_time = datetime.now()
+    last_notification_time = current_time + timedelta(days=1)
+    if current_time.weekday() ==6:
+        last_notification_time +=timedelta(days=1)
+    # Mark the order as waiting; fails unless its documents were verified or it is completed
+    await transition_order(
+        order_id,
+        OrderStatus.waiting_for_customer,
+        {"start_notification_time":current_time,"last_notification_time":last_notification_time},
+        projection={"_id": 1},
+    )
     data_for_websocket ={
         "order_id":order_id,
         "description":f"We are pleased to inform you that your order number {order_id} is ready for pickup.",
         "Today":"you can pick up your order from 8:00 am to 6:00 pm and in case of lateness a penalty will be charged."
     }
     await manager.send_message(user_id=order_data["client_id"],
-                               message=str(data_for_websocket))
-    # Prepare an email description for the client.
-    description = f"""
-        <html>
-        <head>
-            <style>
-                /* Добавьте стили CSS по вашему усмотрению */
-            </style>
-        </head>
-        <body>
-            <p>Dear Valued Client,</p>
-            <p>Thank you for your order</p>
-            <ul>
-                <li>Website: <a href="http://warehouse.prometeochain.io/">http://warehouse.prometeochain.io/</a></li>
-            </ul>
-            <p>We are pleased to inform you that your order number {order_id} is ready for pickup.</p>
-            <p>you can pick up your order from 8:00 am to 6:00 pm and in case of lateness a penalty will be charged.</p>
-            <p>If this time is convenient for you, please confirm and we will ensure your order is ready to be received</p>
-            <p>If you have any other questions, please contact us at <a href="mailto:noreply@prometeochain.io">noreply@prometeochain.io</a>. We're here to help!</p>
-            <p>Thank you for choosing us. Have a great day!</p>
-        </body>
-        </html>
-        """
-    # Prepare email data and send an order confirmation email to the client.
-    email_data ={
-        "office_email":company_data["office_email"],
-        # "office_password":company_data["office_password"],
-        "order_id":order_id,
-        "recipient_email":order_data["client_email"],
-        "description" : description,
-        "subject":"Your order is ready",
+                               message=data_for_websocket)
+    # Tell the client the order is ready; the reminders below resend the same email.
+    reminder = {
+        "template": "order_ready",
+        "context": OrderReady(order_id=order_id).model_dump(),
+        "recipient_email": order_data["client_email"],
+        "company": current_user.company,
+        "office_email": company_data["office_email"],
     }
-    await send_email_to_client(email_data=email_data)
-    # Получите текущее время
-    current_time = datetime.now()
-    last_notification_time = current_time + timedelta(days=1)
-    if current_time.weekday() ==6:
-        last_notification_time +=timedelta(days=1)
-    # Определите интервал, который нужно добавить к текущему времени (например, 5 минут)
-    order_data["start_notification_time"]=current_time
-    order_data["last_notification_time"]=last_notification_time
-    order_data["status"]="waiting_for_customer"
-    await update_order(order_id=order_id,data=order_data)
-    notification_datetime = datetime.combine(datetime.today(), last_notification_time.time()) - timedelta(minutes=120)
-    notification_datetime = notification_datetime.time()
-    # Создайте задачу по расписанию
-    scheduler.add_job(
-        send_email_to_client,  # Передаем ссылку на функцию
-        args=[email_data],  # Передаем аргументы в виде списка
-        trigger=IntervalTrigger(minutes=30),
-        max_instances=1,
-        start_date=notification_datetime,
-        end_date=last_notification_time.time(),
-        id=f"order_{order_id}_notification"
+    await send_template_email(**reminder, key=f"order-ready:{order_id}", cached=True)
+    # Remind the client every 30 minutes during the last two hours; the job is kept in Mongo
+    await scheduler.add_job(
+        send_template_email,
+        id=f"order_{order_id}_notification",
+        interval=timedelta(minutes=30),
+        start_at=last_notification_time - timedelta(minutes=120),
+        end_at=last_notification_time,
+        kwargs=dict(reminder, cached=True),
+        company=current_user.company,
     )
     return {Messages.message: constants.Messages.pr_sent_to_cus}
 
@@ -650,7 +655,7 @@ async def send_to_customer(
 # All routes for unsuitable place
 @router.get("/{place_id}/place")
 async def get_place_by_id(
-    place_id: str, current_user: DBUser = Depends(get_current_user)
+    place_id: str, current_user: DBUser = Depends(get_current_user_or_device)
 ):
     check_role_access(current_user.role, [Roles.manager])
     result = await get_unsuitable_place_by_id(place_id)
@@ -659,7 +664,7 @@ async def get_place_by_id(
 
 
 @router.get("/", response_model=list)
-async def all_unsuitable_place(current_user: DBUser = Depends(get_current_user)):
+async def all_unsuitable_place(current_user: DBUser = Depends(get_current_user_or_device)):
     check_role_access(current_user.role, [Roles.manager])
     res = await get_all_data_from_collection()
 
@@ -670,7 +675,7 @@ async def all_unsuitable_place(current_user: DBUser = Depends(get_current_user))
 async def unsuitable_place(
     files: Annotated[list[UploadFile], File(...)],
     data: UnsuitablePlace = Depends(UnsuitablePlace),
-    current_user: DBUser = Depends(get_current_user),
+    current_user: DBUser = Depends(get_current_user_or_device),
 ):
     check_role_access(current_user.role, [Roles.warehouseman])
     data = data.dict()
@@ -692,7 +697,7 @@ async def unsuitable_place(
 @router.put("/invoice_unsuitable_place")
 async def invoice_for_products_in_unsuitable_place(
     invoice_data: InvoiceUnsuitablePlace,
-    current_user: DBUser = Depends(get_current_user),
+    current_user: DBUser = Depends(get_current_user_or_device),
 ):
     check_role_access(current_user.role, [Roles.manager])
     invoice_data.dict()
@@ -724,7 +729,7 @@ async def invoice_for_products_in_unsuitable_place(
 async def report_every_employee(
     order_id: str,
     report: CompanyUpdateInfo,
-    current_user: DBUser = Depends(get_current_user),
+    current_user: DBUser = Depends(get_current_user_or_device),
 ):
     roles = [
         Roles.dispatcher,
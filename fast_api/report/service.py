@@ -1,7 +1,9 @@
 # Installed packages
 
 # Local packages
-from ..database import reports_collection
+from ..database import reports_collection, users_collection
+from ..export import ExportParams, export_response
+from ..user.constants import Users
 from .constants import Reports
 from ..exceptions import AlreadyExistsException
 from ..user.service import end_user_work
@@ -33,6 +35,18 @@ async def get_reports(product_id: str) -> list:
 #     #      field: {"$exists": True}})
 
 
+# Stream the reports written by the workers of a company (or one of its warehouses).
+async def export_reports(
+    company: str, warehouse: str, params: ExportParams, projection: dict = None
+):
+    users_query = {Users.company: company}
+    if warehouse:
+        users_query[Users.warehouse] = warehouse
+    user_ids = [str(user_id) for user_id in await users_collection.distinct(Users.id_, users_query)]
+    query = {Reports.user_id: {"$in": user_ids}}
+    return export_response(reports_collection, query, params, "reports", projection)
+
+
 async def create_report(report: dict, field):
     results = await reports_collection.find(
         {Reports.product_id: report[Reports.product_id], field: {"$exists": True}}
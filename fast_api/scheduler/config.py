@@ -0,0 +1,3 @@
+# Interval jobs kept in Mongo and run by whichever worker holds their lease
+SCHEDULER_POLL_INTERVAL = 5  # seconds between checks for due jobs
+SCHEDULER_LEASE_SECONDS = 300  # a job whose worker died is run again after this long
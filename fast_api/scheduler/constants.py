@@ -0,0 +1,14 @@
+class Jobs:
+    id = "id"
+    id_ = "_id"
+    func = "func"
+    args = "args"
+    kwargs = "kwargs"
+    interval = "interval"
+    next_run_at = "next_run_at"
+    end_at = "end_at"
+    company = "company"
+    locked_until = "locked_until"
+    owner = "owner"
+    runs = "runs"
+    last_error = "last_error"
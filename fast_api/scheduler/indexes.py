@@ -0,0 +1,16 @@
+# Installed packages
+from pymongo import IndexModel, ASCENDING
+
+# Local packages
+from ..database import scheduled_jobs_collection
+from .constants import Jobs
+
+INDEXES = {
+    scheduled_jobs_collection.name: [
+        IndexModel([(Jobs.next_run_at, ASCENDING)], name="scheduled_jobs_due"),
+        IndexModel(
+            [(Jobs.company, ASCENDING), (Jobs.next_run_at, ASCENDING), (Jobs.id_, ASCENDING)],
+            name="scheduled_jobs_company",
+        ),
+    ],
+}
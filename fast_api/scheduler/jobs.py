@@ -0,0 +1,166 @@
+# Installed packages
+import asyncio
+import importlib
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+# Local packages
+from ..database import scheduled_jobs_collection
+from ..pagination import CursorParams, find_page
+from .config import SCHEDULER_POLL_INTERVAL, SCHEDULER_LEASE_SECONDS
+from .constants import Jobs
+
+logger = logging.getLogger("scheduler")
+
+
+# Jobs are stored by reference, so only module-level functions can be scheduled.
+def func_ref(func: Callable) -> str:
+    return f"{func.__module__}:{func.__qualname__}"
+
+
+def resolve(ref: str) -> Callable:
+    module, name = ref.split(":")
+    return getattr(importlib.import_module(module), name)
+
+
+def next_run(run_at: datetime, interval: float, now: datetime) -> datetime:
+    # Runs missed while no worker was up are coalesced into one.
+    step = timedelta(seconds=interval)
+    missed = max(int((now - run_at) / step), 0)
+    return run_at + step * (missed + 1)
+
+
+class JobScheduler:
+    """Interval jobs stored in Mongo, so they survive restarts, and run by one worker each time.
+
+    Every process polls for due jobs. A worker takes a job with one
+    find_one_and_update that leases it for SCHEDULER_LEASE_SECONDS, runs it,
+    then moves next_run_at on and drops the lease; other workers skip leased
+    jobs. A job is removed after its end_at. Times are local, like datetime.now().
+    """
+
+    def __init__(self, collection=scheduled_jobs_collection, poll_interval: float = SCHEDULER_POLL_INTERVAL):
+        self.collection = collection
+        self.poll_interval = poll_interval
+        self.worker_id = uuid.uuid4().hex
+        self._task: Optional[asyncio.Task] = None
+
+    # Add a job or replace the one with the same id.
+    async def add_job(
+        self,
+        func: Callable,
+        id: str,
+        interval: timedelta,
+        start_at: Optional[datetime] = None,
+        end_at: Optional[datetime] = None,
+        args: Optional[list] = None,
+        kwargs: Optional[dict] = None,
+        company: Optional[str] = None,
+    ):
+        await self.collection.replace_one(
+            {Jobs.id_: id},
+            {
+                Jobs.func: func_ref(func),
+                Jobs.args: list(args or []),
+                Jobs.kwargs: dict(kwargs or {}),
+                Jobs.interval: interval.total_seconds(),
+                Jobs.next_run_at: start_at or datetime.now() + interval,
+                Jobs.end_at: end_at,
+                Jobs.company: company,
+                Jobs.runs: 0,
+            },
+            upsert=True,
+        )
+
+    async def remove_job(self, id: str):
+        await self.collection.delete_one({Jobs.id_: id})
+
+    async def get_jobs(self, company: Optional[str] = None) -> List[dict]:
+        query = {} if company is None else {Jobs.company: company}
+        cursor = self.collection.find(query, {Jobs.args: 0, Jobs.kwargs: 0}).sort(Jobs.next_run_at, 1)
+        jobs = []
+        async for job in cursor:
+            job[Jobs.id] = job.pop(Jobs.id_)
+            jobs.append(job)
+        return jobs
+
+    # One page of a company's jobs, soonest first, served by the scheduled_jobs_company index.
+    async def get_jobs_page(self, company: str, params: CursorParams) -> dict:
+        return await find_page(
+            self.collection,
+            {Jobs.company: company},
+            params,
+            {Jobs.args: 0, Jobs.kwargs: 0},
+            sort=Jobs.next_run_at,
+        )
+
+    async def claim(self) -> Optional[dict]:
+        now = datetime.now()
+        return await self.collection.find_one_and_update(
+            {
+                Jobs.next_run_at: {"$lte": now},
+                "$or": [
+                    {Jobs.locked_until: {"$exists": False}},
+                    {Jobs.locked_until: {"$lt": now}},
+                ],
+            },
+            {
+                "$set": {
+                    Jobs.locked_until: now + timedelta(seconds=SCHEDULER_LEASE_SECONDS),
+                    Jobs.owner: self.worker_id,
+                },
+            },
+            sort=[(Jobs.next_run_at, 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def run(self, job: dict):
+        update = {"$unset": {Jobs.locked_until: "", Jobs.owner: ""}, "$inc": {Jobs.runs: 1}}
+        try:
+            await resolve(job[Jobs.func])(*job[Jobs.args], **job.get(Jobs.kwargs, {}))
+        except Exception as error:
+            logger.warning(f"job {job[Jobs.id_]} failed: {error!r}")
+            update["$set"] = {Jobs.last_error: repr(error)}
+        run_at = next_run(job[Jobs.next_run_at], job[Jobs.interval], datetime.now())
+        lease = {Jobs.id_: job[Jobs.id_], Jobs.owner: self.worker_id}
+        if job[Jobs.end_at] is not None and run_at > job[Jobs.end_at]:
+            await self.collection.delete_one(lease)
+            return
+        update.setdefault("$set", {})[Jobs.next_run_at] = run_at
+        await self.collection.update_one(lease, update)
+
+    # Run every due job; returns how many ran.
+    async def run_pending(self) -> int:
+        count = 0
+        while True:
+            job = await self.claim()
+            if job is None:
+                return count
+            await self.run(job)
+            count += 1
+
+    async def _poll(self):
+        while True:
+            try:
+                await self.run_pending()
+            except PyMongoError as error:
+                logger.warning(f"scheduler poll failed: {error!r}")
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._poll())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+scheduler = JobScheduler()
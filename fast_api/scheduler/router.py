@@ -0,0 +1,20 @@
+# Installed packages
+from fastapi import APIRouter, Depends
+
+# Local packages
+from ..dependencies import get_current_user, check_role_access
+from ..user.models import DBUser
+from ..user.constants import Roles
+from ..pagination import CursorPage, CursorParams
+from .jobs import scheduler
+
+router = APIRouter(prefix="/scheduler", tags=["scheduler"])
+
+
+# Pending jobs of the admin's company with their next run times, soonest first.
+@router.get("/jobs", response_model=CursorPage[dict])
+async def get_pending_jobs(
+    params: CursorParams = Depends(), current_user: DBUser = Depends(get_current_user)
+):
+    check_role_access(current_user.role, [Roles.admin])
+    return await scheduler.get_jobs_page(current_user.company, params)
@@ -5,8 +5,8 @@ from datetime import datetime,timedelta
 from fastapi_pagination import Page, paginate, add_pagination
 
 # Import data models, constants, and service functions from your project's modules
-from ..websocket.router import manager
-from ..order.email_sender import send_email_to_client,scheduler,IntervalTrigger
+from ..order.email_sender import send_email_to_client
+from ..scheduler.jobs import scheduler
 from .shpmemt_model import ShipmentOrder, Update_Shipment_order,ShipmentOrderWithID
 from .shipment_constants import Shipment
 from .shipment_service import (
@@ -18,9 +18,10 @@ from .shipment_service import (
 )
 from ..user.models import DBUser
 from ..user.constants import Roles
-from ..user.service import update_user_order_status
+from ..notifications import notify_team
 from ..dependencies import get_current_user, check_role_access
 from ..responses import Success
+from ..pagination import CursorPage, CursorParams, model_projection
 from ..company.service import check_order_company_and_or_warehouse,get_company
 
 # Create an APIRouter instance with a prefix and tags
@@ -52,8 +53,10 @@ async def create_shipment_order(
     return res
 
 # Define a FastAPI route to retrieve all shipment orders
-@router.get("/shipment/orders", response_model=Page[ShipmentOrderWithID])
-async def get_all_shipment(current_user: DBUser = Depends(get_current_user)):
+@router.get("/shipment/orders", response_model=CursorPage[ShipmentOrderWithID])
+async def get_all_shipment(
+    params: CursorParams = Depends(), current_user: DBUser = Depends(get_current_user)
+):
     # Check if the current user has the required role to retrieve shipment orders
     check_role_access(current_user.role, [Roles.manager, Roles.client])
     query = {}
@@ -62,9 +65,11 @@ async def get_all_shipment(current_user: DBUser = Depends(get_current_user)):
     elif current_user.role == Roles.client:
         query = {"client_email": current_user.email}
     # Get all shipment orders based on the query
-    order_data = await get_all_orders(query=query)
-    # Paginate and return the results
-    return paginate(order_data)
+    order_data = await get_all_orders(
+        query=query, params=params, projection=model_projection(ShipmentOrderWithID)
+    )
+    # Return the requested page
+    return order_data
 
 # Define a FastAPI route to retrieve a specific shipment order by its ID
 @router.get("/{order_id}/shipment", response_model=dict)
@@ -123,38 +128,41 @@ async def notify_team_of_status_change(order_id:str,
     order_data = await get_shipment_order_by_id(order_id=order_id)
     company_data = await get_company(name=current_user.company)
     order_data["status"]="approved"
-    data ={
-        "order_id":order_data["id"],
-        "status":"Available with Restrictions"
-    }
-    for user in order_data["warehouse_team"]:
-        await update_user_order_status(user["id"],data)
-        data["description"]="There's a time change on this order, you can do another job"
-        await manager.send_message(user["id"],str(data))
+    status = "Available with Restrictions"
+    description = "There's a time change on this order, you can do another job"
+    team = order_data["warehouse_team"]
+    # Status updates, WebSocket messages and emails of the whole team go out together
+    recipients = await notify_team(
+        team,
+        order_data["id"],
+        status,
+        message={"order_id":order_data["id"],"status":status,"description":description},
+        subject="Order Confirmation",
+        description=description,
+        office_email=company_data["office_email"],
+    )
+    await update_shipment_order_by_id(order_id=order_id,order_data=order_data)
+    # await update_order(order_id=order_id,data=order_data)
+    # Remind the team every 30 minutes during the last two days; the job is kept in Mongo
+    if team:
         email_data ={
             "office_email":company_data["office_email"],
-            # "office_password":company_data["office_password"],
             "order_id":order_id,
-            "recipient_email":user["email"],
-            "description" : "There's a time change on this order, you can do another job",
+            "recipient_email":team[-1]["email"],
+            "description" : description,
             "subject":"Order Confirmation",
         }
-        await send_email_to_client(email_data=email_data)
-    await update_shipment_order_by_id(order_id=order_id,order_data=order_data)
-    # await update_order(order_id=order_id,data=order_data)
-    notification_datetime = datetime.combine(datetime.today(), order_data["last_notification_time"].time()) - timedelta(days=2)
-    notification_datetime = notification_datetime.time()
-    # Создайте задачу по расписанию
-    scheduler.add_job(
-        send_email_to_client,  # Передаем ссылку на функцию
-        args=[email_data],  # Передаем аргументы в виде списка
-        trigger=IntervalTrigger(minutes=30),
-        max_instances=1,
-        start_date=notification_datetime,
-        end_date=order_data["last_notification_time"].time(),
-        id=f"order_{order_id}_notification"
-    )
-    return {"success":"Information about the order has been communicated to everyone"}
+        await scheduler.add_job(
+            send_email_to_client,
+            id=f"order_{order_id}_notification",
+            interval=timedelta(minutes=30),
+            start_at=order_data["last_notification_time"] - timedelta(days=2),
+            end_at=order_data["last_notification_time"],
+            args=[email_data],
+            company=current_user.company,
+        )
+    return {"success":"Information about the order has been communicated to everyone",
+            "recipients":recipients}
 
 # Add pagination support to the router
 add_pagination(router)
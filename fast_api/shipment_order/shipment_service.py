@@ -3,6 +3,7 @@ from ..database import orders_collection  # Import the database collection
 from .shpmemt_model import ShipmentOrder  # Import the ShipmentOrder model
 from bson.objectid import ObjectId  # Import ObjectId for working with MongoDB IDs
 from .exceptions import ShipmentEmpty, ShipmentId  # Import custom exceptions
+from ..pagination import CursorParams, find_page  # Import keyset pagination helpers
 import logging  # Import the logging module
 
 # Define an asynchronous function to create a shipment order
@@ -15,20 +16,14 @@ async def create_shipment(order_data: dict):
     return {"message": "Successfully created!!!"}
 
 # Define an asynchronous function to retrieve all shipment orders based on a query
-async def get_all_orders(query: dict):
-    # Find orders in the database collection that match the given query
-    orders = orders_collection.find(query)
-    # Initialize an empty list to store the retrieved orders
-    data = [] 
-    # Iterate over the retrieved orders and convert MongoDB IDs to strings
-    async for order in orders:
-        order["id"] = str(order.pop("_id"))  # Convert MongoDB ID to string
-        data.append(order)
-    # If no orders are found, raise a custom exception
-    if len(data) == 0:
+async def get_all_orders(query: dict, params: CursorParams, projection: dict = None):
+    # Read one page of the orders that match the given query
+    page = await find_page(orders_collection, query, params, projection)
+    # If no orders are found at all, raise a custom exception
+    if not page["items"] and not params.page_token:
         raise ShipmentEmpty
-    # Return the retrieved orders
-    return data
+    # Return the retrieved page
+    return page
 
 # Define an asynchronous function to retrieve a shipment order by its ID
 async def get_shipment_order_by_id(order_id: str):
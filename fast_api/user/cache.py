@@ -0,0 +1,87 @@
+# Installed packages
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+# Local packages
+from ..redis import cache_get, cache_set, cache_delete
+from .config import USER_CACHE_SIZE, USER_CACHE_LOCAL_TTL, USER_CACHE_TTL
+from .models import DBUser, UserWithID
+from .versions import bump_user_versions
+
+
+# Never cached: the login and password paths read these from Mongo.
+SECRET_FIELDS = {"hashed_password", "verification_code"}
+
+
+class UserCache:
+    """Bounded LRU of resolved users with a per-entry TTL."""
+
+    def __init__(self, size: int, ttl: float):
+        self.size = size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, UserWithID]]" = OrderedDict()
+
+    def get(self, subject: str) -> Optional[UserWithID]:
+        entry = self._entries.get(subject)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if expires_at < time.monotonic():
+            del self._entries[subject]
+            return None
+        self._entries.move_to_end(subject)
+        return user
+
+    def put(self, subject: str, user: UserWithID):
+        self._entries[subject] = (time.monotonic() + self.ttl, user)
+        self._entries.move_to_end(subject)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def pop(self, subject: str):
+        self._entries.pop(subject, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+local_users = UserCache(USER_CACHE_SIZE, USER_CACHE_LOCAL_TTL)
+
+
+def _key(subject: str) -> str:
+    return f"user:{subject}"
+
+
+# Look a user up in this worker first, then in Redis.
+async def get_cached_user(subject: str) -> Optional[UserWithID]:
+    user = local_users.get(subject)
+    if user is not None:
+        return user
+    data = await cache_get(_key(subject))
+    if data is None:
+        return None
+    user = UserWithID(**data)
+    local_users.put(subject, user)
+    return user
+
+
+# Cache a user without its SECRET_FIELDS; returns the copy that was cached.
+async def cache_user(subject: str, user: DBUser) -> UserWithID:
+    cached = UserWithID(**user.model_dump(exclude=SECRET_FIELDS))
+    local_users.put(subject, cached)
+    await cache_set(_key(subject), cached.model_dump(exclude_none=True), ttl=USER_CACHE_TTL)
+    return cached
+
+
+# Drop users from both levels and revoke their claims tokens; other workers keep
+# their copy for at most USER_CACHE_LOCAL_TTL.
+async def invalidate_users(subjects: Iterable[str]):
+    subjects = [subject for subject in subjects if subject]
+    for subject in subjects:
+        local_users.pop(subject)
+    await cache_delete(*[_key(subject) for subject in subjects])
+    await bump_user_versions(subjects)
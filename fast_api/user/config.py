@@ -2,3 +2,19 @@ SECRET_KEY = "your-secret-key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_SECONDS = 90000
 REFRESH_TOKEN_EXPIRE_DAY = 604800
+# Resolved users for get_current_user
+USER_CACHE_SIZE = 10000
+USER_CACHE_LOCAL_TTL = 5  # seconds a worker trusts its in-process copy
+USER_CACHE_TTL = 300  # seconds a user stays in the shared Redis cache
+# Compiled role permissions for user_has_permission
+PERMISSION_VERSION_CHECK = 5  # seconds between checks of the shared registry version
+# Password hashing
+BCRYPT_ROUNDS = 12  # hashes with another cost are rehashed on the next login
+PASSWORD_WORKERS = 4  # hashes running at once, each holds one thread
+PASSWORD_QUEUE_WARNING = 64  # log when more calls than this are waiting
+# Claims-bearing access tokens (role, company, warehouse and user version in the JWT)
+ACCESS_TOKEN_CLAIMS = False
+# Device keys for scanners calling /reports
+DEVICE_KEY_VERSION_CHECK = 5  # seconds between checks of the shared key table version
+DEVICE_KEY_RELOAD = 60  # seconds after which the key table is reloaded regardless
+DEVICE_SIGNATURE_SKEW = 300  # seconds a signed request timestamp may differ from ours
@@ -28,6 +28,23 @@ class Users:
     is_confirmed="is_confirmed"
 
 
+class DeviceKeys:
+    key_id = "key_id"
+    secret = "secret"
+    name = "name"
+    user_id = "user_id"
+    company = "company"
+    warehouse = "warehouse"
+    created_by = "created_by"
+    created_at = "created_at"
+    revoked_at = "revoked_at"
+    # Request headers of a signed device call
+    key_header = "X-Device-Key"
+    timestamp_header = "X-Device-Timestamp"
+    signature_header = "X-Device-Signature"
+    content_hash_header = "X-Content-SHA256"
+
+
 class Roles:
     admin = "admin"
     director = "director"
@@ -50,6 +67,11 @@ class Token:
     properties = "properties"
     payload = "payload"
     refresh_token="refresh_token"
+    subject = "sub"
+    format = "fmt"
+    claims = "claims"
+    user_id = "uid"
+    version = "ver"
 
 
 class Messages:
@@ -0,0 +1,271 @@
+# Installed packages
+import hashlib
+import hmac
+import secrets
+import time
+from typing import Dict, List, Optional
+
+from bson.objectid import ObjectId
+from fastapi import Request
+
+# Local packages
+from ..database import device_keys_collection, users_collection
+from ..redis import cache_claim, cache_get, cache_incr
+from .config import DEVICE_KEY_VERSION_CHECK, DEVICE_KEY_RELOAD, DEVICE_SIGNATURE_SKEW
+from .constants import DeviceKeys, Roles, Users
+from .exception import (
+    DeviceKeyNotAllowed,
+    DeviceKeyNotFound,
+    InvalidDeviceSignature,
+    ReplayedDeviceSignature,
+    UserNotFound,
+)
+from .models import Principal
+
+VERSION_KEY = "device_keys:version"
+# A signature is remembered here until its timestamp is out of the accepted skew
+SIGNATURE_KEY = "device_signatures:{}"
+# Only scanner operators get device keys
+DEVICE_KEY_ROLES = (Roles.warehouseman, Roles.loader, Roles.controller)
+# Scope state entry where DeviceBodyHashMiddleware keeps the hash of the raw body
+BODY_HASH_STATE = "device_body_hash"
+
+
+# String a device signs: method, path with query, timestamp and the SHA-256 of the body,
+# which the device also sends in the content hash header.
+def signing_string(method: str, path: str, timestamp: str, content_hash: str) -> bytes:
+    return "\n".join([method.upper(), path, timestamp, content_hash]).encode()
+
+
+def sign_hash(secret: str, method: str, path: str, timestamp: str, content_hash: str) -> str:
+    return hmac.new(
+        secret.encode(), signing_string(method, path, timestamp, content_hash), hashlib.sha256
+    ).hexdigest()
+
+
+def sign(secret: str, method: str, path: str, timestamp: str, body: bytes = b"") -> str:
+    return sign_hash(secret, method, path, timestamp, hashlib.sha256(body).hexdigest())
+
+
+class BodyHash:
+    """SHA-256 of a request body, fed by the chunks as the app receives them."""
+
+    def __init__(self):
+        self._digest = hashlib.sha256()
+        self.complete = False
+
+    def update(self, message: dict):
+        if message["type"] == "http.request":
+            self._digest.update(message.get("body", b""))
+            self.complete = not message.get("more_body", False)
+
+    def hexdigest(self) -> str:
+        return self._digest.hexdigest()
+
+
+class DeviceBodyHashMiddleware:
+    """Hashes the raw body of signed device requests while it streams to the app.
+
+    FastAPI parses form bodies before dependencies run, so verify_device_request
+    can not read them again; the hash taken here is what it checks instead.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not any(
+            name == DeviceKeys.key_header.lower().encode() for name, _ in scope["headers"]
+        ):
+            await self.app(scope, receive, send)
+            return
+        body_hash = BodyHash()
+        scope.setdefault("state", {})[BODY_HASH_STATE] = body_hash
+
+        async def hashing_receive():
+            message = await receive()
+            body_hash.update(message)
+            return message
+
+        await self.app(scope, hashing_receive, send)
+
+
+class DeviceKeyTable:
+    """Active device keys of all companies, held in memory with the principal each acts as.
+
+    Verifying a request is a dict lookup and one HMAC. The table is reloaded
+    from Mongo when a key is issued or revoked on any worker (a version in
+    Redis, checked every DEVICE_KEY_VERSION_CHECK seconds) and at least every
+    DEVICE_KEY_RELOAD seconds, which is also how role changes of the owners
+    reach it: keys of owners no longer in DEVICE_KEY_ROLES are left out.
+    """
+
+    def __init__(self, check_interval: float, reload_interval: float):
+        self.check_interval = check_interval
+        self.reload_interval = reload_interval
+        self._keys: Dict[str, tuple] = {}
+        self._version = None
+        self._checked_at = 0.0
+        self._loaded_at: Optional[float] = None
+
+    def get(self, key_id: str) -> Optional[tuple]:
+        return self._keys.get(key_id)
+
+    async def load(self):
+        keys = [
+            key async for key in device_keys_collection.find(
+                {DeviceKeys.revoked_at: {"$exists": False}}
+            )
+        ]
+        user_ids = list({ObjectId(key[DeviceKeys.user_id]) for key in keys})
+        users = {}
+        if user_ids:
+            cursor = users_collection.find(
+                {
+                    Users.id_: {"$in": user_ids},
+                    Users.role: {"$in": DEVICE_KEY_ROLES},
+                    Users.deletionDate: {"$exists": False},
+                },
+                {field: 1 for field in Principal.model_fields if field != Users.id},
+            )
+            async for user in cursor:
+                user[Users.id] = str(user.pop(Users.id_))
+                users[user[Users.id]] = Principal(**user)
+        self._keys = {
+            key[DeviceKeys.key_id]: (key[DeviceKeys.secret], users[key[DeviceKeys.user_id]])
+            for key in keys
+            if key[DeviceKeys.user_id] in users
+        }
+        self._loaded_at = time.monotonic()
+
+    async def sync(self):
+        now = time.monotonic()
+        if self._loaded_at is not None and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        version = await cache_get(VERSION_KEY)
+        if (
+            self._loaded_at is None
+            or version != self._version
+            or now - self._loaded_at >= self.reload_interval
+        ):
+            self._version = version
+            await self.load()
+
+    # Force a reload on the next request.
+    def expire(self):
+        self._loaded_at = None
+
+    def __len__(self):
+        return len(self._keys)
+
+
+device_keys = DeviceKeyTable(DEVICE_KEY_VERSION_CHECK, DEVICE_KEY_RELOAD)
+
+
+# SHA-256 of the raw body: taken by DeviceBodyHashMiddleware, or read here when the
+# request did not pass through it. A body the endpoint does not read is drained first.
+async def body_hash(request: Request) -> str:
+    hashed = request.scope.get("state", {}).get(BODY_HASH_STATE)
+    if hashed is None:
+        return hashlib.sha256(await request.body()).hexdigest()
+    if not hashed.complete:
+        await request.body()
+    return hashed.hexdigest()
+
+
+# Principal of a signed device request; raises InvalidDeviceSignature otherwise.
+async def verify_device_request(request: Request) -> Principal:
+    key_id = request.headers.get(DeviceKeys.key_header)
+    timestamp = request.headers.get(DeviceKeys.timestamp_header, "")
+    signature = request.headers.get(DeviceKeys.signature_header, "")
+    try:
+        skew = abs(time.time() - float(timestamp))
+    except ValueError:
+        raise InvalidDeviceSignature
+    if skew > DEVICE_SIGNATURE_SKEW:
+        raise InvalidDeviceSignature
+    await device_keys.sync()
+    entry = device_keys.get(key_id)
+    if entry is None:
+        raise InvalidDeviceSignature
+    secret, principal = entry
+    path = request.url.path
+    if request.url.query:
+        path += "?" + request.url.query
+    content_hash = request.headers.get(DeviceKeys.content_hash_header, "")
+    expected = sign_hash(secret, request.method, path, timestamp, content_hash)
+    if not hmac.compare_digest(expected.encode(), signature.encode()):
+        raise InvalidDeviceSignature
+    if not hmac.compare_digest((await body_hash(request)).encode(), content_hash.encode()):
+        raise InvalidDeviceSignature
+    # Each signature is accepted once; a Redis failure rejects rather than risk a replay.
+    ttl = int(float(timestamp) + DEVICE_SIGNATURE_SKEW - time.time()) + 1
+    if not await cache_claim(SIGNATURE_KEY.format(signature), ttl):
+        raise ReplayedDeviceSignature
+    return principal
+
+
+# Make every worker reload its key table, e.g. after owners were removed.
+async def reload_device_keys():
+    await cache_incr(VERSION_KEY)
+    device_keys.expire()
+
+
+# Issue a key that acts as the given scanner operator; the secret is only returned here.
+# An issuer bound to a warehouse can only issue keys for workers of that warehouse.
+async def issue_device_key(
+    user_id: str, company: str, name: str, created_by: str, warehouse: Optional[str] = None
+) -> dict:
+    query = {Users.id_: ObjectId(user_id), Users.company: company, Users.deletionDate: {"$exists": False}}
+    if warehouse is not None:
+        query[Users.warehouse] = warehouse
+    user = await users_collection.find_one(query, {Users.warehouse: 1, Users.role: 1})
+    if not user:
+        raise UserNotFound
+    if user.get(Users.role) not in DEVICE_KEY_ROLES:
+        raise DeviceKeyNotAllowed
+    key = {
+        DeviceKeys.key_id: "dk_" + secrets.token_hex(8),
+        DeviceKeys.secret: secrets.token_urlsafe(32),
+        DeviceKeys.name: name,
+        DeviceKeys.user_id: user_id,
+        DeviceKeys.company: company,
+        DeviceKeys.warehouse: user.get(Users.warehouse),
+        DeviceKeys.created_by: created_by,
+        DeviceKeys.created_at: time.time(),
+    }
+    await device_keys_collection.insert_one(dict(key))
+    await reload_device_keys()
+    return key
+
+
+async def get_device_keys(company: str) -> List[dict]:
+    cursor = device_keys_collection.find(
+        {DeviceKeys.company: company}, {"_id": 0, DeviceKeys.secret: 0}
+    )
+    return [key async for key in cursor]
+
+
+async def revoke_device_key(key_id: str, company: str):
+    result = await device_keys_collection.update_one(
+        {
+            DeviceKeys.key_id: key_id,
+            DeviceKeys.company: company,
+            DeviceKeys.revoked_at: {"$exists": False},
+        },
+        {"$set": {DeviceKeys.revoked_at: time.time()}},
+    )
+    if not result.matched_count:
+        raise DeviceKeyNotFound
+    await reload_device_keys()
+
+
+# Revoke every key of the given workers, e.g. when they are removed.
+async def revoke_user_device_keys(user_ids: List[str]):
+    result = await device_keys_collection.update_many(
+        {DeviceKeys.user_id: {"$in": user_ids}, DeviceKeys.revoked_at: {"$exists": False}},
+        {"$set": {DeviceKeys.revoked_at: time.time()}},
+    )
+    if result.modified_count:
+        await reload_device_keys()
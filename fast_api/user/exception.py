@@ -1,4 +1,5 @@
-from ..exceptions import(NotFound,AllReadyExists,DoesNotExist)
+from fastapi import status
+from ..exceptions import(NotFound,AllReadyExists,DoesNotExist,DetailHttpExceptionn,PermissionDenided)
 from .constants import Messages
 
 class UserAlreadyExist(AllReadyExists):
@@ -16,4 +17,17 @@ class RoleNotFoundByQuery(NotFound):
     DETAIL ="role not found by this query"
 
 class PermissionNotFoundById(NotFound):
-    DETAIL = "permission not found by id"
\ No newline at end of file
+    DETAIL = "permission not found by id"
+
+class DeviceKeyNotFound(NotFound):
+    DETAIL = "device key not found"
+
+class DeviceKeyNotAllowed(PermissionDenided):
+    DETAIL = "device keys are only issued for warehousemen, loaders and controllers"
+
+class InvalidDeviceSignature(DetailHttpExceptionn):
+    STATUS_CODE = status.HTTP_401_UNAUTHORIZED
+    DETAIL = "invalid device key or signature"
+
+class ReplayedDeviceSignature(InvalidDeviceSignature):
+    DETAIL = "device request signature was already used"
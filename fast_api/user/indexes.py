@@ -0,0 +1,41 @@
+# Installed packages
+from pymongo import IndexModel, ASCENDING, DESCENDING
+
+# Local packages
+from ..database import users_collection, roles_collection, device_keys_collection
+from .constants import Users, DeviceKeys
+
+# Partial indexes cannot express the "deletionDate $exists false" soft-delete filter,
+# so deletionDate is the last key of every index used together with it, followed by _id
+# on the indexes behind paginated lists, which find_page sorts newest first.
+INDEXES = {
+    users_collection.name: [
+        IndexModel(
+            [(Users.company, ASCENDING), (Users.deletionDate, ASCENDING), ("_id", DESCENDING)],
+            name="users_company_live",
+        ),
+        IndexModel(
+            [
+                (Users.company, ASCENDING),
+                (Users.warehouse, ASCENDING),
+                (Users.deletionDate, ASCENDING),
+                ("_id", DESCENDING),
+            ],
+            name="users_company_warehouse_live",
+        ),
+        IndexModel(
+            [(Users.orders + "." + Users.order_id, ASCENDING), (Users.deletionDate, ASCENDING)],
+            name="users_order_live",
+        ),
+    ],
+    roles_collection.name: [
+        IndexModel(
+            [("role_name", ASCENDING), ("company_name", ASCENDING)],
+            name="roles_role_company",
+        ),
+    ],
+    device_keys_collection.name: [
+        IndexModel([(DeviceKeys.key_id, ASCENDING)], name="device_keys_key_id", unique=True),
+        IndexModel([(DeviceKeys.company, ASCENDING)], name="device_keys_company"),
+    ],
+}
@@ -194,6 +194,22 @@ class DBUser(UserOut):
     hashed_password: str = Field(..., description="hash of the password")
 
 
+class Principal(BaseModel):
+    """User read from the claims of an access token; has no password hash."""
+    id: str
+    email: str
+    role: str
+    company: str
+    warehouse: Optional[str] = None
+    firstname: Optional[str] = None
+    lastname: Optional[str] = None
+    telephone: Optional[str] = None
+
+
+class DeviceKeyCreate(BaseModel):
+    name: str = Field(..., description="label of the scanner", max_length=100)
+
+
 class UserChangePassword(BaseModel):
     email: str = Field(..., description="firstname of a user", max_length=100)
     old_password: str = Field(..., description="the current password of user")
@@ -0,0 +1,79 @@
+# Installed packages
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+# Local packages
+from .config import PASSWORD_WORKERS, PASSWORD_QUEUE_WARNING
+
+logger = logging.getLogger("passwords")
+
+
+class PasswordPool:
+    """Runs bcrypt work on a few dedicated threads so it never blocks the event loop.
+
+    bcrypt releases the GIL while hashing, so threads give real parallelism.
+    At most `workers` calls run at once; the rest wait on a semaphore, which is
+    what `stats()` reports as the queue.
+    """
+
+    def __init__(self, workers: int, queue_warning: int):
+        self.workers = workers
+        self.queue_warning = queue_warning
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots = asyncio.Semaphore(workers)
+        self.waiting = 0
+        self.running = 0
+        self.max_waiting = 0
+        self.completed = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="passwords")
+        return self._executor
+
+    async def run(self, func, *args):
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        if self.waiting > self.queue_warning:
+            logger.warning(f"{self.waiting} password checks are waiting for a worker")
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        started_at = time.perf_counter()
+        self.wait_seconds += started_at - queued_at
+        self.running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self.run_seconds += time.perf_counter() - started_at
+            self._slots.release()
+
+    def stats(self) -> dict:
+        completed = self.completed or 1
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "completed": self.completed,
+            "avg_wait_ms": round(self.wait_seconds / completed * 1000, 2),
+            "avg_run_ms": round(self.run_seconds / completed * 1000, 2),
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+password_pool = PasswordPool(PASSWORD_WORKERS, PASSWORD_QUEUE_WARNING)
@@ -0,0 +1,82 @@
+# Installed packages
+import time
+from typing import Dict, FrozenSet, Optional, Tuple
+
+# Local packages
+from ..database import roles_collection
+from ..redis import cache_get, cache_incr
+from .config import PERMISSION_VERSION_CHECK
+
+VERSION_KEY = "permissions:version"
+
+
+class PermissionRegistry:
+    """Permission names of every (company, role), compiled into frozensets on first use.
+
+    A role that does not exist is stored as None so a bad role does not go back
+    to Mongo either. Role and permission writes clear the registry and bump a
+    version in Redis; other workers notice it within PERMISSION_VERSION_CHECK.
+    """
+
+    def __init__(self, check_interval: float):
+        self.check_interval = check_interval
+        self._roles: Dict[Tuple[str, str], Optional[FrozenSet[str]]] = {}
+        self._version = None
+        self._checked_at = 0.0
+
+    def get(self, company: str, role: str):
+        return self._roles.get((company, role), False)
+
+    def put(self, company: str, role: str, permissions: Optional[FrozenSet[str]]):
+        self._roles[(company, role)] = permissions
+
+    def clear(self, version=None):
+        self._roles.clear()
+        if version is not None:
+            self._version = version
+
+    # Drop everything when another worker changed roles since the last check.
+    async def sync(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        version = await cache_get(VERSION_KEY)
+        if version != self._version:
+            self._version = version
+            self.clear()
+
+    def __len__(self):
+        return len(self._roles)
+
+
+registry = PermissionRegistry(PERMISSION_VERSION_CHECK)
+
+
+def compile_permissions(role: Optional[dict]) -> Optional[FrozenSet[str]]:
+    if role is None:
+        return None
+    return frozenset(
+        perm["permission_name"]
+        for perm in role.get("permissions") or []
+        if isinstance(perm, dict) and "permission_name" in perm
+    )
+
+
+# Permission names of a role in a company, or None when the role does not exist.
+async def role_permissions(company: str, role: str) -> Optional[FrozenSet[str]]:
+    await registry.sync()
+    permissions = registry.get(company, role)
+    if permissions is not False:
+        return permissions
+    doc = await roles_collection.find_one(
+        {"role_name": role, "company_name": company}, {"permissions": 1}
+    )
+    permissions = compile_permissions(doc)
+    registry.put(company, role, permissions)
+    return permissions
+
+
+# Called after any write to roles or permissions.
+async def invalidate_permissions():
+    registry.clear(await cache_incr(VERSION_KEY))
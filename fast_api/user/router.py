@@ -19,7 +19,8 @@ from ..dependencies import (
     check_access_n_credentials,
     check_manager_permission,
     generate_random_code,
-    user_has_permission
+    user_has_permission,
+    require,
     # upload_files_for_place,
 )
 from ..exceptions import (
@@ -31,6 +32,7 @@ from ..exceptions import (
     DoesNotExist,
 )
 from ..responses import Success
+from ..pagination import CursorPage, CursorParams, model_projection
 from .models import (
     UserWithID,
     DBUser,
@@ -39,9 +41,11 @@ from .models import (
     UserChangePassword,
     UserUpdate,
     ImageCreate,
-    ForgotPassword
+    ForgotPassword,
+    DeviceKeyCreate,
 )
 from . import service
+from . import device_keys
 from . import utils
 from . import constants
 
@@ -52,17 +56,54 @@ router = APIRouter(prefix="/users", tags=["users"])
 # Пример использования user_has_permission вместо check_role_access:
 @router.get(
     "/",
-    response_model=Page[UserWithID],
+    response_model=CursorPage[UserWithID],
     responses=get_exception_responses(UnauthorizedException, PermissionException),
 )
-async def get_all_users(user: DBUser = Depends(get_current_user)):
+async def get_all_users(params: CursorParams = Depends(), user: DBUser = Depends(get_current_user)):
     # Предположим, что у вас есть разрешение "view_all_users" для просмотра всех пользователей.
     query={
         "role_name":user.role,
         "company_name":user.company
     }
     await user_has_permission(query, "view_all_users")
-    return paginate(await service.get_all_users_by_company(user.company))
+    return await service.get_all_users_by_company(
+        user.company, params, model_projection(UserWithID)
+    )
+
+# Device keys of the company's scanners (the secret is never listed)
+@router.get(
+    "/device-keys",
+    response_model=list,
+    responses=get_exception_responses(UnauthorizedException, PermissionException),
+)
+async def get_device_keys(current_user: DBUser = Depends(require("issue_device_key"))):
+    return await device_keys.get_device_keys(current_user.company)
+
+# Issue a device key acting as a worker; the secret is shown only in this response
+@router.post(
+    "/{user_id}/device-keys",
+    response_model=dict,
+    responses=get_exception_responses(UnauthorizedException, PermissionException),
+)
+async def issue_device_key(
+    user_id: str,
+    data: DeviceKeyCreate,
+    current_user: DBUser = Depends(require("issue_device_key")),
+):
+    return await device_keys.issue_device_key(
+        user_id, current_user.company, data.name, current_user.id, current_user.warehouse
+    )
+
+@router.delete(
+    "/device-keys/{key_id}",
+    response_model=dict,
+    responses=get_exception_responses(UnauthorizedException, PermissionException),
+)
+async def revoke_device_key(
+    key_id: str, current_user: DBUser = Depends(require("revoke_device_key"))
+):
+    await device_keys.revoke_device_key(key_id, current_user.company)
+    return {"success": f"successfully revoked device key {key_id}"}
 
 # Endpoint to get a user by their ID
 @router.get(
@@ -120,7 +161,7 @@ async def register_user(
     #     [constants.Roles.director, constants.Roles.admin, constants.Roles.manager],
     # )
     # Hash the user's password for security
-    hashed_password = utils.hash_password(request.password)
+    hashed_password = await utils.hash_password(request.password)
     # Create a dictionary representing the user document
     user = request.dict()
     # Add the hashed password to the user document
@@ -196,9 +237,11 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     if user.is_confirmed ==False:
         raise HTTPException(403,detail="you don't have confirmed verification code")
     # Check if user exists and password is correct
-    await utils.verify_password_exception(password, user.hashed_password)
+    new_hash = await utils.verify_password_exception(password, user.hashed_password)
+    if new_hash:
+        await service.change_password_(username, new_hash)
     # Return access token and refresh token
-    access_token = await utils.create_access_token(username)
+    access_token = await utils.create_access_token(username, user)
     refresh_token = await utils.create_refresh_token(username)
     # response = JSONResponse(content={"access_token": access_token, "refresh_token": refresh_token})
     # response.set_cookie(key="token", value=access_token)
@@ -273,15 +316,16 @@ async def change_password(
     user: UserChangePassword, current_user: DBUser = Depends(get_current_user)
 ):
     # Check access and credentials before changing the password
+    stored_user = await service.get_user_by(constants.Users.email, current_user.email)
     await check_access_n_credentials(
         user.email,
         current_user.email,
         user.old_password,
-        current_user.hashed_password,
+        stored_user.hashed_password,
         current_user.role,
     )
     # Hash the new password and update it
-    hashed_password = utils.hash_password(user.new_password)
+    hashed_password = await utils.hash_password(user.new_password)
     await service.change_password_(user.email, hashed_password)
     return {
         constants.Messages.message: constants.Messages.pswrd_chngd,
@@ -327,7 +371,7 @@ async def change_password_with_verification_code(verf_data:ForgotPassword):
     query ={"email":verf_data.email,
             "verification_code":int(verf_data.verification_code)}
     user = await service.custom_get_user_info_get(query=query)
-    hashed_password = utils.hash_password(verf_data.new_password)
+    hashed_password = await utils.hash_password(verf_data.new_password)
     user["is_confirmed"]=True
     user["hashed_password"]= hashed_password
     await service.update_user(user_id=user["id"],data=user)
@@ -1,4 +1,6 @@
 # Import necessary packages and modules
+import asyncio
+from typing import Optional
 from bson.objectid import ObjectId
 from datetime import datetime
 from fastapi import HTTPException, status
@@ -19,11 +21,15 @@ from ..exceptions import (
     AlreadyAssignedException,
     EmployeeWorkStatus
 )
+from ..pagination import CursorParams, find_page
 from .exception import (
     UserAlreadyExist, UserNotFound,
     RolesNotFoundById,PermissionNotFoundById,RoleNotFoundByQuery)
 from .models import DBUser, UserWithID, DBUserWithoutId
 from .constants import Users
+from .cache import invalidate_users
+from .permissions import invalidate_permissions
+from .device_keys import revoke_user_device_keys, reload_device_keys
 from ..company.constants import Company
 from ..company.models import DeleteWarehouse
 from ..order.constants import Orders
@@ -37,8 +43,8 @@ async def check_founder_exists(email):
     if data:
         raise UserAlreadyExist()
     
-async def custom_get_user_info_get(query:dict)->dict:
-    user = await users_collection.find_one(query)
+async def custom_get_user_info_get(query:dict, projection: dict = None)->dict:
+    user = await users_collection.find_one(query, projection)
     if user:
         user["id"]= str(user.pop("_id"))
         return user
@@ -60,37 +66,37 @@ async def register_user_(user: dict):
     # Register the user
     await users_collection.insert_one(user)
 
+# Emails (the token subjects) of the users matching a query, for cache invalidation
+async def user_emails(query: dict) -> list:
+    return await users_collection.distinct(Users.email, query)
+
 # Define an asynchronous function to update user data
 async def update_user(user_id: str, data: dict):
-    result = await users_collection.update_one(
-        {Users.id_: ObjectId(user_id), Users.deletionDate: {"$exists": False}},
-        {"$set": data},
-    )
+    query = {Users.id_: ObjectId(user_id), Users.deletionDate: {"$exists": False}}
+    emails = await user_emails(query)
+    result = await users_collection.update_one(query, {"$set": data})
+    await invalidate_users(emails)
     if not result.modified_count:
         raise UserNotFound()
 
 # Define an asynchronous function to get all users by company
-async def get_all_users_by_company(company: str):
-    users = users_collection.find(
-        {Users.company: company, Users.deletionDate: {"$exists": False}}
+async def get_all_users_by_company(company: str, params: CursorParams, projection: dict = None) -> dict:
+    return await find_page(
+        users_collection,
+        {Users.company: company, Users.deletionDate: {"$exists": False}},
+        params,
+        projection,
     )
-    if users is None:
-        raise CompanyNotFound()
-    users_list = []
-    async for user in users:
-        user[Users.id] = str(user.pop(Users.id_))
-        users_list.append(user)
-
-    return users_list
 
 # Define an asynchronous function to get all users by warehouse
-async def get_all_users_by_warehouse(company: str, warehouse: str):
+async def get_all_users_by_warehouse(company: str, warehouse: str, projection: dict = None):
     users = users_collection.find(
         {
             Users.company: company,
             Users.warehouse: warehouse,
             Users.deletionDate: {"$exists": False},
-        }
+        },
+        projection,
     )
     if users is None:
         raise UserNotFound()
@@ -114,8 +120,8 @@ async def get_user_by(field: str, user_data: str) -> DBUser:
     user[Users.id] = str(user.pop(Users.id_))
     return DBUser(**user)
 
-async def user_by_email(user_email:str)->dict:
-    user_data = await users_collection.find_one({"email":user_email})
+async def user_by_email(user_email:str, projection: dict = None)->dict:
+    user_data = await users_collection.find_one({"email":user_email}, projection)
     if user_data is None:
         raise DoesNotExist()
     user_data["id"]=str(user_data.pop("_id"))
@@ -127,33 +133,38 @@ async def user_by_email(user_email:str)->dict:
 async def remove_user(user_id: str):
     query = {Users.deletionDate: datetime.utcnow()}
     user_id = ObjectId(user_id)
+    emails = await user_emails({Users.id_: user_id})
     result = await users_collection.update_one(
         {Users.id_: user_id, Users.deletionDate: {"$exists": False}}, {"$set": query}
     )
+    await invalidate_users(emails)
     if not result.matched_count:
         raise UserNotFound()
+    await revoke_user_device_keys([str(user_id)])
 
 # Define an asynchronous function to remove all users in a company
 async def remove_all_user_in_company(company_name: str):
     query = {Users.deletionDate: datetime.utcnow()}
-    result = await users_collection.update_many(
-        {Users.company: company_name, Users.deletionDate: {"$exists": False}},
-        {"$set": query},
-    )
+    users_query = {Users.company: company_name, Users.deletionDate: {"$exists": False}}
+    emails = await user_emails(users_query)
+    result = await users_collection.update_many(users_query, {"$set": query})
+    await invalidate_users(emails)
+    await reload_device_keys()
     if not result.matched_count:
         raise DoesNotExist
 
 # Define an asynchronous function to remove all users in a warehouse
 async def remove_all_users_in_warehouse(query: DeleteWarehouse):
     set_query = {Users.deletionDate: datetime.utcnow()}
-    result = await users_collection.update_many(
-        {
-            Users.company: query.company_name,
-            Users.warehouse: query.warehouse_name,
-            Users.deletionDate: {"$exists": False},
-        },
-        {"$set": set_query},
-    )
+    users_query = {
+        Users.company: query.company_name,
+        Users.warehouse: query.warehouse_name,
+        Users.deletionDate: {"$exists": False},
+    }
+    emails = await user_emails(users_query)
+    result = await users_collection.update_many(users_query, {"$set": set_query})
+    await invalidate_users(emails)
+    await reload_device_keys()
     if not result.matched_count:
         raise UserNotFound()
 
@@ -163,6 +174,7 @@ async def change_password_(username, hashed_password):
         {Users.email: username, Users.deletionDate: {"$exists": False}},
         {"$set": {Users.hashed_password: hashed_password}},
     )
+    await invalidate_users([username])
     if not request.matched_count:
         raise InvalidCredentialsException
 
@@ -257,13 +269,14 @@ async def check_user_status_for_order(user_id: str, order_id: str):
         raise EmployeeWorkStatus
 
 # Define an asynchronous function to get users associated with an order by order ID
-async def users_by_order_id(order_id: str):
+async def users_by_order_id(order_id: str, projection: dict = None):
     users_data = []
     cursor = users_collection.find(
         {
             Users.orders + "." + Users.order_id: order_id,
             Users.deletionDate: {"$exists": False},
-        }
+        },
+        projection,
     )
     async for user in cursor:
         user[Users.id] = str(user.pop(Users.id_))
@@ -300,6 +313,24 @@ async def update_user_order_status(user_id:str,order_data:dict):
         pass
     else:
         raise UserNotFound
+
+# Set the status of an order for each of the users, one conditional update per user with at
+# most `semaphore` in flight; returns the ids of the users whose update matched the order.
+async def update_users_order_status(
+    user_ids: list, order_id: str, status: str, semaphore: Optional[asyncio.Semaphore] = None
+) -> set:
+    semaphore = semaphore or asyncio.Semaphore(max(len(user_ids), 1))
+
+    async def update(user_id: str) -> bool:
+        async with semaphore:
+            result = await users_collection.update_one(
+                {Users.id_: ObjectId(user_id), Users.orders + "." + Users.order_id: order_id},
+                {"$set": {Users.orders + ".$." + Orders.status: status}},
+            )
+        return result.matched_count > 0
+
+    matched = await asyncio.gather(*(update(user_id) for user_id in user_ids))
+    return {user_id for user_id, found in zip(user_ids, matched) if found}
     
 
 
@@ -310,21 +341,21 @@ async def update_user_order_status(user_id:str,order_data:dict):
 async def create_role_for_users(role_data:dict):
     result = await roles_collection.insert_one(role_data)
     if result.inserted_id:
-        pass
+        await invalidate_permissions()
     else:
         raise Exception("error in the create role")
 
-async def get_role_by_id(id:str)->dict:
-    result = await roles_collection.find_one({"_id":ObjectId(id)})
+async def get_role_by_id(id:str, projection: dict = None)->dict:
+    result = await roles_collection.find_one({"_id":ObjectId(id)}, projection)
     if result:
         result["id"]= str(result.pop("_id"))
         return result
     else:
         raise RolesNotFoundById
     
-async def get_all_roles_in_company(query:dict)->list:
+async def get_all_roles_in_company(query:dict, projection: dict = None)->list:
     result =[]
-    roles = roles_collection.find(query)
+    roles = roles_collection.find(query, projection)
     # if roles is None :
     #     raise RoleNotFoundByQuery
     async for rol in roles:
@@ -335,14 +366,14 @@ async def get_all_roles_in_company(query:dict)->list:
 async def delete_role_by_id(id:str):
     res = await roles_collection.delete_one({"_id":ObjectId(id)})
     if res.deleted_count>0:
-        pass
+        await invalidate_permissions()
     else:
         raise RolesNotFoundById
     
 async def update_role_by_data(id:str,data:dict):
     result = await roles_collection.update_one({"_id":ObjectId(id)},{"$set":data})
     if result.matched_count >0:
-        pass
+        await invalidate_permissions()
     else:
         raise RolesNotFoundById
 
@@ -350,7 +381,7 @@ async def update_role_by_data(id:str,data:dict):
 async def create_permission(data:dict):
     result = await permissions_collection.insert_one(data)
     if result.inserted_id:
-        pass
+        await invalidate_permissions()
     else:
         raise Exception("error in permission create")
 
@@ -374,13 +405,13 @@ async def get_all_permission_data(query:dict)->list:
 async def update_permission_by_id(id:str,data:dict):
     result = await permissions_collection.update_one({"_id":ObjectId(id)},{"$set":data})
     if result.matched_count>0:
-        pass
+        await invalidate_permissions()
     else:
         raise PermissionNotFoundById
     
 async def delete_permission_by_id(id:str):
     res = await permissions_collection.delete_one({"_id":ObjectId(id)})
     if res.deleted_count>0:
-        pass
+        await invalidate_permissions()
     else:
         raise PermissionNotFoundById
\ No newline at end of file
@@ -5,19 +5,47 @@ import time
 
 # Local packages
 from ..exceptions import InvalidCredentialsException
-from .config import ACCESS_TOKEN_EXPIRE_SECONDS, SECRET_KEY, ALGORITHM,REFRESH_TOKEN_EXPIRE_DAY
+from .config import ACCESS_TOKEN_EXPIRE_SECONDS, SECRET_KEY, ALGORITHM,REFRESH_TOKEN_EXPIRE_DAY, BCRYPT_ROUNDS, ACCESS_TOKEN_CLAIMS
+from .passwords import password_pool
+from .versions import ensure_user_version
 from .constants import Users, Token
 from ..database import temporary_tokens_collection
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# min/max rounds make hashes with any other cost "need update", see verify_password_exception.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
 
 
-async def create_access_token(user_id: str):
+async def create_access_token(user_id: str, user=None):
     expire = time.time() + ACCESS_TOKEN_EXPIRE_SECONDS
     payload = {"sub": user_id, Token.expires: expire}
+    if ACCESS_TOKEN_CLAIMS and user is not None:
+        payload.update(await token_claims(user))
     token = jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
     return token
 
+# Claims that let get_current_user skip the user lookup; empty when Redis cannot version them.
+async def token_claims(user) -> dict:
+    version = await ensure_user_version(user.email)
+    if version is None:
+        return {}
+    return {
+        Token.format: Token.claims,
+        Token.version: version,
+        Token.user_id: user.id,
+        Users.role: user.role,
+        Users.company: user.company,
+        Users.warehouse: user.warehouse,
+        Users.firstname: user.firstname,
+        Users.lastname: user.lastname,
+        Users.telephone: user.telephone,
+    }
+
 async def create_refresh_token(user_email:str):
     expire = time.time() + REFRESH_TOKEN_EXPIRE_DAY
     payload = {"sub": user_email, Token.expires: expire}
@@ -26,17 +54,22 @@ async def create_refresh_token(user_email:str):
     # await temporary_tokens_collection.insert_one(refresh)
     return token
 
-def hash_password(password: str):
-    return pwd_context.hash(password)
+async def hash_password(password: str):
+    return await password_pool.run(pwd_context.hash, password)
 
 
-def verify_password(plain_password: str, hashed_password: str):
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str):
+    return await password_pool.run(pwd_context.verify, plain_password, hashed_password)
 
 
+# Returns a new hash when the stored one was made with another cost, else None.
 async def verify_password_exception(plain_password: str, hashed_password: str):
-    if not verify_password(plain_password, hashed_password):
+    valid, new_hash = await password_pool.run(
+        pwd_context.verify_and_update, plain_password, hashed_password
+    )
+    if not valid:
         raise InvalidCredentialsException
+    return new_hash
 
 
 def password_validation(passwd) -> str | None:
@@ -0,0 +1,31 @@
+# Local packages
+import time
+from typing import Iterable, Optional
+
+from ..redis import cache_add, cache_get, cache_incr_many
+
+# Every user has a counter in Redis. Claims tokens carry the value it had when
+# they were issued; bumping it revokes all of the user's claims tokens.
+# A counter lost to eviction or a flush restarts from the current time in
+# microseconds, above any value it had before, so old tokens stay revoked.
+
+
+def _key(subject: str) -> str:
+    return f"user_version:{subject}"
+
+
+def _start() -> int:
+    return time.time_ns() // 1000
+
+
+async def user_version(subject: str) -> Optional[int]:
+    return await cache_get(_key(subject))
+
+
+# Current version of a user, starting the counter if needed; None when Redis is unavailable.
+async def ensure_user_version(subject: str) -> Optional[int]:
+    return await cache_add(_key(subject), _start())
+
+
+async def bump_user_versions(subjects: Iterable[str]):
+    await cache_incr_many((_key(subject) for subject in subjects), start=_start())
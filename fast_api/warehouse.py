@@ -10,6 +10,8 @@ from .database import (
 )
 from .service import allocate_product_warehouse
 from .config import RACK_SIZE, SHELF_SIZE, FLOOR_LEVELS
+from .warehouse.capacity import CellCapacityEngine
+from .warehouse.constants import Cells
 
 
 class Warehouse:
@@ -122,44 +124,42 @@ class Warehouse:
     #     return
 
     async def calculate_allocation(self, product_id, weight, booking_date):
-        # Create a data structure to track the availability of each row, shelf, and floor level
-        availability = [
-            [[True] * (SHELF_SIZE + 1) for _ in range(FLOOR_LEVELS + 1)]
-            for _ in range(RACK_SIZE + 1)
+        # Every row:floor:shelf slot of the grid is a unit-volume cell, in allocation order.
+        slots = [
+            {
+                Cells.id: f"{row}:{floor}:{shelf}",
+                Cells.cell_volume: 1,
+                Cells.cell_weight: float("inf"),
+            }
+            for row in range(1, RACK_SIZE + 1)
+            for floor in range(1, FLOOR_LEVELS + 1)
+            for shelf in range(1, SHELF_SIZE + 1)
         ]
+        engine = CellCapacityEngine(slots)
 
-        occupied_locations = (
-            await self.locations_collection.find(
-                {"product_id": {"$ne": None}},
-                {"warehouse_row": 1, "floor_level": 1, "shelf_num": 1, "product_id": 1},
+        occupied_locations = await self.locations_collection.find(
+            {"product_id": {"$ne": None}},
+            {"warehouse_row": 1, "floor_level": 1, "shelf_num": 1},
+        ).to_list(None)
+        allocated_location_ids = set(
+            await self.products_collection.distinct(
+                "location_id", {"location_id": {"$exists": True}}
             )
-            .sort([("warehouse_row", 1), ("floor_level", 1), ("shelf_num", 1)])
-            .to_list(None)
         )
 
-        allocated_products = await self.products_collection.find(
-            {"location_id": {"$exists": True}},
-            {"weight": 1, "booking_date": 1, "location_id": 1},
-        ).to_list(None)
-
-        matched_data = []
-
+        # Mark the slots whose location holds an allocated product as full.
         for location in occupied_locations:
-            for product in allocated_products:
-                if location["_id"] == product["location_id"]:
-                    matched_data.append({"product": product, "location": location})
-
-        for doc in matched_data:
-            row = doc["location"]["warehouse_row"]
-            floor = doc["location"]["floor_level"]
-            shelf = doc["location"]["shelf_num"]
-
-            availability[row][floor][shelf] = False
+            if location["_id"] not in allocated_location_ids:
+                continue
+            slot_id = (
+                f"{location['warehouse_row']}:{location['floor_level']}:{location['shelf_num']}"
+            )
+            engine.update(slot_id, {Cells.cell_volume: 0})
 
-        for row in range(1, RACK_SIZE + 1):
-            for floor in range(1, FLOOR_LEVELS + 1):
-                for shelf in range(1, SHELF_SIZE + 1):
-                    if availability[row][floor][shelf]:
-                        await allocate_product_warehouse(product_id, row, floor, shelf)
-                        return row, floor, shelf
-        # await handle_unallocated_product(product_id)
+        slot = engine.first_fit(1, 0)
+        if slot is None:
+            # await handle_unallocated_product(product_id)
+            return None
+        row, floor, shelf = (int(part) for part in engine.ids[slot].split(":"))
+        await allocate_product_warehouse(product_id, row, floor, shelf)
+        return row, floor, shelf
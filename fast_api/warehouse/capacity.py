@@ -0,0 +1,123 @@
+# Installed packages
+import numpy as np
+from typing import Dict, Iterable, List, Optional
+
+# Local packages
+from .constants import Cells, Topology
+
+
+class CellCapacityEngine:
+    """Columnar view of a warehouse's cells used to answer fit queries with numpy.
+
+    Every cell is a row in parallel arrays (remaining volume, remaining weight,
+    usable flag and rack/floor/zone codes), so a "best cell for this product"
+    query is a couple of vectorized masks and one argmin instead of a Python loop.
+    Rows keep the order the cells were given in, which breaks ties the same way a
+    first-fit walk would.
+    """
+
+    def __init__(self, cells: Iterable[dict]):
+        cells = list(cells)
+        self.ids: List[str] = [cell[Cells.id] for cell in cells]
+        self.index: Dict[str, int] = {cell_id: i for i, cell_id in enumerate(self.ids)}
+        self.volume = np.array(
+            [cell.get(Cells.cell_volume, 0) for cell in cells], dtype=np.float64
+        )
+        self.weight = np.array(
+            [cell.get(Cells.cell_weight, 0) for cell in cells], dtype=np.float64
+        )
+        self.usable = np.array(
+            [cell.get(Cells.status) != Cells.inactive for cell in cells], dtype=bool
+        )
+        self.zone_codes, self.zone = self._encode(cells, Topology.zone_id)
+        self.rack_codes, self.rack = self._encode(cells, Topology.rack_id)
+        self.floor_codes, self.floor = self._encode(cells, Topology.floor_id)
+        self.zone_ids = list(self.zone_codes)
+        self.rack_ids = list(self.rack_codes)
+        self.floor_ids = list(self.floor_codes)
+
+    # Replace string ids of a column with small integer codes.
+    @staticmethod
+    def _encode(cells: list, field: str):
+        codes: Dict[str, int] = {}
+        column = np.array(
+            [codes.setdefault(cell.get(field), len(codes)) for cell in cells], dtype=np.int32
+        )
+        return codes, column
+
+    def __len__(self):
+        return len(self.ids)
+
+    # Independent copy of the counters, used to plan without touching the snapshot.
+    def copy(self) -> "CellCapacityEngine":
+        engine = CellCapacityEngine.__new__(CellCapacityEngine)
+        engine.__dict__.update(self.__dict__)
+        engine.volume = self.volume.copy()
+        engine.weight = self.weight.copy()
+        engine.usable = self.usable.copy()
+        return engine
+
+    def _zone_mask(self, zone_ids: Optional[Iterable[str]]):
+        if zone_ids is None:
+            return np.ones(len(self.ids), dtype=bool)
+        codes = [self.zone_codes[zone_id] for zone_id in zone_ids if zone_id in self.zone_codes]
+        return np.isin(self.zone, codes)
+
+    # Mask of the cells that can take the given volume and weight.
+    def fits(self, volume: float, weight: float, zone_ids: Optional[Iterable[str]] = None):
+        return (
+            self.usable
+            & (self.volume >= volume)
+            & (self.weight >= weight)
+            & self._zone_mask(zone_ids)
+        )
+
+    # Row of the cell that leaves the least free volume after placing the product.
+    def best_fit(
+        self, volume: float, weight: float, zone_ids: Optional[Iterable[str]] = None
+    ) -> Optional[int]:
+        if not len(self.ids):
+            return None
+        mask = self.fits(volume, weight, zone_ids)
+        if not mask.any():
+            return None
+        slack = np.where(mask, self.volume - volume, np.inf)
+        return int(np.argmin(slack))
+
+    # Row of the first cell in order that fits.
+    def first_fit(
+        self, volume: float, weight: float, zone_ids: Optional[Iterable[str]] = None
+    ) -> Optional[int]:
+        if not len(self.ids):
+            return None
+        mask = self.fits(volume, weight, zone_ids)
+        if not mask.any():
+            return None
+        return int(np.argmax(mask))
+
+    def cell(self, row: int) -> dict:
+        return {
+            Cells.id: self.ids[row],
+            Cells.cell_volume: float(self.volume[row]),
+            Cells.cell_weight: float(self.weight[row]),
+            Topology.zone_id: self.zone_ids[self.zone[row]],
+            Topology.rack_id: self.rack_ids[self.rack[row]],
+            Topology.floor_id: self.floor_ids[self.floor[row]],
+        }
+
+    # Overwrite the counters of a cell after a write or a re-read.
+    def update(self, cell_id: str, data: dict):
+        row = self.index.get(cell_id)
+        if row is None:
+            return
+        if Cells.cell_volume in data:
+            self.volume[row] = data[Cells.cell_volume]
+        if Cells.cell_weight in data:
+            self.weight[row] = data[Cells.cell_weight]
+        if Cells.status in data:
+            self.usable[row] = data[Cells.status] != Cells.inactive
+
+    # Take capacity out of a cell in memory.
+    def consume(self, row: int, volume: float, weight: float):
+        self.volume[row] -= volume
+        self.weight[row] -= weight
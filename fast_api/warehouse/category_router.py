@@ -16,6 +16,7 @@ from .service import (check_warehouse_data_by_id,
                       get_all_categories,delete_category_by_id,
                       current_user_warehouse,
                       update_category)
+from .topology import touch_topology, invalidate_topology
 
 # Create an APIRouter instance for warehouse-related operations.
 category_router = APIRouter(
@@ -38,6 +39,7 @@ async def create_category_api(cat_data: Category, current_user: DBUser = Depends
     await check_warehouse_data_by_id(id=warehouse_id)
     # Create a new category based on the provided data.
     await create_category(cat_data)
+    await invalidate_topology(warehouse_id)
 
     # Return a success message.
     return {"success": "Successfully created category"}
@@ -96,6 +98,7 @@ async def update_category_data(category_id: str, data: CategoryUpdate, current_u
     query = {"_id": ObjectId(category_id)}
     # Update the category data with the provided values from CategoryUpdate.
     await update_category(query=query, data=cat_d)
+    await touch_topology(category_id=category_id)
     # Return a success message.
     return {"success": "Successfully updated category data"}
 
@@ -106,7 +109,9 @@ async def delete_category(category_id:str,current_user:DBUser=Depends(get_curren
         "company_name":current_user.company
     }
     await user_has_permission(query,"delete_category")
+    category_data = await get_category_by_id(category_id)
     await delete_category_by_id(id=category_id)
+    await invalidate_topology(category_data["warehouse_id"])
     return {"success":f"successfully deleted category by {category_id}"}
 
 
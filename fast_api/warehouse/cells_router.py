@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends
+from typing import Optional
 from bson.objectid import ObjectId
 from fastapi_pagination import Page, paginate, add_pagination
 from ..dependencies import (
@@ -14,6 +15,9 @@ from .models import Cells, CellUpdate
 from .service import (get_cell_by_id, create_cell, 
                       get_all_cells, update_cells,get_floor_by_id,
                       delete_cell_by_id)
+from .topology import touch_topology, resolve_warehouse_id, invalidate_topology
+from .occupancy import get_cell_occupancy
+from ..pagination import fields_projection
 
 # Create an APIRouter instance for warehouse-related operations.
 cell_router = APIRouter(
@@ -44,9 +48,9 @@ async def create_cell_data(data: Cells, current_user: DBUser = Depends(get_curre
     cell_volume = data.cell_height*data.cell_length*data.cell_width
     # Create a new cell based on the provided data.
     data = data.dict()
-    data["products"]=[]
     data["cell_volume"]=cell_volume
     await create_cell(data=data)
+    await touch_topology(floor_id=data["floor_id"])
     # Return a success message.
     return {"success": "Successfully created cell data"}
 
@@ -61,12 +65,18 @@ async def get_data_by_cell_data(cell_id: str, current_user: DBUser = Depends(get
     await user_has_permission(query,"get_cell")
     # Get cell data by its ID.
     res = await get_cell_by_id(id=cell_id)
+    res.pop("allocations", None)
+    # Products placed in the cell come from the occupancy collection.
+    res["products"] = await get_cell_occupancy(cell_id)
     # Return the retrieved cell data.
     return res
 
 # Endpoint to get all cell data.
 @cell_router.get("/", response_model=Page[dict])
-async def get_all_cell_data(current_user: DBUser = Depends(get_current_user)):
+async def get_all_cell_data(
+    projection: Optional[dict] = Depends(fields_projection),
+    current_user: DBUser = Depends(get_current_user),
+):
     # Check if the current user has the required role for this action.
     query ={
         "role_name":current_user.role,
@@ -74,7 +84,7 @@ async def get_all_cell_data(current_user: DBUser = Depends(get_current_user)):
     }
     await user_has_permission(query,"get_all_cell")
     # Retrieve all cell data.
-    res = await get_all_cells({})
+    res = await get_all_cells({}, projection)
     # Return a list of all cell data.
     return paginate(res)
 
@@ -97,6 +107,7 @@ async def update_data_in_cell(cell_id: str, data: CellUpdate, current_user: DBUs
             cell_d[key]=val
     # Update the cell data with the provided values from CellUpdate.
     await update_cells(query=query, data=cell_d)
+    await touch_topology(cell_id=cell_id)
     # Return a success message.
     return {"success": "Successfully updated cell data"}
 
@@ -108,7 +119,9 @@ async def delete_cell(cell_id:str,current_user:DBUser=Depends(get_current_user))
         "company_name":current_user.company
     }
     await user_has_permission(query,"delete_cell")
+    warehouse_id = await resolve_warehouse_id(cell_id=cell_id)
     await delete_cell_by_id(id=cell_id)
+    await invalidate_topology(warehouse_id)
     return {"success":f"successfully deleted cell by {cell_id}"}
 
 @cell_router.get("/floor/{floor_id}",response_model=Page[dict])
@@ -12,6 +12,7 @@ from .models import Condition, ConditionUpdate
 from .service import (create_condition, get_condition_by_id, 
                       update_conditions, get_all_conditions, 
                       check_zone_by_id,delete_condition_by_qurey)
+from .topology import touch_topology, resolve_warehouse_id, invalidate_topology
 
 # Create an APIRouter instance for warehouse-related operations.
 condition_router = APIRouter(
@@ -27,6 +28,7 @@ async def create_condition_data(data: Condition, current_user: DBUser = Depends(
     await check_zone_by_id(data.zone_id)
     # Create a new condition based on the provided data.
     await create_condition(data=data.dict())
+    await touch_topology(zone_id=data.zone_id)
     # Return a success message.
     return {"success": "Successfully created condition"}
 
@@ -64,6 +66,8 @@ async def update_condition_data_by_id(condition_id: str, data: ConditionUpdate,
             condition_d[key]=val
     # Update the condition data with the provided values from ConditionUpdate.
     await update_conditions(query=query, data=condition_d)
+    condition_data = await get_condition_by_id(id=condition_id)
+    await touch_topology(zone_id=condition_data["zone_id"])
     # Return a success message.
     return {"success": "Successfully updated condition data"}
 
@@ -73,7 +77,10 @@ async def update_condition_data_by_id(condition_id: str, data: ConditionUpdate,
 async def delete_condition(condition_id:str,current_user:DBUser=Depends(get_current_user)):
     check_role_access(current_user.role, [Roles.admin, Roles.manager, Roles.director])
     query = {"_id": ObjectId(condition_id)}
+    condition_data = await get_condition_by_id(id=condition_id)
+    warehouse_id = await resolve_warehouse_id(zone_id=condition_data["zone_id"])
     await delete_condition_by_qurey(query=query)
+    await invalidate_topology(warehouse_id)
     return {"success":f"successfully deleted condition by {condition_id}"}
 
 @condition_router.get("/zone/{zone_id}",response_model=Page[dict])
@@ -0,0 +1,43 @@
+class Cells:
+    id = "id"
+    id_ = "_id"
+    cell_volume = "cell_volume"
+    cell_weight = "cell_weight"
+    cell_percent = "cell_percent"
+    status = "status"
+    products = "products"
+    # ids of the last batch allocations that wrote to the cell
+    allocations = "allocations"
+    floor_id = "floor_id"
+    active = "active"
+    inwaiting = "inwaiting"
+    inactive = "inactive"
+
+
+class Topology:
+    category_id = "category_id"
+    zone_id = "zone_id"
+    rack_id = "rack_id"
+    floor_id = "floor_id"
+    cell_id = "cell_id"
+    warehouse_id = "warehouse_id"
+    version = "topology_version"
+    # planning rounds an allocation gets while concurrent allocations take its cells
+    placement_attempts = 5
+
+
+class Occupancy:
+    cell_id = "cell_id"
+    product_id = "product_id"
+    order_id = "order_id"
+    warehouse_id = "warehouse_id"
+    quantity = "quantity"
+    volume = "volume"
+    weight = "weight"
+    status = "status"
+    allocation_id = "allocation_id"
+    created_at = "created_at"
+    reserved = "reserved"
+    confirmed = "confirmed"
+    # how many batch ids a cell remembers to tell which of its writes landed
+    recent_allocations = 20
@@ -1,4 +1,5 @@
-from ..exceptions import NotFound,BadRequest
+from fastapi import status
+from ..exceptions import NotFound,BadRequest,DetailHttpExceptionn
 from ..company.constants import Warehouses
 
 class WarehouseNotFound(NotFound):
@@ -41,4 +42,15 @@ class CellWidthNotCorrect(BadRequest):
     DETAIL ="oo long than the width of the floor"
 
 class BoxIsBusy(BadRequest):
-    DETAIL ="this box is busy is not active"
\ No newline at end of file
+    DETAIL ="this box is busy is not active"
+
+# Carries the names of the products that found no cell.
+class ProductsNotPlaced(DetailHttpExceptionn):
+    STATUS_CODE = status.HTTP_409_CONFLICT
+    DETAIL = Warehouses.products_not_placed
+    def __init__(self, products: list) -> None:
+        super().__init__()
+        self.detail = {
+            "message": self.DETAIL,
+            "products": [product.get("product_name") for product in products],
+        }
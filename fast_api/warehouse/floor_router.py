@@ -14,6 +14,7 @@ from .models import Floors, FloorUpdate
 from .service import (get_all_floors, create_floor,
                        get_floor_by_id, delete_floor_by_id,
                       update_floors, get_rack_by_id)
+from .topology import touch_topology, resolve_warehouse_id, invalidate_topology
 
 # Create an APIRouter instance for warehouse-related operations.
 floor_router = APIRouter(
@@ -44,6 +45,7 @@ async def create_floor_data(data: Floors, current_user: DBUser = Depends(get_cur
 
     # Create a new floor based on the provided data.
     await create_floor(data=data.dict())
+    await touch_topology(rack_id=data.rack_id)
     # Return a success message.
     return {"success": "Successfully created floor data"}
 
@@ -97,6 +99,7 @@ async def update_data_floor(floor_id: str, data: FloorUpdate, current_user: DBUs
             floor_d[key]=val
     # Update the floor data with the provided values from FloorUpdate.
     await update_floors(query=query, data=floor_d)
+    await touch_topology(floor_id=floor_id)
     # Return a success message.
     return {"success": "Successfully updated floor data"}
 
@@ -107,7 +110,9 @@ async def delete_floor(floor_id:str,current_user:DBUser=Depends(get_current_user
         "company_name":current_user.company
     }
     await user_has_permission(query,"delete_floor")
+    warehouse_id = await resolve_warehouse_id(floor_id=floor_id)
     await delete_floor_by_id(id =floor_id)
+    await invalidate_topology(warehouse_id)
     return {"success":f"successfully deleted floor by {floor_id}"}
 
 
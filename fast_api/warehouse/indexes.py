@@ -0,0 +1,53 @@
+# Installed packages
+from pymongo import IndexModel, ASCENDING, DESCENDING
+
+# Local packages
+from ..database import (warehouses_collection,
+                        categories_collection,
+                        zones_collection,
+                        conditions_collection,
+                        racks_collection,
+                        floors_collection,
+                        cells_collection,
+                        occupancy_collection)
+from ..company.constants import Company, Warehouses
+from .constants import Topology, Occupancy
+
+INDEXES = {
+    warehouses_collection.name: [
+        IndexModel(
+            [(Company.company_name, ASCENDING), (Warehouses.warehouse_name, ASCENDING)],
+            name="warehouse_company_name",
+        ),
+    ],
+    categories_collection.name: [
+        IndexModel([(Topology.warehouse_id, ASCENDING)], name="categories_warehouse"),
+    ],
+    zones_collection.name: [
+        IndexModel([(Topology.category_id, ASCENDING)], name="zones_category"),
+    ],
+    conditions_collection.name: [
+        IndexModel([(Topology.zone_id, ASCENDING)], name="conditions_zone"),
+    ],
+    racks_collection.name: [
+        IndexModel([(Topology.zone_id, ASCENDING)], name="racks_zone"),
+    ],
+    floors_collection.name: [
+        IndexModel(
+            [(Topology.rack_id, ASCENDING), ("created_at", DESCENDING)],
+            name="floors_rack",
+        ),
+    ],
+    cells_collection.name: [
+        IndexModel([(Topology.floor_id, ASCENDING)], name="cells_floor"),
+    ],
+    occupancy_collection.name: [
+        IndexModel(
+            [(Occupancy.cell_id, ASCENDING), (Occupancy.product_id, ASCENDING)],
+            name="occupancy_cell_product",
+            unique=True,
+        ),
+        IndexModel([(Occupancy.product_id, ASCENDING)], name="occupancy_product"),
+        IndexModel([(Occupancy.order_id, ASCENDING)], name="occupancy_order"),
+    ],
+}
@@ -0,0 +1,184 @@
+# Installed packages
+import time
+import logging
+from typing import List, Optional
+from bson.objectid import ObjectId
+from pymongo import UpdateOne, ReturnDocument
+
+# Local packages
+from ..database import cells_collection, occupancy_collection, migrations_collection
+from .constants import Cells, Occupancy, Topology
+from .topology import CELL_PROJECTION, refresh_cell
+
+logger = logging.getLogger("warehouse_occupancy")
+
+CELL_PRODUCTS_MIGRATION = "cell_products_to_occupancy"
+
+# Fields of a product that are copied onto its occupancy record.
+PRODUCT_FIELDS = (
+    "product_name",
+    "serial_number",
+    Topology.category_id,
+    Topology.zone_id,
+    Topology.rack_id,
+    Topology.floor_id,
+)
+
+
+# Key the occupancy of a product is stored under: its order and name, which both the
+# order line placed by the salesman and the product document created from it at
+# arrival carry. Products outside an order fall back to their own id.
+def product_key(product_data: dict) -> str:
+    order_id = product_data.get(Occupancy.order_id)
+    name = product_data.get("product_name")
+    if order_id and name:
+        return f"{order_id}:{name}"
+    product_id = product_data.get(Occupancy.product_id) or product_data.get("_id")
+    if not product_id:
+        product_id = ObjectId()
+        product_data[Occupancy.product_id] = str(product_id)
+    return str(product_id)
+
+
+def occupancy_doc(product_data: dict) -> dict:
+    doc = {
+        Occupancy.cell_id: product_data[Occupancy.cell_id],
+        Occupancy.product_id: product_key(product_data),
+        Occupancy.order_id: product_data.get(Occupancy.order_id),
+        Occupancy.warehouse_id: product_data.get(Occupancy.warehouse_id),
+        Occupancy.quantity: product_data.get(Occupancy.quantity, 1),
+        Occupancy.volume: product_data[Occupancy.volume],
+        Occupancy.weight: product_data[Occupancy.weight],
+        Occupancy.status: Occupancy.reserved,
+        Occupancy.allocation_id: product_data.get(Occupancy.allocation_id),
+        Occupancy.created_at: time.time(),
+    }
+    for field in PRODUCT_FIELDS:
+        if field in product_data:
+            doc[field] = product_data[field]
+    return doc
+
+
+def _upsert(doc: dict) -> UpdateOne:
+    return UpdateOne(
+        {Occupancy.cell_id: doc[Occupancy.cell_id], Occupancy.product_id: doc[Occupancy.product_id]},
+        {"$set": doc},
+        upsert=True,
+    )
+
+
+# Record that products were placed in their cells, with one bulk write.
+async def occupy_cells(products: List[dict]):
+    operations = [_upsert(occupancy_doc(product_data)) for product_data in products]
+    if operations:
+        await occupancy_collection.bulk_write(operations, ordered=False)
+
+
+async def get_cell_occupancy(cell_id: str) -> list:
+    cursor = occupancy_collection.find({Occupancy.cell_id: cell_id}, {"_id": 0})
+    return [doc async for doc in cursor]
+
+
+# Mark the placement of a product (by its product_key) as confirmed by the loader.
+async def confirm_occupancy(key: str, data: dict = None):
+    update = {Occupancy.status: Occupancy.confirmed}
+    if data:
+        update.update(data)
+    await occupancy_collection.update_many(
+        {Occupancy.product_id: key}, {"$set": update}
+    )
+
+
+# Take some (or all) of a product (by its product_key) out of its cell and give the capacity back.
+async def release_occupancy(key: str, quantity: Optional[int] = None) -> Optional[dict]:
+    occupancy = await occupancy_collection.find_one({Occupancy.product_id: key})
+    if not occupancy:
+        logger.warning(f"release_occupancy: product {key} is not placed in a cell")
+        return None
+    stored = occupancy.get(Occupancy.quantity) or 1
+    if quantity is None or quantity >= stored:
+        quantity = stored
+    volume = occupancy[Occupancy.volume] * quantity / stored
+    weight = occupancy[Occupancy.weight] * quantity / stored
+    if quantity == stored:
+        await occupancy_collection.delete_one({"_id": occupancy["_id"]})
+    else:
+        await occupancy_collection.update_one(
+            {"_id": occupancy["_id"]},
+            {"$inc": {
+                Occupancy.quantity: -quantity,
+                Occupancy.volume: -volume,
+                Occupancy.weight: -weight,
+            }},
+        )
+    cell = await cells_collection.find_one_and_update(
+        {"_id": ObjectId(occupancy[Occupancy.cell_id])},
+        {"$inc": {Cells.cell_volume: volume, Cells.cell_weight: weight}},
+        projection=CELL_PROJECTION,
+        return_document=ReturnDocument.AFTER,
+    )
+    if cell:
+        refresh_cell(occupancy.get(Occupancy.warehouse_id), occupancy[Occupancy.cell_id], cell)
+    occupancy.pop("_id")
+    return occupancy
+
+
+# Undo placements that are not kept: drop their occupancy records, give the
+# capacity back to the cells and strip the placement from the products.
+async def release_placements(products: List[dict]):
+    cells = {}
+    for product_data in products:
+        cell = cells.setdefault(product_data[Occupancy.cell_id], {Cells.cell_volume: 0, Cells.cell_weight: 0})
+        cell[Cells.cell_volume] += product_data[Occupancy.volume]
+        cell[Cells.cell_weight] += product_data[Occupancy.weight]
+    if not cells:
+        return
+    await occupancy_collection.delete_many({"$or": [
+        {Occupancy.cell_id: product_data[Occupancy.cell_id], Occupancy.product_id: product_key(product_data)}
+        for product_data in products
+    ]})
+    await cells_collection.bulk_write([
+        UpdateOne({"_id": ObjectId(cell_id)}, {"$inc": counters})
+        for cell_id, counters in cells.items()
+    ], ordered=False)
+    warehouse_id = products[0].get(Occupancy.warehouse_id)
+    cursor = cells_collection.find(
+        {"_id": {"$in": [ObjectId(cell_id) for cell_id in cells]}}, CELL_PROJECTION
+    )
+    async for cell in cursor:
+        refresh_cell(warehouse_id, str(cell["_id"]), cell)
+    for product_data in products:
+        for key in (Occupancy.cell_id, Topology.floor_id, Topology.rack_id, Occupancy.allocation_id):
+            product_data.pop(key, None)
+
+
+# One-off move of the products embedded in cell documents into the occupancy collection;
+# once done it is recorded in the migrations collection and later startups skip the scan.
+async def migrate_cell_products():
+    if await migrations_collection.find_one({"_id": CELL_PRODUCTS_MIGRATION}, {"_id": 1}):
+        return
+    cursor = cells_collection.find(
+        {f"{Cells.products}.0": {"$exists": True}}, {Cells.products: 1}
+    )
+    moved = 0
+    async for cell in cursor:
+        products = []
+        for product_data in cell[Cells.products]:
+            if not isinstance(product_data, dict) or not all(
+                key in product_data for key in (Occupancy.volume, Occupancy.weight)
+            ):
+                continue
+            product_data[Occupancy.cell_id] = str(cell["_id"])
+            products.append(product_data)
+        await occupy_cells(products)
+        await cells_collection.update_one(
+            {"_id": cell["_id"]}, {"$unset": {Cells.products: ""}}
+        )
+        moved += len(products)
+    if moved:
+        logger.info(f"Moved {moved} embedded cell products to the occupancy collection")
+    await migrations_collection.update_one(
+        {"_id": CELL_PRODUCTS_MIGRATION},
+        {"$set": {"moved": moved, "done_at": time.time()}},
+        upsert=True,
+    )
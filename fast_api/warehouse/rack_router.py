@@ -14,6 +14,7 @@ from .service import (create_rack, get_rack_by_id,
                       update_racks, get_all_racks,get_zone_by_id,
                       delete_rack_by_id
                       )
+from .topology import touch_topology, resolve_warehouse_id, invalidate_topology
 
 # Create an APIRouter for the /rack endpoint with associated tags.
 rack_router = APIRouter(prefix="/rack", tags=["rack"])
@@ -35,6 +36,7 @@ async def create_rack_data(data: Racks, current_user: DBUser = Depends(get_curre
     data.rack_price +=zone_data["zone_price"]
     # Create a new rack based on the provided data.
     await create_rack(data=data.dict())
+    await touch_topology(zone_id=data.zone_id)
     # Return a success message.
     return {"success": "Successfully created rack data"}
 
@@ -90,6 +92,7 @@ async def update_rack_data_by_id(rack_id: str, data: RackUpdate, current_user: D
             rack_d[key] = val
     # Update the rack data.
     await update_racks(query=query, data=rack_d)
+    await touch_topology(rack_id=rack_id)
     # Return a success message.
     return {"success": "Successfully updated rack data"}
 
@@ -101,7 +104,9 @@ async def delete_rack(rack_id:str,
         "company_name":current_user.company
     }
     await user_has_permission(query,"delete_rack")
+    warehouse_id = await resolve_warehouse_id(rack_id=rack_id)
     await delete_rack_by_id(rack_id)
+    await invalidate_topology(warehouse_id)
     return {"success":f"successfully deleted rack by {rack_id}"}
 
 @rack_router.get("/zone/{zone_id}",response_model=Page[dict])
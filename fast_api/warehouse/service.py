@@ -1,7 +1,9 @@
 import logging
 import asyncio
+import uuid
 from typing import List,Dict
 from bson.objectid import ObjectId
+from pymongo import UpdateOne
 # from ..exceptions import DoesNotExist
 # from .models import 
 from ..company.exception import CompanyNotFound
@@ -18,19 +20,25 @@ from .exceptions import (WarehouseNotFound,
                          ZoneNotFound,FloorNotFound,
                          RackNotFound,CellNotFound,
                          CategoryNotFound,ConditionNotFound,
-                         BoxNotFound,BoxNotFoundByid,BoxIsBusy)
+                         BoxNotFound,BoxNotFoundByid,BoxIsBusy,
+                         ProductsNotPlaced)
+from .constants import Cells, Topology, Occupancy
+from .topology import get_topology, CELL_PROJECTION
+from .occupancy import occupy_cells, release_placements
+
+logger = logging.getLogger("warehouse_service")
 
 # Function to add a new warehouse to a company
-async def get_warehouse_by_id(id:str)->dict:
-    warehouse = await warehouses_collection.find_one({"_id":ObjectId(id)})
+async def get_warehouse_by_id(id:str, projection: dict = None)->dict:
+    warehouse = await warehouses_collection.find_one({"_id":ObjectId(id)}, projection)
     if warehouse:
         warehouse["id"]=str(warehouse.pop("_id"))
         return warehouse
     else:
         raise WarehouseNotFound
 
-async def get_all_warehouses(query:dict)->list:
-    warehouses = warehouses_collection.find(query)
+async def get_all_warehouses(query:dict, projection: dict = None)->list:
+    warehouses = warehouses_collection.find(query, projection)
     reslut =[]
     async for warehouse in warehouses:
         warehouse["id"]= str(warehouse.pop("_id"))
@@ -136,16 +144,16 @@ async def delete_zone(query: dict):
         raise ZoneNotFound  # Raise an exception if no zone is deleted
 
 # Get a zone by its ID.
-async def get_zone_by_id(query: dict):
-    result = await zones_collection.find_one(query)
+async def get_zone_by_id(query: dict, projection: dict = None):
+    result = await zones_collection.find_one(query, projection)
     if not result:
         raise ZoneNotFound  # Raise an exception if the zone is not found
     result["id"] = str(result.pop("_id"))
     return result
 
 # Get all zones that match the provided query.
-async def get_all_zones(query: dict) -> []:
-    result = zones_collection.find(query)
+async def get_all_zones(query: dict, projection: dict = None) -> []:
+    result = zones_collection.find(query, projection)
     res = []
     async for zone in result:
         zone["id"] = str(zone.pop("_id"))
@@ -171,8 +179,8 @@ async def create_category(data: dict):
         raise CategoryNotFound  # Raise an exception if insertion fails
 
 # Get a category by its ID.
-async def get_category_by_id(id: str):
-    result = await categories_collection.find_one({"_id": ObjectId(id)})
+async def get_category_by_id(id: str, projection: dict = None):
+    result = await categories_collection.find_one({"_id": ObjectId(id)}, projection)
     if result:
         result["id"] = str(result.pop("_id"))
         return result
@@ -180,8 +188,8 @@ async def get_category_by_id(id: str):
         raise CategoryNotFound  # Raise an exception if the category is not found
 
 # Get all categories that match the provided query.
-async def get_all_categories(query: dict) -> []:
-    results = categories_collection.find(query)
+async def get_all_categories(query: dict, projection: dict = None) -> []:
+    results = categories_collection.find(query, projection)
     if not results:
         raise CategoryNotFound  # Raise an exception if no categories are found
     res = []
@@ -229,16 +237,16 @@ async def check_condition_by_id(id: str):
         raise ConditionNotFound  # Raise an exception if the condition is not found
 
 # Get a condition by its ID.
-async def get_condition_by_id(id: str) -> dict:
-    result = await conditions_collection.find_one({"_id": ObjectId(id)})
+async def get_condition_by_id(id: str, projection: dict = None) -> dict:
+    result = await conditions_collection.find_one({"_id": ObjectId(id)}, projection)
     if not result:
         raise ConditionNotFound  # Raise an exception if the condition is not found
     result["id"] = str(result.pop("_id"))
     return result
 
 # Get all conditions that match the provided query.
-async def get_all_conditions(query: dict):
-    results = conditions_collection.find(query)
+async def get_all_conditions(query: dict, projection: dict = None):
+    results = conditions_collection.find(query, projection)
     res = []
     async for cat in results:
         cat["id"] = str(cat.pop("_id"))
@@ -283,16 +291,16 @@ async def check_rack_by_id(id: str):
         raise RackNotFound  # Raise an exception if the rack is not found
 
 # Get a rack by its ID.
-async def get_rack_by_id(id: str) -> dict:
-    result = await racks_collection.find_one({"_id": ObjectId(id)})
+async def get_rack_by_id(id: str, projection: dict = None) -> dict:
+    result = await racks_collection.find_one({"_id": ObjectId(id)}, projection)
     if not result:
         raise RackNotFound  # Raise an exception if the rack is not found
     result["id"] = str(result.pop("_id"))
     return result
 
 # Get all racks that match the provided query.
-async def get_all_racks(query: dict):
-    results = racks_collection.find(query)
+async def get_all_racks(query: dict, projection: dict = None):
+    results = racks_collection.find(query, projection)
     res = []
     async for cat in results:
         cat["id"] = str(cat.pop("_id"))
@@ -347,16 +355,16 @@ async def check_floor_by_id(id: str):
         raise FloorNotFound  # Raise an exception if the floor is not found
 
 # Get a floor by its ID.
-async def get_floor_by_id(id: str) -> dict:
-    result = await floors_collection.find_one({"_id": ObjectId(id)})
+async def get_floor_by_id(id: str, projection: dict = None) -> dict:
+    result = await floors_collection.find_one({"_id": ObjectId(id)}, projection)
     if not result:
         raise FloorNotFound  # Raise an exception if the floor is not found
     result["id"] = str(result.pop("_id"))
     return result
 
 # Get all floors that match the provided query.
-async def get_all_floors(query: dict):
-    results = floors_collection.find(query).sort([("created_at", -1)])
+async def get_all_floors(query: dict, projection: dict = None):
+    results = floors_collection.find(query, projection).sort([("created_at", -1)])
     res = []
     async for cat in results:
         cat["id"] = str(cat.pop("_id"))
@@ -403,16 +411,17 @@ async def check_cell_by_id(id: str):
         raise CellNotFound  # Raise an exception if the cell is not found
 
 # Get a cell by its ID.
-async def get_cell_by_id(id: str) -> dict:
-    result = await cells_collection.find_one({"_id": ObjectId(id)})
+async def get_cell_by_id(id: str, projection: dict = None) -> dict:
+    result = await cells_collection.find_one({"_id": ObjectId(id)}, projection)
     if not result:
         raise CellNotFound  # Raise an exception if the cell is not found
     result["id"] = str(result.pop("_id"))
     return result
 
 # Get all cells that match the provided query.
-async def get_all_cells(query: dict)->list:
-    results = cells_collection.find(query)
+async def get_all_cells(query: dict, projection: dict = None)->list:
+    # Occupancy lives in its own collection; skip any products array not migrated yet.
+    results = cells_collection.find(query, projection or {Cells.products: 0, Cells.allocations: 0})
     res = []
     async for cat in results:
         cat["id"] = str(cat.pop("_id"))
@@ -446,8 +455,8 @@ async def create_box_for_cell(data:dict):
     else:
         raise Exception("Failed to insert data")
 
-async def get_box_data_by_id(id:str):
-    box_data = await boxes_collection.find_one({"_id":ObjectId(id)})
+async def get_box_data_by_id(id:str, projection: dict = None):
+    box_data = await boxes_collection.find_one({"_id":ObjectId(id)}, projection)
     if box_data:
         box_data["id"]= str(box_data.pop("_id"))
         return box_data
@@ -484,8 +493,8 @@ async def create_box_type_data(data:dict):
     else:
         raise Exception("error in the create box type function")
 
-async def get_box_type_data_by_id(id:str)->dict:
-    result = await types_collection.find_one({"_id":ObjectId(id)})
+async def get_box_type_data_by_id(id:str, projection: dict = None)->dict:
+    result = await types_collection.find_one({"_id":ObjectId(id)}, projection)
     if result:
         result["id"]=str(result.pop("_id"))
         return result
@@ -516,73 +525,143 @@ async def delete_box_type_data_by_id(id:str):
         pass
     else:
         raise BoxNotFoundByid
-##### put_product_in_the_cell
-# This function finds an appropriate cell in a warehouse to place a product based on various criteria.
-
-async def get_product_warehouse_category(query: dict, product_data: dict) -> dict:
-    # Retrieve warehouse data based on the provided query.
+# Plan placements for a batch of products against a private copy of the snapshot.
+def _plan_allocation(topology, products: list) -> dict:
+    engine = topology.engine.copy()
+    placements, unplaced, cells = [], [], {}
+    # Best-fit decreasing: the largest products pick their cells first.
+    ordered = sorted(products, key=lambda p: (p["volume"], p["weight"]), reverse=True)
+    for product_data in ordered:
+        product_data["warehouse_id"] = topology.warehouse_id
+        zone = topology.find_zone(product_data["storing_duration"], product_data["conditions"])
+        row = None
+        if zone is not None:
+            product_data["category_id"], product_data["zone_id"] = zone
+            row = engine.best_fit(
+                product_data["volume"], product_data["weight"], zone_ids=[zone[1]]
+            )
+        if row is None:
+            unplaced.append(product_data)
+            continue
+        cell = engine.cell(row)
+        engine.consume(row, product_data["volume"], product_data["weight"])
+        product_data["cell_id"] = cell["id"]
+        product_data["floor_id"] = cell["floor_id"]
+        product_data["rack_id"] = cell["rack_id"]
+        planned = cells.setdefault(cell["id"], {
+            "cell_id": cell["id"],
+            Cells.cell_volume: cell[Cells.cell_volume],
+            Cells.cell_weight: cell[Cells.cell_weight],
+            "volume": 0,
+            "weight": 0,
+            "products": [],
+        })
+        planned["volume"] += product_data["volume"]
+        planned["weight"] += product_data["weight"]
+        planned["products"].append(product_data)
+        placements.append(product_data)
+    return {
+        "warehouse_id": topology.warehouse_id,
+        "topology_version": topology.version,
+        "placements": placements,
+        "unplaced": unplaced,
+        "cells": list(cells.values()),
+    }
+
+
+# Write every planned cell in one bulk_write; returns the products of cells that
+# changed meanwhile, with their placement undone so they can be planned again.
+async def _apply_allocation(topology, plan: dict) -> list:
+    allocation_id = str(uuid.uuid4())
+    operations = []
+    for cell in plan["cells"]:
+        for product_data in cell["products"]:
+            product_data["allocation_id"] = allocation_id
+        operations.append(UpdateOne(
+            {
+                "_id": ObjectId(cell["cell_id"]),
+                Cells.cell_volume: {"$gte": cell["volume"]},
+                Cells.cell_weight: {"$gte": cell["weight"]},
+            },
+            {
+                "$inc": {Cells.cell_volume: -cell["volume"], Cells.cell_weight: -cell["weight"]},
+                "$set": {
+                    Cells.status: Cells.inwaiting,
+                    Cells.cell_percent: cell["volume"] / cell[Cells.cell_volume] * 100,
+                },
+                "$push": {Cells.allocations: {
+                    "$each": [allocation_id], "$slice": -Occupancy.recent_allocations
+                }},
+            },
+        ))
+    if not operations:
+        return []
+    result = await cells_collection.bulk_write(operations, ordered=False)
+    applied = {cell["cell_id"] for cell in plan["cells"]}
+    if result.modified_count < len(operations):
+        cursor = cells_collection.find(
+            {"_id": {"$in": [ObjectId(cell_id) for cell_id in applied]},
+             Cells.allocations: allocation_id},
+            {"_id": 1},
+        )
+        applied = {str(doc["_id"]) async for doc in cursor}
+    lost = []
+    for cell in plan["cells"]:
+        if cell["cell_id"] in applied:
+            topology.update_cell(cell["cell_id"], {
+                Cells.cell_volume: cell[Cells.cell_volume] - cell["volume"],
+                Cells.cell_weight: cell[Cells.cell_weight] - cell["weight"],
+            })
+            continue
+        logger.warning(f"Batch allocation lost cell {cell['cell_id']}, replanning its products")
+        fresh = await cells_collection.find_one({"_id": ObjectId(cell["cell_id"])}, CELL_PROJECTION)
+        topology.update_cell(cell["cell_id"], fresh or {Cells.cell_volume: -1, Cells.cell_weight: -1})
+        for product_data in cell["products"]:
+            for key in ("cell_id", "floor_id", "rack_id", "allocation_id"):
+                product_data.pop(key, None)
+            lost.append(product_data)
+    plan["cells"] = [cell for cell in plan["cells"] if cell["cell_id"] in applied]
+    plan["placements"] = [
+        product_data for product_data in plan["placements"] if "cell_id" in product_data
+    ]
+    await occupy_cells(plan["placements"])
+    return lost
+
+
+# Place all products of one or several orders in a single planning pass.
+# Products of cells lost to a concurrent allocation are planned again against the
+# refreshed counters, up to Topology.placement_attempts rounds.
+# With preview the plan is only returned, nothing is written to the cells.
+async def allocate_products(query: dict, products: list, preview: bool = False) -> dict:
     warehouse_data = await warehouses_collection.find_one(query)
-    # Get all categories in the warehouse.
-    product_data["warehouse_id"]=str(warehouse_data["_id"])
-    categories = await get_all_categories(query={"warehouse_id": str(warehouse_data["_id"])})
-    # Initialize variables to track zone and rack status.
-    zone_status = False
-    rack_status = False
-    # Iterate through categories to find the suitable one.
-    for category in categories:
-        # Check if the category's time is greater than or equal to the product's storing duration.
-        if category["category_time"] >= product_data["storing_duration"]:
-            # Assign the category ID to the product and store category data.
-            product_data["category_id"] = category["id"]
-            # Get all zones within the selected category.
-            zones =await get_all_zones({"category_id": category["id"]})
-            # Iterate through zones to find a suitable one.
-            for zone in zones:
-                if product_data["conditions"]==None:
-                    zone_status=True
-                    product_data["zone_id"] = zone["id"]
-                    break
-                # Get conditions for the zone.
-                conditions = await get_all_conditions({"zone_id": zone["id"]})
-                if all(condition["condition_id"] in [c["condition_id"] for c in conditions] for condition in product_data["conditions"]):
-                    product_data["zone_id"] = zone["id"]
-                    zone_status=True
-                    break
-                # Iterate through conditions to find a matching one.
-                if zone_status:
-                    break
-            if zone_status:
-                break
-    # Get all racks within the selected zone.
-    racks = await get_all_racks({"zone_id": product_data["zone_id"]})
-    # Iterate through racks to find a suitable one.
-    for rack in racks:
-        # Get all floors within the rack.
-        floors = await get_all_floors({"rack_id": rack["id"]})
-        # Iterate through floors to find a suitable one.
-        for floor in floors:
-            # Get all cells within the floor.
-            cells = await get_all_cells({"floor_id": floor["id"]})
-            # Iterate through cells to find an active cell with sufficient volume and weight capacity.
-            for cell in cells:
-                cell["status"]="active"
-                if cell["status"]=="active" and cell["cell_volume"] >= product_data["volume"] and cell["cell_weight"] >= product_data["weight"]:
-                    rack_status = True
-                    product_data["cell_id"] = cell["id"]
-                    product_data["floor_id"] = floor["id"]
-                    product_data["rack_id"] = rack["id"]    
-                    # Update the cell's volume, weight, and add the product to its list.
-                    cell["cell_percent"]=(product_data["volume"]/ cell["cell_volume"] )* 100
-                    cell["cell_volume"] -= product_data["volume"]
-                    cell["cell_weight"] -= product_data["weight"]
-                    cell["status"]="inwaiting"
-                    cell["products"].append(product_data)      
-                    # Update the cell in the database.
-                    await update_cells({"_id": ObjectId(cell["id"])}, cell)
-                    break
-            if rack_status:
-                break
-    return product_data
+    if not warehouse_data:
+        raise WarehouseNotFound
+    topology = await get_topology(warehouse_data)
+    plan = _plan_allocation(topology, products)
+    pending = [] if preview else await _apply_allocation(topology, plan)
+    for _ in range(Topology.placement_attempts - 1):
+        if not pending:
+            break
+        retry = _plan_allocation(topology, pending)
+        pending = await _apply_allocation(topology, retry)
+        plan["placements"] += retry["placements"]
+        plan["unplaced"] += retry["unplaced"]
+        plan["cells"] += retry["cells"]
+    plan["unplaced"] += pending
+    for cell in plan["cells"]:
+        cell["products"] = len(cell["products"])
+    plan["preview"] = preview
+    return plan
+
+
+# Place every product or none: when some find no cell, the placements made for the
+# others are released and ProductsNotPlaced lists the ones left over.
+async def place_all_products(query: dict, products: list) -> dict:
+    plan = await allocate_products(query, products)
+    if plan["unplaced"]:
+        await release_placements(plan["placements"])
+        raise ProductsNotPlaced(plan["unplaced"])
+    return plan
 
 
 async def storage_product_to_box(product_data:dict):
@@ -0,0 +1,213 @@
+# Installed packages
+import asyncio
+import logging
+from typing import Dict, List, Optional
+from bson.objectid import ObjectId
+
+# Local packages
+from ..database import (warehouses_collection,
+                        categories_collection,
+                        zones_collection,
+                        conditions_collection,
+                        racks_collection,
+                        floors_collection,
+                        cells_collection)
+from .constants import Cells, Topology
+from .capacity import CellCapacityEngine
+
+logger = logging.getLogger("warehouse_topology")
+
+# Only the capacity counters of a cell are kept in memory, the products stay in Mongo.
+CELL_PROJECTION = {
+    Cells.cell_volume: 1,
+    Cells.cell_weight: 1,
+    Cells.status: 1,
+    Cells.floor_id: 1,
+}
+
+
+class WarehouseTopology:
+    """In-memory copy of one warehouse's category -> zone -> rack -> floor -> cell tree.
+
+    A snapshot is tagged with the warehouse ``topology_version`` it was built from and
+    is thrown away as soon as the stored version moves on.
+    """
+
+    def __init__(self, warehouse_id: str, version: int):
+        self.warehouse_id = warehouse_id
+        self.version = version
+        self.categories: List[dict] = []
+        self.zones: Dict[str, List[dict]] = {}
+        self.conditions: Dict[str, set] = {}
+        self.racks: Dict[str, List[dict]] = {}
+        self.floors: Dict[str, List[dict]] = {}
+        self.engine = CellCapacityEngine([])
+
+    # Pick the category and zone the same way the old tree walk did.
+    def find_zone(self, storing_duration, conditions: Optional[list]) -> Optional[tuple]:
+        for category in self.categories:
+            if category["category_time"] < storing_duration:
+                continue
+            for zone in self.zones.get(category["id"], []):
+                if conditions is None:
+                    return category["id"], zone["id"]
+                zone_conditions = self.conditions.get(zone["id"], set())
+                if all(condition["condition_id"] in zone_conditions for condition in conditions):
+                    return category["id"], zone["id"]
+        return None
+
+    # Cell of the zone that fits the product best, with its rack and floor ids.
+    def best_fit(self, zone_id: str, volume: float, weight: float) -> Optional[dict]:
+        row = self.engine.best_fit(volume, weight, zone_ids=[zone_id])
+        if row is None:
+            return None
+        return self.engine.cell(row)
+
+    # Overwrite the cached counters of a cell after a write or a re-read.
+    def update_cell(self, cell_id: str, data: dict):
+        self.engine.update(cell_id, data)
+
+
+_snapshots: Dict[str, WarehouseTopology] = {}
+_locks: Dict[str, asyncio.Lock] = {}
+
+
+async def _find_all(collection, query: dict, projection: dict = None, sort: list = None) -> list:
+    cursor = collection.find(query, projection)
+    if sort:
+        cursor = cursor.sort(sort)
+    result = []
+    async for doc in cursor:
+        doc["id"] = str(doc.pop("_id"))
+        result.append(doc)
+    return result
+
+
+# Load the whole tree of a warehouse with one query per level.
+async def build_topology(warehouse_id: str, version: int) -> WarehouseTopology:
+    topology = WarehouseTopology(warehouse_id, version)
+    topology.categories = await _find_all(
+        categories_collection, {Topology.warehouse_id: warehouse_id}
+    )
+    category_ids = [category["id"] for category in topology.categories]
+    zones = await _find_all(zones_collection, {Topology.category_id: {"$in": category_ids}})
+    zone_ids = [zone["id"] for zone in zones]
+    conditions = await _find_all(
+        conditions_collection,
+        {Topology.zone_id: {"$in": zone_ids}},
+        {Topology.zone_id: 1, "condition_id": 1},
+    )
+    racks = await _find_all(racks_collection, {Topology.zone_id: {"$in": zone_ids}})
+    rack_ids = [rack["id"] for rack in racks]
+    floors = await _find_all(
+        floors_collection,
+        {Topology.rack_id: {"$in": rack_ids}},
+        sort=[("created_at", -1)],
+    )
+    floor_ids = [floor["id"] for floor in floors]
+    cells = await _find_all(
+        cells_collection, {Topology.floor_id: {"$in": floor_ids}}, CELL_PROJECTION
+    )
+
+    for zone in zones:
+        topology.zones.setdefault(zone[Topology.category_id], []).append(zone)
+    for condition in conditions:
+        if "condition_id" in condition:
+            topology.conditions.setdefault(condition[Topology.zone_id], set()).add(
+                condition["condition_id"]
+            )
+    for rack in racks:
+        topology.racks.setdefault(rack[Topology.zone_id], []).append(rack)
+    for floor in floors:
+        topology.floors.setdefault(floor[Topology.rack_id], []).append(floor)
+    cells_by_floor: Dict[str, List[dict]] = {}
+    for cell in cells:
+        cells_by_floor.setdefault(cell[Topology.floor_id], []).append(cell)
+    # Lay the cells out in tree order so ties resolve like the old rack -> floor -> cell walk.
+    ordered_cells = []
+    for zone in zones:
+        for rack in topology.racks.get(zone["id"], []):
+            for floor in topology.floors.get(rack["id"], []):
+                for cell in cells_by_floor.get(floor["id"], []):
+                    cell[Topology.zone_id] = zone["id"]
+                    cell[Topology.rack_id] = rack["id"]
+                    ordered_cells.append(cell)
+    topology.engine = CellCapacityEngine(ordered_cells)
+    logger.info(
+        f"Built topology for warehouse {warehouse_id} v{version}: {len(cells)} cells"
+    )
+    return topology
+
+
+# Return the cached snapshot of a warehouse document, rebuilding it when its version moved.
+async def get_topology(warehouse: dict) -> WarehouseTopology:
+    warehouse_id = str(warehouse["_id"])
+    version = warehouse.get(Topology.version, 0)
+    snapshot = _snapshots.get(warehouse_id)
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    lock = _locks.setdefault(warehouse_id, asyncio.Lock())
+    async with lock:
+        snapshot = _snapshots.get(warehouse_id)
+        if snapshot is None or snapshot.version != version:
+            snapshot = await build_topology(warehouse_id, version)
+            _snapshots[warehouse_id] = snapshot
+    return snapshot
+
+
+async def _parent_id(collection, doc_id: str, field: str) -> Optional[str]:
+    if not doc_id or not ObjectId.is_valid(str(doc_id)):
+        return None
+    doc = await collection.find_one({"_id": ObjectId(doc_id)}, {field: 1})
+    if not doc:
+        return None
+    return doc.get(field)
+
+
+# Walk up from any level of the tree to the warehouse it belongs to.
+async def resolve_warehouse_id(
+    cell_id: str = None,
+    floor_id: str = None,
+    rack_id: str = None,
+    zone_id: str = None,
+    category_id: str = None,
+) -> Optional[str]:
+    if cell_id:
+        floor_id = await _parent_id(cells_collection, cell_id, Topology.floor_id)
+    if floor_id:
+        rack_id = await _parent_id(floors_collection, floor_id, Topology.rack_id)
+    if rack_id:
+        zone_id = await _parent_id(racks_collection, rack_id, Topology.zone_id)
+    if zone_id:
+        category_id = await _parent_id(zones_collection, zone_id, Topology.category_id)
+    if category_id:
+        return await _parent_id(categories_collection, category_id, Topology.warehouse_id)
+    return None
+
+
+# Update the counters of one cell in this worker's snapshot, if it holds one.
+def refresh_cell(warehouse_id: Optional[str], cell_id: str, data: dict):
+    snapshot = _snapshots.get(warehouse_id) if warehouse_id else None
+    if snapshot is not None:
+        snapshot.update_cell(cell_id, data)
+
+
+# Bump the topology version of a warehouse so every worker rebuilds its snapshot.
+async def invalidate_topology(warehouse_id: Optional[str]):
+    if not warehouse_id:
+        return
+    _snapshots.pop(warehouse_id, None)
+    if not ObjectId.is_valid(str(warehouse_id)):
+        return
+    await warehouses_collection.update_one(
+        {"_id": ObjectId(warehouse_id)}, {"$inc": {Topology.version: 1}}
+    )
+
+
+# Invalidate the warehouse that owns the given category/zone/rack/floor/cell.
+async def touch_topology(**parent_ids):
+    warehouse_id = await resolve_warehouse_id(**parent_ids)
+    if warehouse_id is None:
+        logger.warning(f"touch_topology: no warehouse found for {parent_ids}")
+        return
+    await invalidate_topology(warehouse_id)
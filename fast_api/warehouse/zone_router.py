@@ -16,6 +16,7 @@ from .service import (create_zone,
                       update_zone,
                       get_all_zones,
                       check_category_by_id)
+from .topology import touch_topology, resolve_warehouse_id, invalidate_topology
 
 # Create an APIRouter instance for warehouse-related operations.
 zone_router = APIRouter(
@@ -34,6 +35,7 @@ async def creat_zone_for_category(zone_data:Zones,
     zone_data = zone_data.dict()
     await check_category_by_id(id=zone_data["category_id"])
     await create_zone(zone_data)
+    await touch_topology(category_id=zone_data["category_id"])
     return {"success":"successfully created zone"}
 
 @zone_router.get("/{zone_id}",response_model=ZoneById)
@@ -74,6 +76,7 @@ async def update_data_buy_order_id(zone_id:str,zone_data:ZoneUpdate,
         if val is not None and val !="string" and val !=0:
             data[key]=val
     await update_zone({"_id":ObjectId(zone_id)},data)
+    await touch_topology(zone_id=zone_id)
     return {"success":"successfully updated zone data"}
 
 @zone_router.delete("/{zone_id}",response_model=dict)
@@ -84,7 +87,9 @@ async def delete_zone_by_id(zone_id:str,
         "company_name":current_user.company
     }
     await user_has_permission(query,"delete_zone")
+    warehouse_id = await resolve_warehouse_id(zone_id=zone_id)
     await delete_zone({"_id":ObjectId(zone_id)})
+    await invalidate_topology(warehouse_id)
     return {"success":f"successfully deleted zone by {zone_id}"}
 
 @zone_router.get("/category/{category_id}",response_model=Page[dict])
@@ -0,0 +1,131 @@
+# Installed packages
+import asyncio
+import logging
+import uuid
+from typing import Awaitable, Callable, Iterable, List, Optional
+from redis.exceptions import RedisError
+
+# Local packages
+from ..redis import get_redis, with_timeout
+from .config import WS_CHANNEL_PREFIX, WS_PRESENCE_TTL, WS_RECONNECT_DELAY
+
+logger = logging.getLogger("websocket_backplane")
+
+REDIS_ERRORS = (RedisError, OSError, asyncio.TimeoutError)
+
+
+class Backplane:
+    """Redis pub/sub link between the workers that hold WebSocket connections.
+
+    Any worker publishes to a channel; every worker is subscribed to all
+    channels and hands the message to `deliver`, which sends it to the local
+    sockets of that channel, if any. Each worker also keeps the user ids it
+    holds in a presence set that expires when the worker stops heartbeating;
+    every heartbeat rewrites the set from `local_users`, so it comes back after
+    Redis lost it.
+    """
+
+    def __init__(
+        self,
+        deliver: Callable[[str, str], Awaitable[None]],
+        local_users: Callable[[], Iterable[str]] = tuple,
+        worker_id: Optional[str] = None,
+    ):
+        self.deliver = deliver
+        self.local_users = local_users
+        self.worker_id = worker_id or uuid.uuid4().hex
+        self.presence_key = f"{WS_CHANNEL_PREFIX}presence:{self.worker_id}"
+        self._task: Optional[asyncio.Task] = None
+        self.subscribed = asyncio.Event()
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await with_timeout(get_redis().delete(self.presence_key))
+        except REDIS_ERRORS:
+            pass
+
+    # False when Redis is unavailable; the caller then delivers locally only.
+    async def publish(self, channel: str, message: str) -> bool:
+        try:
+            await with_timeout(get_redis().publish(WS_CHANNEL_PREFIX + channel, message))
+            return True
+        except REDIS_ERRORS as error:
+            logger.warning(f"publish {channel}: {error!r}")
+            return False
+
+    async def _listen(self):
+        while True:
+            pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.psubscribe(WS_CHANNEL_PREFIX + "*")
+                self.subscribed.set()
+                heartbeat_at = 0.0
+                loop = asyncio.get_running_loop()
+                while True:
+                    if loop.time() >= heartbeat_at:
+                        await self._heartbeat()
+                        heartbeat_at = loop.time() + WS_PRESENCE_TTL / 3
+                    message = await pubsub.get_message(timeout=1.0)
+                    if message is None or message["type"] != "pmessage":
+                        continue
+                    channel = message["channel"][len(WS_CHANNEL_PREFIX):]
+                    try:
+                        await self.deliver(channel, message["data"])
+                    except Exception:
+                        logger.exception(f"deliver {channel}")
+            except asyncio.CancelledError:
+                raise
+            except REDIS_ERRORS as error:
+                self.subscribed.clear()
+                logger.warning(f"backplane subscription lost: {error!r}")
+                await asyncio.sleep(WS_RECONNECT_DELAY)
+            finally:
+                await pubsub.aclose()
+
+    # Replace the presence set with the users held here and push its expiry out.
+    async def _heartbeat(self):
+        users = list(self.local_users())
+        async with get_redis().pipeline(transaction=True) as pipe:
+            pipe.delete(self.presence_key)
+            if users:
+                pipe.sadd(self.presence_key, *users)
+                pipe.expire(self.presence_key, WS_PRESENCE_TTL)
+            await with_timeout(pipe.execute())
+
+    async def add_presence(self, user_id: str):
+        try:
+            async with get_redis().pipeline(transaction=False) as pipe:
+                pipe.sadd(self.presence_key, user_id)
+                pipe.expire(self.presence_key, WS_PRESENCE_TTL)
+                await with_timeout(pipe.execute())
+        except REDIS_ERRORS as error:
+            logger.warning(f"add_presence {user_id}: {error!r}")
+
+    async def remove_presence(self, user_id: str):
+        try:
+            await with_timeout(get_redis().srem(self.presence_key, user_id))
+        except REDIS_ERRORS as error:
+            logger.warning(f"remove_presence {user_id}: {error!r}")
+
+    # User ids connected to any worker; None when Redis is unavailable.
+    async def online_users(self) -> Optional[List[str]]:
+        try:
+            redis = get_redis()
+            keys = [key async for key in redis.scan_iter(match=f"{WS_CHANNEL_PREFIX}presence:*")]
+            if not keys:
+                return []
+            return sorted(await with_timeout(redis.sunion(keys)))
+        except REDIS_ERRORS as error:
+            logger.warning(f"online_users: {error!r}")
+            return None
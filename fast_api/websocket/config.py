@@ -0,0 +1,15 @@
+# Redis pub/sub backplane shared by all workers
+WS_CHANNEL_PREFIX = "ws:"  # Redis channels are WS_CHANNEL_PREFIX + "<kind>:<id>"
+WS_PRESENCE_TTL = 90  # seconds a worker's presence set outlives its last heartbeat
+WS_RECONNECT_DELAY = 1  # seconds between attempts to resubscribe after a Redis error
+# Per-connection outbound queues
+WS_QUEUE_SIZE = 100  # messages waiting for one socket before the overflow policy applies
+WS_OVERFLOW_POLICY = "coalesce"  # "drop_oldest", "drop_newest" or "coalesce" (newest per channel wins)
+WS_SEND_TIMEOUT = 10  # seconds one send may take before the client is evicted
+WS_SLOW_CONSUMER_SECONDS = 30  # seconds a queue may stay full before the client is evicted
+# Durable per-user notification inbox
+NOTIFICATION_TTL = 7 * 86400  # seconds a notification is kept for replay
+NOTIFICATION_REPLAY_LIMIT = 50  # notifications per replay batch, kept below WS_QUEUE_SIZE
+# Frames
+WS_BATCH_WINDOW = 0.05  # seconds a writer waits to batch messages into one frame; 0 sends each at once
+WS_BATCH_MAX = 50  # messages in one batch frame at most
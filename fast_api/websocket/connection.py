@@ -0,0 +1,159 @@
+# Installed packages
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Callable, Deque, Optional, Set, Tuple
+from fastapi import WebSocket
+
+# Local packages
+from .config import (
+    WS_QUEUE_SIZE,
+    WS_OVERFLOW_POLICY,
+    WS_SEND_TIMEOUT,
+    WS_SLOW_CONSUMER_SECONDS,
+    WS_BATCH_WINDOW,
+    WS_BATCH_MAX,
+)
+from .envelope import Encoding, encode, frame
+
+logger = logging.getLogger("websocket")
+
+
+class OverflowPolicy:
+    drop_oldest = "drop_oldest"
+    drop_newest = "drop_newest"
+    coalesce = "coalesce"
+
+
+class SendStats:
+    """Counters of all connections of a worker, shown on the /websocket/ endpoint."""
+
+    def __init__(self):
+        self.sent = 0
+        self.frames = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.evicted = 0
+        self.send_errors = 0
+
+    def dict(self) -> dict:
+        return dict(vars(self))
+
+
+class Connection:
+    """One socket with a bounded outbound queue drained by its own writer task.
+
+    `put` never waits, so a slow client only fills its own queue. When the
+    queue is full the overflow policy drops or coalesces messages; a client
+    whose queue stays full for WS_SLOW_CONSUMER_SECONDS, or whose send takes
+    longer than WS_SEND_TIMEOUT, is evicted. The writer waits WS_BATCH_WINDOW
+    after the first message and sends what has queued up by then as one frame,
+    encoded as JSON text or msgpack binary. A failed or timed out send calls
+    `on_failure`, which the manager sets to evict the connection.
+    """
+
+    def __init__(
+        self,
+        user_id: str,
+        websocket: WebSocket,
+        stats: SendStats,
+        queue_size: int = WS_QUEUE_SIZE,
+        policy: str = WS_OVERFLOW_POLICY,
+        encoding: Encoding = Encoding.json,
+        batch_window: float = WS_BATCH_WINDOW,
+        on_failure: Optional[Callable[["Connection"], None]] = None,
+    ):
+        self.user_id = user_id
+        self.websocket = websocket
+        self.stats = stats
+        self.queue_size = queue_size
+        self.policy = policy
+        self.encoding = encoding
+        self.batch_window = batch_window
+        self.on_failure = on_failure
+        self.queue: Deque[Tuple[str, dict]] = deque()
+        self.channels: Set[str] = set()
+        self.full_since: Optional[float] = None
+        self.closed = asyncio.Event()
+        self._ready = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._writer = asyncio.create_task(self._write())
+
+    # Queue a message; False when the client is too slow and should be evicted.
+    def put(self, channel: str, message: dict) -> bool:
+        if self.closed.is_set():
+            return False
+        if len(self.queue) >= self.queue_size:
+            now = time.monotonic()
+            if self.full_since is None:
+                self.full_since = now
+            elif now - self.full_since > WS_SLOW_CONSUMER_SECONDS:
+                return False
+            if not self._overflow(channel, message):
+                return True
+        self.queue.append((channel, message))
+        self._ready.set()
+        return True
+
+    # Make room for a message; False when the message itself is dropped or merged.
+    def _overflow(self, channel: str, message: dict) -> bool:
+        if self.policy == OverflowPolicy.coalesce:
+            for i, (queued_channel, _) in enumerate(self.queue):
+                if queued_channel == channel:
+                    self.queue[i] = (channel, message)
+                    self.stats.coalesced += 1
+                    return False
+        self.stats.dropped += 1
+        if self.policy == OverflowPolicy.drop_newest:
+            return False
+        self.queue.popleft()
+        return True
+
+    async def _write(self):
+        try:
+            while True:
+                await self._ready.wait()
+                if self.batch_window and len(self.queue) < WS_BATCH_MAX:
+                    await asyncio.sleep(self.batch_window)
+                while self.queue:
+                    messages = []
+                    while self.queue and len(messages) < WS_BATCH_MAX:
+                        messages.append(self.queue.popleft()[1])
+                    if len(self.queue) < self.queue_size:
+                        self.full_since = None
+                    await asyncio.wait_for(self._send(frame(messages)), WS_SEND_TIMEOUT)
+                    self.stats.sent += len(messages)
+                    self.stats.frames += 1
+                self._ready.clear()
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            self.stats.send_errors += 1
+            logger.warning(f"send to {self.user_id} failed: {error!r}")
+            if self.on_failure is not None:
+                self.on_failure(self)
+        finally:
+            self.closed.set()
+
+    async def _send(self, payload: dict):
+        data = encode(payload, self.encoding)
+        if isinstance(data, bytes):
+            await self.websocket.send_bytes(data)
+        else:
+            await self.websocket.send_text(data)
+
+    async def close(self):
+        self.closed.set()
+        if self._writer is not None:
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+        try:
+            await self.websocket.close()
+        except RuntimeError:
+            pass  # already closed by the client
@@ -0,0 +1,39 @@
+class Channels:
+    user = "user"
+    warehouse = "warehouse"
+    order = "order"
+    role = "role"
+    all = "all"
+
+
+# What a client sends over the socket
+class Actions:
+    subscribe = "subscribe"
+    unsubscribe = "unsubscribe"
+    ack = "ack"
+    replay = "replay"
+
+
+class Notifications:
+    user_id = "user_id"
+    seq = "seq"
+    message = "message"
+    created_at = "created_at"
+    acked = "acked"
+
+
+def user_channel(user_id: str) -> str:
+    return f"{Channels.user}:{user_id}"
+
+
+def warehouse_channel(warehouse: str) -> str:
+    return f"{Channels.warehouse}:{warehouse}"
+
+
+def order_channel(order_id: str) -> str:
+    return f"{Channels.order}:{order_id}"
+
+
+# Roles are per company, so the channel carries the company as well.
+def role_channel(company: str, role: str) -> str:
+    return f"{Channels.role}:{company}:{role}"
@@ -0,0 +1,66 @@
+# Installed packages
+import time
+from enum import Enum
+from typing import Any, List, Optional
+import orjson
+from pydantic import BaseModel, Field
+
+try:
+    import msgpack
+except ImportError:  # binary frames are optional
+    msgpack = None
+
+
+class MessageType(str, Enum):
+    notification = "notification"  # stored in the user's inbox, carries seq
+    event = "event"  # published on a channel, live only
+    reply = "reply"  # answer to a client action
+    batch = "batch"  # several messages in one frame
+
+
+class Envelope(BaseModel):
+    type: MessageType
+    channel: Optional[str] = None
+    seq: Optional[int] = None
+    data: Any = None
+    ts: float = Field(default_factory=time.time)
+
+
+class Encoding(str, Enum):
+    json = "json"
+    msgpack = "msgpack"
+
+
+# Subprotocols offered by the client during the handshake, in order of preference.
+def choose_encoding(subprotocols: List[str]) -> Optional[Encoding]:
+    for subprotocol in subprotocols:
+        if subprotocol == Encoding.msgpack and msgpack is not None:
+            return Encoding.msgpack
+        if subprotocol == Encoding.json:
+            return Encoding.json
+    return None
+
+
+def envelope(type: MessageType, data: Any, channel: Optional[str] = None, seq: Optional[int] = None) -> dict:
+    return Envelope(type=type, channel=channel, seq=seq, data=data).model_dump(mode="json")
+
+
+# One frame for the messages waiting for a socket: the message itself, or a batch of them.
+def frame(messages: List[dict]) -> dict:
+    if len(messages) == 1:
+        return messages[0]
+    return {"type": MessageType.batch.value, "messages": messages, "ts": time.time()}
+
+
+def dumps(payload: Any) -> bytes:
+    return orjson.dumps(payload, default=str)
+
+
+def loads(data) -> Any:
+    return orjson.loads(data)
+
+
+def encode(payload: Any, encoding: Encoding):
+    if encoding == Encoding.msgpack:
+        return msgpack.packb(payload, default=str)
+    return dumps(payload).decode()
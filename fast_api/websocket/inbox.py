@@ -0,0 +1,54 @@
+# Installed packages
+from datetime import datetime
+from typing import Any, List, Optional
+from pymongo import ReturnDocument
+
+# Local packages
+from ..database import notifications_collection, notification_counters_collection
+from .config import NOTIFICATION_REPLAY_LIMIT
+from .constants import Notifications
+
+
+class Inbox:
+    """Append-only log of the notifications sent to each user.
+
+    Sequence numbers come from a per-user counter document, so they grow by
+    one per notification. The counter document also holds the last sequence
+    the user acked. Entries expire after NOTIFICATION_TTL.
+    """
+
+    def __init__(self, log=notifications_collection, counters=notification_counters_collection):
+        self.log = log
+        self.counters = counters
+
+    async def append(self, user_id: str, message: Any) -> int:
+        counter = await self.counters.find_one_and_update(
+            {"_id": user_id},
+            {"$inc": {Notifications.seq: 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        seq = counter[Notifications.seq]
+        await self.log.insert_one({
+            Notifications.user_id: user_id,
+            Notifications.seq: seq,
+            Notifications.message: message,
+            Notifications.created_at: datetime.utcnow(),
+        })
+        return seq
+
+    async def ack(self, user_id: str, seq: int):
+        await self.counters.update_one(
+            {"_id": user_id}, {"$max": {Notifications.acked: seq}}
+        )
+
+    # Notifications after `after`, or after the last acked one when the client does not say.
+    async def pending(self, user_id: str, after: Optional[int] = None) -> List[dict]:
+        if after is None:
+            counter = await self.counters.find_one({"_id": user_id}, {Notifications.acked: 1})
+            after = (counter or {}).get(Notifications.acked, 0)
+        cursor = self.log.find(
+            {Notifications.user_id: user_id, Notifications.seq: {"$gt": after}},
+            {"_id": 0, Notifications.seq: 1, Notifications.message: 1},
+        ).sort(Notifications.seq, 1).limit(NOTIFICATION_REPLAY_LIMIT)
+        return [doc async for doc in cursor]
@@ -0,0 +1,22 @@
+# Installed packages
+from pymongo import IndexModel, ASCENDING
+
+# Local packages
+from ..database import notifications_collection
+from .config import NOTIFICATION_TTL
+from .constants import Notifications
+
+INDEXES = {
+    notifications_collection.name: [
+        IndexModel(
+            [(Notifications.user_id, ASCENDING), (Notifications.seq, ASCENDING)],
+            name="notifications_user_seq",
+            unique=True,
+        ),
+        IndexModel(
+            [(Notifications.created_at, ASCENDING)],
+            name="notifications_ttl",
+            expireAfterSeconds=NOTIFICATION_TTL,
+        ),
+    ],
+}
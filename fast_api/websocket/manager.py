@@ -1,29 +1,189 @@
 from fastapi import WebSocket
-from typing import Dict
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Optional, Set
+import asyncio
+import logging
+from pymongo.errors import PyMongoError
+
+from .backplane import Backplane
+from .config import WS_BATCH_WINDOW
+from .connection import Connection, SendStats
+from .envelope import Encoding, MessageType, envelope, dumps, loads
+from .inbox import Inbox
+from .constants import Channels, user_channel, warehouse_channel, order_channel, role_channel
+
+logger = logging.getLogger("websocket")
+
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
+    def __init__(self, batch_window: float = WS_BATCH_WINDOW):
+        self.batch_window = batch_window
+        # user id -> sockets of that user on this worker (tabs, devices)
+        self.active_connections: Dict[str, Set[Connection]] = defaultdict(set)
+        # channel -> sockets on this worker subscribed to it
+        self.channels: Dict[str, Set[Connection]] = defaultdict(set)
         self.total_connections = 0  # Initialize total connections counter
+        self.stats = SendStats()
+        self.backplane: Optional[Backplane] = None
+        self.inbox: Optional[Inbox] = None
+
+    # Deliver through Redis so users on other workers are reached too.
+    # Store user messages for replay.
+    async def start(self):
+        self.inbox = Inbox()
+        self.backplane = Backplane(self.deliver, self.local_users)
+        await self.backplane.start()
+
+    async def stop(self):
+        if self.backplane is not None:
+            await self.backplane.stop()
+            self.backplane = None
 
     async def get_active_connections(self):
-        return {"active_connections": list(self.active_connections.keys())}
-    async def connect(self, user_id: str, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections[user_id] = websocket
+        users = None
+        if self.backplane is not None:
+            users = await self.backplane.online_users()
+        if users is None:
+            users = list(self.active_connections.keys())
+        return {"active_connections": users, "stats": self.get_stats()}
+
+    # Users with at least one socket on this worker.
+    def local_users(self) -> list:
+        return [user_id for user_id, sockets in self.active_connections.items() if sockets]
+
+    # Send counters of this worker.
+    def get_stats(self) -> dict:
+        connections = [c for sockets in self.active_connections.values() for c in sockets]
+        return {
+            **self.stats.dict(),
+            "users": len(self.active_connections),
+            "connections": len(connections),
+            "channels": len(self.channels),
+            "queued": sum(len(connection.queue) for connection in connections),
+        }
+
+    # `encoding` is the subprotocol chosen in the handshake, if the client offered one.
+    async def connect(
+        self,
+        user_id: str,
+        websocket: WebSocket,
+        channels: Iterable[str] = (),
+        encoding: Optional[Encoding] = None,
+    ) -> Connection:
+        await websocket.accept(subprotocol=encoding.value if encoding else None)
+        connection = Connection(
+            user_id,
+            websocket,
+            self.stats,
+            encoding=encoding or Encoding.json,
+            batch_window=self.batch_window,
+            on_failure=self.evict,
+        )
+        connection.start()
+        first = not self.active_connections.get(user_id)
+        self.active_connections[user_id].add(connection)
         self.total_connections += 1  # Increment total connections
+        for channel in (user_channel(user_id), Channels.all, *channels):
+            self.subscribe(connection, channel)
+        if first and self.backplane is not None:
+            await self.backplane.add_presence(user_id)
+        return connection
 
-    async def disconnect(self, user_id: str):
-        websocket = self.active_connections.pop(user_id, None)
-        if websocket:
-            await websocket.close()
+    async def disconnect(self, connection: Connection):
+        for channel in connection.channels:
+            members = self.channels.get(channel)
+            if members is not None:
+                members.discard(connection)
+                if not members:
+                    del self.channels[channel]
+        connection.channels.clear()
+        sockets = self.active_connections.get(connection.user_id)
+        if sockets is not None and connection in sockets:
+            sockets.discard(connection)
             self.total_connections -= 1  # Decrement total connections
+            if not sockets:
+                del self.active_connections[connection.user_id]
+                if self.backplane is not None:
+                    await self.backplane.remove_presence(connection.user_id)
+        await connection.close()
+
+    def subscribe(self, connection: Connection, channel: str):
+        self.channels[channel].add(connection)
+        connection.channels.add(channel)
+
+    def unsubscribe(self, connection: Connection, channel: str):
+        members = self.channels.get(channel)
+        if members is not None:
+            members.discard(connection)
+            if not members:
+                del self.channels[channel]
+        connection.channels.discard(channel)
+
+    def evict(self, connection: Connection):
+        self.stats.evicted += 1
+        logger.warning(f"evicting slow websocket client {connection.user_id}")
+        connection.closed.set()
+        asyncio.create_task(self.disconnect(connection))
+
+    # Queue a message published on a channel for the sockets of this worker; never waits on a client.
+    def _deliver(self, channel: str, message: dict):
+        for connection in list(self.channels.get(channel, ())):
+            if connection.closed.is_set():
+                continue
+            if not connection.put(channel, message):
+                self.evict(connection)
+
+    # Called by the backplane with the encoded envelope.
+    async def deliver(self, channel: str, data: str):
+        self._deliver(channel, loads(data))
+
+    async def _publish(self, channel: str, message: dict):
+        if self.backplane is not None and await self.backplane.publish(channel, dumps(message)):
+            return
+        self._deliver(channel, message)
+
+    async def publish(self, channel: str, data: Any):
+        await self._publish(channel, envelope(MessageType.event, data, channel))
+
+    # User messages go through the inbox, so a user who is offline gets them on reconnect.
+    async def send_message(self, user_id: str, message: Any):
+        seq = None
+        if self.inbox is not None:
+            try:
+                seq = await self.inbox.append(user_id, message)
+            except PyMongoError as error:
+                logger.warning(f"inbox append for {user_id} failed: {error!r}")
+        channel = user_channel(user_id)
+        await self._publish(channel, envelope(MessageType.notification, message, channel, seq))
+
+    # Queue the user's stored notifications after `after` (default: the last acked one).
+    async def replay(self, connection: Connection, after: Optional[int] = None) -> int:
+        if self.inbox is None:
+            return 0
+        notifications = await self.inbox.pending(connection.user_id, after)
+        channel = user_channel(connection.user_id)
+        for notification in notifications:
+            connection.put(channel, envelope(
+                MessageType.notification, notification["message"], channel, notification["seq"]
+            ))
+        return len(notifications)
+
+    # Answer a client action on that socket only.
+    def reply(self, connection: Connection, data: dict):
+        connection.put(user_channel(connection.user_id), envelope(MessageType.reply, data))
+
+    async def ack(self, user_id: str, seq: int):
+        if self.inbox is not None:
+            await self.inbox.ack(user_id, seq)
+
+    async def send_to_warehouse(self, warehouse_id: str, message: Any):
+        await self.publish(warehouse_channel(warehouse_id), message)
+
+    async def send_to_order(self, order_id: str, message: Any):
+        await self.publish(order_channel(order_id), message)
 
-    async def send_message(self, user_id: str, message: str):
-        websocket = self.active_connections.get(user_id)
-        if websocket:
-            await websocket.send_text(message)
+    async def send_to_role(self, company: str, role: str, message: Any):
+        await self.publish(role_channel(company, role), message)
 
-    async def send_message_to_all(self, message: str):
-        for _,connection in self.active_connections.items():
-            await connection.send_text(message)
\ No newline at end of file
+    async def send_message_to_all(self, message: Any):
+        await self.publish(Channels.all, message)
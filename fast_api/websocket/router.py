@@ -1,8 +1,11 @@
 # Installed packages
-from fastapi import WebSocket, APIRouter,Depends
+from fastapi import WebSocket, WebSocketDisconnect, APIRouter,Depends,HTTPException,status
 from datetime import datetime
+from typing import Any, Optional
 from ..dependencies import get_current_user,check_role_access
+from ..exceptions import BaseAPIException
 from ..user.models import DBUser
+from ..user.passwords import password_pool
 from .script import migrate_data_to_include_fields_with_defaults
 from .model import MigrateDB
 
@@ -14,6 +17,9 @@ from .model import MigrateDB
 
 # Local packages
 from .manager import ConnectionManager
+from .constants import Actions
+from .envelope import choose_encoding, loads, msgpack
+from .service import SocketUser, get_socket_user, default_channels, channel_for_topic
 # from ..dependencies import get_current_user
 
 # ...
@@ -22,9 +28,12 @@ router = APIRouter(prefix="/websocket", tags=["websocket"])
 
 manager = ConnectionManager()  # Create an instance of ConnectionManager
 
+# Connections and send counters of this worker, with the counters of its password pool.
 @router.get('/', response_model=dict)
 async def home():
-    return await manager.get_active_connections()  # Call the method on the instance
+    connections = await manager.get_active_connections()  # Call the method on the instance
+    connections["password_pool"] = password_pool.stats()
+    return connections
 @router.post('/migrate/{collection_name}',response_model=dict )
 async def migrate_db(collection_name:str,
                      m_data:MigrateDB,
@@ -34,20 +43,94 @@ async def migrate_db(collection_name:str,
     await migrate_data_to_include_fields_with_defaults(collection_name,m_data)
     return {"success":"successfully migrated this data"}
 
+def _seq(value) -> Optional[int]:
+    return value if isinstance(value, int) and not isinstance(value, bool) and value >= 0 else None
+
+# Text frames are JSON, binary frames msgpack; anything else is kept as the raw text.
+def parse_inbound(message: dict) -> Any:
+    if message.get("bytes") is not None and msgpack is not None:
+        try:
+            return msgpack.unpackb(message["bytes"])
+        except ValueError:
+            return None
+    text = message.get("text")
+    try:
+        return loads(text) if text is not None else None
+    except ValueError:
+        return text
+
+# Handle a client action (subscribe, unsubscribe, ack, replay); None when the message is not one.
+async def handle_action(connection, user: Optional[SocketUser], request: Any) -> Optional[dict]:
+    if not isinstance(request, dict):
+        return None
+    action = request.get("action")
+    if action == Actions.ack:
+        seq = _seq(request.get("seq"))
+        if user is not None and seq is not None:
+            await manager.ack(user.id, seq)
+        return {"action": action, "seq": seq, "ok": user is not None and seq is not None}
+    if action == Actions.replay:
+        after = _seq(request.get("after"))
+        count = await manager.replay(connection, after) if user is not None else 0
+        return {"action": action, "count": count, "ok": user is not None}
+    if action not in (Actions.subscribe, Actions.unsubscribe):
+        return None
+    topic = str(request.get("topic", ""))
+    channel = await channel_for_topic(user, topic) if user else None
+    if channel is not None:
+        if action == Actions.subscribe:
+            manager.subscribe(connection, channel)
+        else:
+            manager.unsubscribe(connection, channel)
+    return {"action": action, "topic": topic, "ok": channel is not None}
+
+# The user behind a socket: the access token must be valid and belong to user_id.
+async def authenticate_socket(user_id: str, token: Optional[str]) -> Optional[SocketUser]:
+    if not token:
+        return None
+    try:
+        principal = await get_current_user(token)
+    except (HTTPException, BaseAPIException):
+        return None
+    if principal is None or principal.id != user_id:
+        return None
+    return await get_socket_user(user_id)
+
+# token: the user's access token, as for the HTTP API.
+# last_seq: last notification the client has seen; without it replay starts after the last acked one.
+# Clients pick the frame encoding by offering the "msgpack" or "json" subprotocol; JSON by default.
 @router.websocket("/ws/{user_id}")
-async def websocket_endpoint(websocket: WebSocket, user_id:str):
-    await manager.connect(user_id, websocket)
-    now = datetime.now()
-    current_time = now.strftime("%H:%M")
+async def websocket_endpoint(
+    websocket: WebSocket, user_id:str, token: Optional[str] = None, last_seq: Optional[int] = None
+):
+    user = await authenticate_socket(user_id, token)
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    channels = await default_channels(user)
+    encoding = choose_encoding(websocket.scope.get("subprotocols", []))
+    connection = await manager.connect(user_id, websocket, channels, encoding)
     try:
+        await manager.replay(connection, last_seq)
         while True:
-            data = await websocket.receive_text()
-            message = {"time":current_time,"client_id":user_id,"message":data}
-            await manager.send_message_to_all(message=str(message))
-
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            data = parse_inbound(message)
+            reply = await handle_action(connection, user, data)
+            if reply is not None:
+                manager.reply(connection, reply)
+                continue
+            current_time = datetime.now().strftime("%H:%M")
+            await manager.send_message_to_all(
+                {"time":current_time,"client_id":user_id,"message":data}
+            )
+    except WebSocketDisconnect:
+        pass
     except Exception as e:
         print("****",e)
-        manager.disconnect(user_id, websocket)
+    finally:
+        await manager.disconnect(connection)
 
 
 
@@ -0,0 +1,109 @@
+# Installed packages
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from typing import Optional
+
+# Local packages
+from ..database import users_collection, orders_collection, warehouses_collection
+from ..user.constants import Users, Roles
+from ..order.constants import Orders, FINISHED_STATUSES
+from ..company.constants import Company, Warehouses
+from .constants import Channels, user_channel, warehouse_channel, order_channel, role_channel
+
+# Roles that may follow every warehouse, order and role of their company
+COMPANY_WIDE_ROLES = (Roles.admin, Roles.director, Roles.manager)
+
+
+class SocketUser:
+    """What the WebSocket endpoint knows about the user behind a socket."""
+
+    def __init__(self, user: dict, warehouse_id: Optional[str]):
+        self.id = str(user[Users.id_])
+        self.email = user.get(Users.email)
+        self.role = user.get(Users.role)
+        self.company = user.get(Users.company)
+        self.warehouse = user.get(Users.warehouse)
+        self.warehouse_id = warehouse_id
+
+    @property
+    def company_wide(self) -> bool:
+        return self.role in COMPANY_WIDE_ROLES
+
+
+async def get_socket_user(user_id: str) -> Optional[SocketUser]:
+    try:
+        user = await users_collection.find_one(
+            {Users.id_: ObjectId(user_id), Users.deletionDate: {"$exists": False}},
+            {Users.email: 1, Users.role: 1, Users.company: 1, Users.warehouse: 1},
+        )
+    except InvalidId:
+        return None
+    if not user:
+        return None
+    warehouse_id = None
+    if user.get(Users.warehouse):
+        warehouse = await warehouses_collection.find_one(
+            {Company.company_name: user.get(Users.company), Warehouses.warehouse_name: user[Users.warehouse]},
+            {"_id": 1},
+        )
+        warehouse_id = str(warehouse["_id"]) if warehouse else None
+    return SocketUser(user, warehouse_id)
+
+
+# Orders a user works on, sells or receives.
+def _user_orders_query(user: SocketUser) -> dict:
+    return {
+        "$or": [
+            {Orders.warehouse_team + "." + Users.id: user.id},
+            {Orders.salesman_id: user.id},
+            {Orders.e_mail: user.email},
+        ],
+        Orders.deletionDate: {"$exists": False},
+    }
+
+
+# Channels every socket of the user joins on connect. Only orders still in progress are
+# joined; finished ones can be followed with an explicit subscribe.
+async def default_channels(user: SocketUser) -> list:
+    channels = [user_channel(user.id), Channels.all, role_channel(user.company, user.role)]
+    if user.warehouse_id:
+        channels.append(warehouse_channel(user.warehouse_id))
+    query = _user_orders_query(user)
+    query[Orders.status] = {"$nin": list(FINISHED_STATUSES)}
+    order_ids = await orders_collection.distinct("_id", query)
+    channels.extend(order_channel(str(order_id)) for order_id in order_ids)
+    return channels
+
+
+# Channel of a topic a client asked for ("warehouse:<id>", "order:<id>", "role:<name>"),
+# or None when the user may not follow it.
+async def channel_for_topic(user: SocketUser, topic: str) -> Optional[str]:
+    kind, _, value = topic.partition(":")
+    if not value:
+        return None
+    if kind == Channels.role:
+        if value == user.role or user.company_wide:
+            return role_channel(user.company, value)
+        return None
+    if kind == Channels.warehouse:
+        if value == user.warehouse_id:
+            return warehouse_channel(value)
+        if not user.company_wide:
+            return None
+        try:
+            warehouse = await warehouses_collection.find_one(
+                {"_id": ObjectId(value), Company.company_name: user.company}, {"_id": 1}
+            )
+        except InvalidId:
+            return None
+        return warehouse_channel(value) if warehouse else None
+    if kind == Channels.order:
+        try:
+            query = {"_id": ObjectId(value), Orders.recipient: user.company}
+        except InvalidId:
+            return None
+        if not user.company_wide:
+            query.update(_user_orders_query(user))
+        order = await orders_collection.find_one(query, {"_id": 1})
+        return order_channel(value) if order else None
+    return None
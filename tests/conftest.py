@@ -0,0 +1,70 @@
+import os
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+MONGO_URL = os.environ.get("TEST_MONGO_URL", "mongodb://localhost:27017")
+
+
+class MongoTestDatabase:
+    """A database of its own for one test module, dropped when the module is done."""
+
+    def __init__(self, client: MongoClient, name: str):
+        self.name = name
+        self.sync = client[name]
+
+    # Motor handle; create it inside the event loop that uses it.
+    def motor(self):
+        return AsyncIOMotorClient(MONGO_URL)[self.name]
+
+
+# Skips the tests that use it when no MongoDB answers at TEST_MONGO_URL.
+@pytest.fixture(scope="module")
+def mongo(request):
+    client = MongoClient(MONGO_URL, serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        client.close()
+        pytest.skip(f"no MongoDB at {MONGO_URL}")
+    database = MongoTestDatabase(client, "warehouse_" + request.module.__name__.rsplit(".", 1)[-1])
+    client.drop_database(database.name)
+    yield database
+    client.drop_database(database.name)
+    client.close()
+
+
+# Point the module-level collections of the given modules at a test database.
+@pytest.fixture
+def use_database(monkeypatch):
+    def patch(database, *modules):
+        for module in modules:
+            for name, value in list(vars(module).items()):
+                if name.endswith("_collection") and hasattr(value, "name"):
+                    monkeypatch.setattr(module, name, database[value.name])
+    return patch
+
+
+# Insert a warehouse with one category, zone, rack and floor holding cells of the
+# given (volume, weight); returns the warehouse document and the cell ids in order.
+async def insert_warehouse_tree(database, cells, company="company1", name="warehouse1"):
+    warehouse = {"company_name": company, "warehouse_name": name, "topology_version": 0}
+    warehouse["_id"] = (await database["warehouse"].insert_one(warehouse)).inserted_id
+    category = await database["categories"].insert_one(
+        {"warehouse_id": str(warehouse["_id"]), "category_time": 100}
+    )
+    zone = await database["zones"].insert_one({"category_id": str(category.inserted_id)})
+    rack = await database["racks"].insert_one({"zone_id": str(zone.inserted_id)})
+    floor = await database["floors"].insert_one({"rack_id": str(rack.inserted_id), "created_at": 0})
+    result = await database["cells"].insert_many([
+        {"floor_id": str(floor.inserted_id), "cell_volume": volume, "cell_weight": weight, "status": "active"}
+        for volume, weight in cells
+    ])
+    return warehouse, [str(cell_id) for cell_id in result.inserted_ids]
+
+
+@pytest.fixture
+def warehouse_tree():
+    return insert_warehouse_tree
@@ -0,0 +1,184 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+
+from fast_api.warehouse import occupancy, service, topology
+from fast_api.warehouse.exceptions import ProductsNotPlaced
+from fast_api.warehouse.service import allocate_products, place_all_products
+
+
+@pytest.fixture(autouse=True)
+def no_snapshots():
+    topology._snapshots.clear()
+    topology._locks.clear()
+    yield
+    topology._snapshots.clear()
+    topology._locks.clear()
+
+
+def product(name, volume, weight=1):
+    return {"product_name": name, "volume": volume, "weight": weight,
+            "storing_duration": 10, "conditions": None}
+
+
+# Hold the first writes until both allocations have planned against the same snapshot.
+def apply_together(monkeypatch):
+    apply = service._apply_allocation
+    arrived, both_planned = [], asyncio.Event()
+
+    async def apply_after_both(topology, plan):
+        arrived.append(plan)
+        if len(arrived) == 2:
+            both_planned.set()
+        await both_planned.wait()
+        return await apply(topology, plan)
+
+    monkeypatch.setattr(service, "_apply_allocation", apply_after_both)
+
+
+async def cells_left(database, cell_ids):
+    return [
+        (await database["cells"].find_one({"_id": ObjectId(cell_id)}))["cell_volume"]
+        for cell_id in cell_ids
+    ]
+
+
+def test_concurrent_allocations_on_one_cell_are_both_placed(mongo, use_database, warehouse_tree, monkeypatch, caplog):
+    async def run():
+        database = mongo.motor()
+        use_database(database, service, topology, occupancy)
+        warehouse, cell_ids = await warehouse_tree(database, [(10, 100), (6, 100)], name="both")
+        query = {"_id": warehouse["_id"]}
+        apply_together(monkeypatch)
+        # Both plans see the same snapshot and pick the tighter cell; the loser replans.
+        first, second = await asyncio.gather(
+            allocate_products(query, [product("a", 5)]),
+            allocate_products(query, [product("b", 5)]),
+        )
+        assert "lost cell" in caplog.text
+        assert not first["unplaced"] and not second["unplaced"]
+        placed = {first["placements"][0]["cell_id"], second["placements"][0]["cell_id"]}
+        assert placed == set(cell_ids)
+        assert await cells_left(database, cell_ids) == [5, 1]
+        assert await database["cell_occupancy"].count_documents({"cell_id": {"$in": cell_ids}}) == 2
+
+    asyncio.run(run())
+
+
+def test_concurrent_allocation_without_room_is_rejected(mongo, use_database, warehouse_tree, monkeypatch):
+    async def run():
+        database = mongo.motor()
+        use_database(database, service, topology, occupancy)
+        warehouse, cell_ids = await warehouse_tree(database, [(6, 100)], name="one")
+        query = {"_id": warehouse["_id"]}
+        apply_together(monkeypatch)
+        plans = await asyncio.gather(
+            allocate_products(query, [product("a", 5)]),
+            allocate_products(query, [product("b", 5)]),
+        )
+        assert sorted(len(plan["placements"]) for plan in plans) == [0, 1]
+        rejected = next(plan for plan in plans if plan["unplaced"])
+        assert "cell_id" not in rejected["unplaced"][0] and not rejected["cells"]
+        assert await cells_left(database, cell_ids) == [1]
+
+    asyncio.run(run())
+
+
+def test_largest_products_pick_their_cells_first(mongo, use_database, warehouse_tree):
+    async def run():
+        database = mongo.motor()
+        use_database(database, service, topology, occupancy)
+        warehouse, cell_ids = await warehouse_tree(database, [(10, 100), (6, 100), (4, 100)], name="bfd")
+        query = {"_id": warehouse["_id"]}
+        products = [product("small", 3), product("large", 6), product("medium", 4)]
+
+        preview = await allocate_products(query, products, preview=True)
+        assert preview["preview"] and await cells_left(database, cell_ids) == [10, 6, 4]
+
+        plan = await allocate_products(query, products)
+        placed = {p["product_name"]: p["cell_id"] for p in plan["placements"]}
+        assert placed == {"large": cell_ids[1], "medium": cell_ids[2], "small": cell_ids[0]}
+        assert not plan["unplaced"] and await cells_left(database, cell_ids) == [7, 0, 0]
+
+    asyncio.run(run())
+
+
+def test_lost_cell_hands_its_products_back(mongo, use_database, warehouse_tree):
+    async def run():
+        database = mongo.motor()
+        use_database(database, service, topology, occupancy)
+        warehouse, cell_ids = await warehouse_tree(database, [(10, 100), (6, 100)], name="lost")
+        snapshot = await topology.get_topology(warehouse)
+        plan = service._plan_allocation(snapshot, [product("a", 5), product("b", 8)])
+        # Another worker fills the 6 cell between planning and writing.
+        await database["cells"].update_one({"_id": ObjectId(cell_ids[1])}, {"$set": {"cell_volume": 2}})
+
+        lost = await service._apply_allocation(snapshot, plan)
+        assert [p["product_name"] for p in lost] == ["a"] and "cell_id" not in lost[0]
+        assert [p["product_name"] for p in plan["placements"]] == ["b"]
+        assert [cell["cell_id"] for cell in plan["cells"]] == [cell_ids[0]]
+        assert await cells_left(database, cell_ids) == [2, 2]
+        assert await database["cell_occupancy"].count_documents({"cell_id": cell_ids[1]}) == 0
+
+        retry = service._plan_allocation(snapshot, lost)
+        assert retry["unplaced"] == lost
+
+    asyncio.run(run())
+
+
+def test_order_is_not_placed_when_a_product_fits_nowhere(mongo, use_database, warehouse_tree):
+    async def run():
+        database = mongo.motor()
+        use_database(database, service, topology, occupancy)
+        warehouse, cell_ids = await warehouse_tree(database, [(6, 100)], name="none")
+        products = [product("fits", 5), product("too large", 7)]
+        with pytest.raises(ProductsNotPlaced) as raised:
+            await place_all_products({"_id": warehouse["_id"]}, products)
+        assert raised.value.status_code == 409
+        assert raised.value.detail["products"] == ["too large"]
+        assert all("cell_id" not in p for p in products)
+        assert await cells_left(database, cell_ids) == [6]
+        assert await database["cell_occupancy"].count_documents({"cell_id": cell_ids[0]}) == 0
+        assert (await topology.get_topology(warehouse)).engine.cell(0)["cell_volume"] == 6
+
+    asyncio.run(run())
+
+
+def test_order_line_and_product_document_share_the_occupancy(mongo, use_database, warehouse_tree):
+    async def run():
+        database = mongo.motor()
+        use_database(database, service, topology, occupancy)
+        warehouse, cell_ids = await warehouse_tree(database, [(10, 100)], name="keys")
+        line = {**product("scanner", 4), "order_id": "o1", "quantity": 2}
+        await allocate_products({"_id": warehouse["_id"]}, [line])
+        # The product document created at arrival has an id of its own.
+        document = {"_id": ObjectId(), "order_id": "o1", "product_name": "scanner"}
+
+        await occupancy.confirm_occupancy(occupancy.product_key(document), {"user_id": "u1"})
+        stored = await database["cell_occupancy"].find_one({"cell_id": cell_ids[0]})
+        assert stored["status"] == "confirmed" and stored["product_id"] == "o1:scanner"
+        await occupancy.release_occupancy(occupancy.product_key(document), 1)
+        assert await cells_left(database, cell_ids) == [8]
+        await occupancy.release_occupancy(occupancy.product_key(document))
+        assert await cells_left(database, cell_ids) == [10]
+        assert await database["cell_occupancy"].count_documents({"cell_id": cell_ids[0]}) == 0
+
+    asyncio.run(run())
+
+
+def test_cell_products_are_migrated_once(mongo, use_database):
+    async def run():
+        database = mongo.motor()
+        use_database(database, occupancy)
+        embedded = {"products": [{"order_id": "o2", "product_name": "a", "volume": 1, "weight": 1}]}
+        first = (await database["cells"].insert_one(dict(embedded))).inserted_id
+        await occupancy.migrate_cell_products()
+        assert "products" not in await database["cells"].find_one({"_id": first})
+        assert await database["cell_occupancy"].count_documents({"cell_id": str(first)}) == 1
+
+        later = (await database["cells"].insert_one(dict(embedded))).inserted_id
+        await occupancy.migrate_cell_products()
+        assert "products" in await database["cells"].find_one({"_id": later})
+
+    asyncio.run(run())
@@ -0,0 +1,39 @@
+from fast_api.warehouse.capacity import CellCapacityEngine
+
+cells = [
+    {"id": "a", "cell_volume": 10, "cell_weight": 100, "zone_id": "z1", "rack_id": "r1", "floor_id": "f1"},
+    {"id": "b", "cell_volume": 4, "cell_weight": 100, "zone_id": "z1", "rack_id": "r1", "floor_id": "f2"},
+    {"id": "c", "cell_volume": 3, "cell_weight": 100, "zone_id": "z2", "rack_id": "r2", "floor_id": "f3"},
+    {"id": "d", "cell_volume": 50, "cell_weight": 1, "zone_id": "z1", "rack_id": "r1", "floor_id": "f1", "status": "inactive"},
+]
+
+
+def test_best_fit_picks_smallest_slack_in_zone():
+    engine = CellCapacityEngine(cells)
+    row = engine.best_fit(3, 10, zone_ids=["z1"])
+    assert engine.cell(row)["id"] == "b"
+    assert engine.cell(row)["floor_id"] == "f2"
+    assert engine.best_fit(3, 10) == engine.index["c"]
+
+
+def test_inactive_and_overweight_cells_are_skipped():
+    engine = CellCapacityEngine(cells)
+    assert engine.best_fit(20, 0, zone_ids=["z1"]) is None
+    assert engine.best_fit(1, 500) is None
+
+
+def test_update_and_first_fit():
+    engine = CellCapacityEngine(cells)
+    assert engine.first_fit(1, 1, zone_ids=["z1"]) == engine.index["a"]
+    engine.update("a", {"cell_volume": 0})
+    assert engine.first_fit(1, 1, zone_ids=["z1"]) == engine.index["b"]
+    engine.consume(engine.index["b"], 4, 0)
+    assert engine.first_fit(1, 1, zone_ids=["z1"]) is None
+
+
+def test_copy_keeps_snapshot_counters():
+    engine = CellCapacityEngine(cells)
+    plan = engine.copy()
+    plan.consume(plan.index["a"], 10, 0)
+    assert plan.best_fit(5, 1, zone_ids=["z1"]) is None
+    assert engine.best_fit(5, 1, zone_ids=["z1"]) == engine.index["a"]
@@ -0,0 +1,145 @@
+import asyncio
+import hashlib
+import time
+
+import pytest
+from starlette.requests import Request
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from fast_api import redis as cache
+from fast_api.user import device_keys
+from fast_api.user.exception import InvalidDeviceSignature, ReplayedDeviceSignature
+from fast_api.user.models import Principal
+
+SECRET = "secret"
+LOADER = Principal(id="u1", email="loader@mail.ru", role="loader", company="company1", warehouse="w1")
+
+
+@pytest.fixture
+def key_table():
+    cache.set_redis(fakeredis.FakeAsyncRedis(decode_responses=True))
+    table = device_keys.device_keys
+    table._keys = {"dk_1": (SECRET, LOADER)}
+    table._loaded_at = table._checked_at = time.monotonic()
+    yield
+    table._keys = {}
+    table.expire()
+    cache.set_redis(None)
+
+
+def _request(method, path, query, body, headers):
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": query.encode(),
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+    }
+    return Request(scope, receive)
+
+
+def _signed(body=b'{"status": "ok"}', key_id="dk_1", secret=SECRET, timestamp=None, sent=None):
+    timestamp = str(int(timestamp or time.time()))
+    signature = device_keys.sign(secret, "PUT", "/reports/p1/check?x=1", timestamp, body)
+    headers = {
+        "X-Device-Key": key_id,
+        "X-Device-Timestamp": timestamp,
+        "X-Device-Signature": signature,
+        "X-Content-SHA256": hashlib.sha256(body).hexdigest(),
+    }
+    return _request("PUT", "/reports/p1/check", "x=1", body if sent is None else sent, headers)
+
+
+def test_signed_request_acts_as_the_worker(key_table):
+    assert asyncio.run(device_keys.verify_device_request(_signed())) == LOADER
+
+
+@pytest.mark.parametrize(
+    "request_kwargs",
+    [
+        {"secret": "wrong"},
+        {"key_id": "dk_unknown"},
+        {"timestamp": time.time() - 3600},
+        {"sent": b'{"status": "forged"}'},
+    ],
+)
+def test_bad_requests_are_rejected(key_table, request_kwargs):
+    with pytest.raises(InvalidDeviceSignature):
+        asyncio.run(device_keys.verify_device_request(_signed(**request_kwargs)))
+
+
+def test_a_signature_is_accepted_once(key_table):
+    timestamp = time.time()
+
+    async def scenario():
+        assert await device_keys.verify_device_request(_signed(timestamp=timestamp)) == LOADER
+        with pytest.raises(ReplayedDeviceSignature):
+            await device_keys.verify_device_request(_signed(timestamp=timestamp))
+
+    asyncio.run(scenario())
+
+
+def test_signed_multipart_upload(key_table):
+    from fastapi import Depends, FastAPI, File, Form, UploadFile
+    from fastapi.testclient import TestClient
+
+    app = FastAPI()
+    app.add_middleware(device_keys.DeviceBodyHashMiddleware)
+
+    @app.put("/reports/{product_id}/check")
+    async def check(
+        product_id: str,
+        status: str = Form(...),
+        file: UploadFile = File(None),
+        principal: Principal = Depends(device_keys.verify_device_request),
+    ):
+        return {"user": principal.id, "status": status, "file": (await file.read()).decode()}
+
+    client = TestClient(app)
+
+    def upload(scan, signed_scan=None):
+        timestamp = str(int(time.time()))
+        request = client.build_request(
+            "PUT", "/reports/p1/check", data={"status": "ok"}, files={"file": ("a.txt", scan)}
+        )
+        body = request.read()
+        if signed_scan is not None:
+            body = body.replace(scan, signed_scan)
+        request.headers.update({
+            "X-Device-Key": "dk_1",
+            "X-Device-Timestamp": timestamp,
+            "X-Device-Signature": device_keys.sign(SECRET, "PUT", "/reports/p1/check", timestamp, body),
+            "X-Content-SHA256": hashlib.sha256(body).hexdigest(),
+        })
+        return client.send(request)
+
+    response = upload(b"scan")
+    assert response.status_code == 200
+    assert response.json() == {"user": "u1", "status": "ok", "file": "scan"}
+    assert upload(b"fake", signed_scan=b"scan").status_code == 401
+
+
+def test_keys_are_only_issued_for_scanner_operators(key_table, mongo, monkeypatch):
+    from fast_api.user.exception import DeviceKeyNotAllowed, UserNotFound
+
+    async def scenario():
+        database = mongo.motor()
+        monkeypatch.setattr(device_keys, "users_collection", database.users)
+        monkeypatch.setattr(device_keys, "device_keys_collection", database.device_keys)
+        users = await database.users.insert_many([
+            {"role": "loader", "company": "company1", "warehouse": "w1"},
+            {"role": "director", "company": "company1"},
+        ])
+        loader, director = (str(user_id) for user_id in users.inserted_ids)
+        key = await device_keys.issue_device_key(loader, "company1", "scanner", "m1", "w1")
+        assert key["warehouse"] == "w1"
+        with pytest.raises(DeviceKeyNotAllowed):
+            await device_keys.issue_device_key(director, "company1", "scanner", "m1")
+        with pytest.raises(UserNotFound):
+            await device_keys.issue_device_key(loader, "company1", "scanner", "m1", "w2")
+
+    asyncio.run(scenario())
@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from fast_api.mail.templates import OrderConfirmation, OrderReady, TemplateRegistry
+
+
+def test_templates_render_typed_contexts():
+    registry = TemplateRegistry()
+    registry.load()
+    context = OrderConfirmation(order_id="o1", email="c@mail.ru", password="a<b&c", verification_code="123456")
+    subject, body = registry.render("order_confirmation", context)
+    assert subject == "Order Confirmation"
+    assert "Order ID: o1" in body and "Password: a&lt;b&amp;c" in body
+    with pytest.raises(TypeError):
+        registry.render("order_ready", context)
+
+
+def test_reminders_are_rendered_once():
+    registry = TemplateRegistry()
+    for _ in range(3):
+        subject, body = registry.render("order_ready", OrderReady(order_id="o1"), "c1", cached=True)
+    assert subject == "Your order is ready" and "order number o1 is ready" in body
+    info = registry._render_cached.cache_info()
+    assert (info.misses, info.hits) == (1, 2)
+
+
+def test_overrides_are_sandboxed():
+    registry = TemplateRegistry()
+    registry.load()
+    unsafe = registry.sandbox.from_string("{{ order_id.__class__.__mro__ }}")
+    registry._overrides[("c1", "order_ready")] = ("Ready at c1", unsafe)
+    subject, body = registry.render("order_ready", OrderReady(order_id="o1"), "c1")
+    assert subject == "Your order is ready" and "order number o1 is ready" in body
+
+
+def test_company_overrides_by_company_name(mongo):
+    async def run():
+        collection = mongo.motor()["email_templates"]
+        await collection.insert_one({
+            "company_name": "c1",
+            "template": "order_ready",
+            "subject": "Ready at c1",
+            "body": "<p>{{ order_id }} is waiting for you</p>",
+        })
+        registry = TemplateRegistry(collection=collection)
+        registry.load()
+        await registry.load_overrides()
+        context = OrderReady(order_id="o1")
+        assert registry.render("order_ready", context, "c1") == ("Ready at c1", "<p>o1 is waiting for you</p>")
+        assert registry.render("order_ready", context, "c2")[0] == "Your order is ready"
+
+    asyncio.run(run())
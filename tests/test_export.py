@@ -0,0 +1,45 @@
+import asyncio
+import gzip
+import json
+from datetime import datetime
+
+from bson.objectid import ObjectId
+
+from fast_api.export import ExportFormat, ExportParams, apply_export_filters, _rows, _gzip
+
+
+async def _docs():
+    for i in range(3):
+        yield {"_id": ObjectId(), "product_name": f"p{i}", "conditions": [{"condition_id": "c"}]}
+
+
+async def _collect(chunks):
+    return b"".join([chunk async for chunk in chunks])
+
+
+def test_ndjson_rows():
+    body = asyncio.run(_collect(_rows(_docs(), ExportFormat.ndjson, None)))
+    lines = [json.loads(line) for line in body.decode().splitlines()]
+    assert [line["product_name"] for line in lines] == ["p0", "p1", "p2"]
+    assert all("_id" not in line and line["id"] for line in lines)
+
+
+def test_gzipped_csv_rows():
+    body = asyncio.run(_collect(_gzip(_rows(_docs(), ExportFormat.csv, ["product_name"]))))
+    lines = gzip.decompress(body).decode().splitlines()
+    assert lines[0] == "id,product_name"
+    assert len(lines) == 4
+
+
+def test_export_filters():
+    params = ExportParams(
+        export_format=ExportFormat.csv,
+        date_from=datetime(2024, 1, 1),
+        date_to=None,
+        status="Order added",
+        compress=False,
+    )
+    query = apply_export_filters({"company": "company1"}, params)
+    assert query["status"] == "Order added"
+    assert query["_id"]["$gte"].generation_time.year == 2024
+    assert "$lt" not in query["_id"]
@@ -0,0 +1,21 @@
+import asyncio
+
+import pytest
+
+from fast_api.websocket.inbox import Inbox
+
+
+def test_replay_resumes_after_the_last_ack(mongo):
+    async def run():
+        database = mongo.motor()
+        inbox = Inbox(database["notifications"], database["notification_counters"])
+        seqs = [await inbox.append("u1", f"message {i}") for i in range(3)]
+        assert seqs == [1, 2, 3]
+        assert [n["seq"] for n in await inbox.pending("u1")] == [1, 2, 3]
+        await inbox.ack("u1", 2)
+        await inbox.ack("u1", 1)  # a late ack never moves the cursor back
+        assert await inbox.pending("u1") == [{"seq": 3, "message": "message 2"}]
+        assert [n["seq"] for n in await inbox.pending("u1", after=0)] == [1, 2, 3]
+        assert await inbox.pending("u2") == []
+
+    asyncio.run(run())
@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+from pymongo import DESCENDING
+
+from fast_api.indexes import reconcile_indexes, registered_indexes
+
+live = {"deletionDate": {"$exists": False}}
+
+# Filters of the hot read paths, by collection.
+QUERIES = [
+    ("orders", {"recipient": "company1", **live}),
+    ("orders", {"warehouse_name": "warehouse1", **live}),
+    ("orders", {"warehouse_name": "warehouse1", "warehouse_team.id": "u1", **live}),
+    ("orders", {"salesman_id": "u1", **live}),
+    ("orders", {"main_order_id": "o1"}),
+    ("orders", {"e_mail": "client@mail.ru", **live}),
+    ("products", {"company": "company1", **live}),
+    ("products", {"company": "company1", "warehouse": "warehouse1", **live}),
+    ("products", {"client_email": "client@mail.ru"}),
+    ("products", {"order_id": "o1", "status": "product_arrived", "warehouse": "warehouse1"}),
+    ("products", {"product_name": "apple"}),
+    ("reports", {"product_id": "p1"}),
+    ("users", {"company": "company1", **live}),
+    ("users", {"orders.order_id": "o1", **live}),
+    ("roles", {"role_name": "director", "company_name": "company1"}),
+    ("warehouse", {"company_name": "company1", "warehouse_name": "warehouse1"}),
+    ("categories", {"warehouse_id": "w1"}),
+    ("zones", {"category_id": {"$in": ["c1", "c2"]}}),
+    ("racks", {"zone_id": {"$in": ["z1"]}}),
+    ("floors", {"rack_id": {"$in": ["r1"]}}),
+    ("cells", {"floor_id": {"$in": ["f1"]}}),
+    ("cell_occupancy", {"cell_id": "cell1"}),
+    ("cell_occupancy", {"order_id": "o1"}),
+    ("email_outbox", {"status": "pending", "next_attempt_at": {"$lte": 0}}),
+    ("scheduled_jobs", {"company": "c1"}),
+]
+
+# Filters of the paginated lists, read newest first by find_page.
+PAGED_QUERIES = [
+    ("orders", {"recipient": "company1", **live}),
+    ("orders", {"warehouse_name": "warehouse1", **live}),
+    ("orders", {"warehouse_name": "warehouse1", "warehouse_team.id": "u1", **live}),
+    ("orders", {"salesman_id": "u1", **live}),
+    ("products", {"company": "company1", **live}),
+    ("products", {"company": "company1", "warehouse": "warehouse1", **live}),
+    ("products", {"company": "company1", "warehouse": "warehouse1", "warehouse_team.id": "u1", **live}),
+    ("users", {"company": "company1", **live}),
+]
+
+
+@pytest.fixture(scope="module")
+def database(mongo):
+    for collection_name, models in registered_indexes().items():
+        mongo.sync[collection_name].insert_many([{"n": i} for i in range(20)])
+        mongo.sync[collection_name].create_indexes(models)
+    return mongo.sync
+
+
+def _stages(plan: dict):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _stages(child)
+
+
+@pytest.mark.parametrize("collection_name,query", QUERIES)
+def test_hot_queries_use_an_index(database, collection_name, query):
+    explain = database[collection_name].find(query).explain()
+    stages = list(_stages(explain["queryPlanner"]["winningPlan"]))
+    assert "COLLSCAN" not in stages, f"{collection_name} {query}: {stages}"
+
+
+@pytest.mark.parametrize("collection_name,query", PAGED_QUERIES)
+def test_pages_are_read_in_index_order(database, collection_name, query):
+    explain = database[collection_name].find(query).sort("_id", -1).explain()
+    stages = list(_stages(explain["queryPlanner"]["winningPlan"]))
+    assert "COLLSCAN" not in stages and "SORT" not in stages, f"{collection_name} {query}: {stages}"
+
+
+def test_jobs_page_is_read_in_index_order(database):
+    explain = database["scheduled_jobs"].find({"company": "c1"}).sort(
+        [("next_run_at", 1), ("_id", 1)]
+    ).explain()
+    stages = list(_stages(explain["queryPlanner"]["winningPlan"]))
+    assert "COLLSCAN" not in stages and "SORT" not in stages, stages
+
+
+def test_changed_definitions_are_reconciled(database, mongo):
+    database["orders"].drop_index("orders_main_order")
+    database["orders"].create_index([("main_order_id", DESCENDING)], name="orders_main_order")
+    database["products"].drop_index("products_name")
+
+    async def run():
+        await reconcile_indexes(mongo.motor())
+
+    asyncio.run(run())
+    assert database["orders"].index_information()["orders_main_order"]["key"] == [("main_order_id", 1)]
+    assert "products_name" in database["products"].index_information()
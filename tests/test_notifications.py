@@ -0,0 +1,61 @@
+import asyncio
+
+from bson import ObjectId
+
+from fast_api import notifications
+from fast_api.user import service as user_service
+
+
+def test_team_is_notified_concurrently_with_per_recipient_results(monkeypatch):
+    in_flight, peak = 0, 0
+
+    async def deliver(*args, **kwargs):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.05)
+        in_flight -= 1
+
+    async def send_message(user_id, message):
+        await deliver()
+
+    async def send_email(email_data, key=None):
+        await deliver()
+        if email_data["recipient_email"] == "u2@mail.ru":
+            raise ConnectionError("smtp down")
+
+    async def update_status(user_ids, order_id, status, semaphore=None):
+        return {"u1", "u2"}
+
+    monkeypatch.setattr(notifications, "NOTIFY_CONCURRENCY", 4)
+    monkeypatch.setattr(notifications.manager, "send_message", send_message)
+    monkeypatch.setattr(notifications, "send_email_to_client", send_email)
+    monkeypatch.setattr(notifications, "update_users_order_status", update_status)
+    team = [{"id": f"u{i}", "email": f"u{i}@mail.ru"} for i in range(1, 6)]
+
+    results = asyncio.run(
+        notifications.notify_team(team, "o1", "approved", {"status": "approved"}, "subject", "text")
+    )
+    assert peak == 4
+    assert results[0] == {"user_id": "u1", "status_updated": True, "websocket": True, "email": True}
+    assert results[1]["email"] is False and results[1]["websocket"] is True
+    assert [r["status_updated"] for r in results] == [True, True, False, False, False]
+
+
+def test_status_is_set_for_the_members_that_have_the_order(mongo, monkeypatch):
+    async def run():
+        users = mongo.motor()["users"]
+        monkeypatch.setattr(user_service, "users_collection", users)
+        member, outsider = ObjectId(), ObjectId()
+        await users.insert_many([
+            {"_id": member, "orders": [{"order_id": "o0", "status": "added"}, {"order_id": "o1", "status": "added"}]},
+            {"_id": outsider, "orders": [{"order_id": "o2", "status": "added"}]},
+        ])
+        updated = await user_service.update_users_order_status(
+            [str(member), str(outsider)], "o1", "approved", asyncio.Semaphore(1)
+        )
+        assert updated == {str(member)}
+        orders = (await users.find_one({"_id": member}))["orders"]
+        assert [order["status"] for order in orders] == ["added", "approved"]
+
+    asyncio.run(run())
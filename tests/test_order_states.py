@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from fast_api.exceptions import LogicBrokenException
+from fast_api.order import service
+from fast_api.order.constants import Messages, OrderStatus, TRANSITIONS
+
+
+STATUSES = {value for name, value in vars(OrderStatus).items() if not name.startswith("_")}
+
+
+def test_table_covers_every_status():
+    for name in ("st_or_added", "status_salesman_recorded", "status_invoiced", "status_approve",
+                 "status_failed", "status_started", "or_compl_scs"):
+        assert getattr(Messages, name) in STATUSES
+    for target, sources in TRANSITIONS.items():
+        assert target in STATUSES and set(sources) <= STATUSES
+    reachable = set(TRANSITIONS) | {s for sources in TRANSITIONS.values() for s in sources}
+    assert STATUSES - reachable == {OrderStatus.rental}
+
+
+def test_transitions_are_conditional(mongo, monkeypatch):
+    async def run():
+        collection = mongo.motor()["orders"]
+        monkeypatch.setattr(service, "orders_collection", collection)
+        order_id = str((await collection.insert_one({"status": OrderStatus.added})).inserted_id)
+        with pytest.raises(LogicBrokenException):
+            await service.transition_order(order_id, OrderStatus.recorded)
+        await service.transition_order(order_id, OrderStatus.recording)
+        order = await service.transition_order(order_id, OrderStatus.recorded, {"salesman_id": "s1"})
+        assert (order["status"], order["salesman_id"]) == (OrderStatus.recorded, "s1")
+        with pytest.raises(LogicBrokenException):
+            await service.transition_order(order_id, OrderStatus.approved)
+        await service.transition_order(order_id, OrderStatus.invoiced)
+        results = await asyncio.gather(
+            service.transition_order(order_id, OrderStatus.approved),
+            service.transition_order(order_id, OrderStatus.failed),
+            return_exceptions=True,
+        )
+        assert sum(isinstance(result, LogicBrokenException) for result in results) == 1
+
+    asyncio.run(run())
+
+
+def test_registration_claims_the_order(mongo, monkeypatch):
+    async def run():
+        collection = mongo.motor()["orders"]
+        monkeypatch.setattr(service, "orders_collection", collection)
+        order_id = str((await collection.insert_one({"status": OrderStatus.added})).inserted_id)
+        results = await asyncio.gather(
+            service.transition_order(order_id, OrderStatus.recording),
+            service.transition_order(order_id, OrderStatus.recording),
+            return_exceptions=True,
+        )
+        assert sum(isinstance(result, LogicBrokenException) for result in results) == 1
+        with pytest.raises(LogicBrokenException):
+            await service.transition_order(order_id, OrderStatus.divided)
+        # A failed registration hands the order back and it can be claimed again.
+        await service.transition_order(order_id, OrderStatus.added)
+        await service.transition_order(order_id, OrderStatus.recording)
+        order = await service.transition_order(order_id, OrderStatus.recorded)
+        assert order["status"] == OrderStatus.recorded
+
+    asyncio.run(run())
@@ -0,0 +1,105 @@
+import asyncio
+import socket
+
+import pytest
+
+pytest.importorskip("aiosmtpd")
+from aiosmtpd.controller import Controller
+
+from fast_api.mail.constants import Emails, EmailStatus
+from fast_api.mail.indexes import INDEXES
+from fast_api.mail.outbox import MailOutbox, PermanentMailError, SmtpSender, backoff
+
+
+class Mailbox:
+    """aiosmtpd handler that keeps the messages and answers with `replies` first."""
+
+    def __init__(self, replies=()):
+        self.messages = []
+        self.peers = []
+        self.replies = list(replies)
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.replies:
+            return self.replies.pop(0)
+        self.messages.append(envelope)
+        self.peers.append(session.peer)
+        return "250 OK"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp():
+    def serve(mailbox):
+        controller = Controller(mailbox, hostname="127.0.0.1", port=_free_port())
+        controller.start()
+        controllers.append(controller)
+        return lambda: SmtpSender("127.0.0.1", controller.port, username=None, password=None)
+
+    controllers = []
+    yield serve
+    for controller in controllers:
+        controller.stop()
+
+
+def test_messages_reuse_one_smtp_connection(smtp):
+    mailbox = Mailbox()
+    sender = smtp(mailbox)()
+
+    async def run():
+        for i in range(3):
+            await sender.send("client@mail.ru", f"subject {i}", "<p>hello</p>")
+        await sender.close()
+
+    asyncio.run(run())
+    assert len(mailbox.messages) == 3
+    assert sender.connections == 1 and len(set(mailbox.peers)) == 1
+    assert mailbox.messages[0].rcpt_tos == ["client@mail.ru"]
+
+
+def test_a_5xx_answer_is_permanent(smtp):
+    sender = smtp(Mailbox(replies=["554 rejected"]))()
+
+    async def run():
+        with pytest.raises(PermanentMailError):
+            await sender.send("client@mail.ru", "subject", "body")
+        await sender.close()
+
+    asyncio.run(run())
+
+
+def test_backoff_doubles_up_to_the_limit():
+    assert [backoff(n, 30, 100) for n in range(1, 5)] == [30, 60, 100, 100]
+
+
+def test_outbox_dedupes_and_retries(mongo, smtp):
+    mailbox = Mailbox(replies=["451 try again later"])
+    sender_factory = smtp(mailbox)
+
+    async def run():
+        collection = mongo.motor()["email_outbox"]
+        await collection.create_indexes(INDEXES["email_outbox"])
+        outbox = MailOutbox(
+            collection, workers=2, sender_factory=sender_factory, retry_base=0, poll_interval=0.05
+        )
+        first = await outbox.enqueue("client@mail.ru", "Order Confirmation", "body", key="order:o1")
+        again = await outbox.enqueue("client@mail.ru", "Order Confirmation", "body", key="order:o1")
+        assert first == again
+        await outbox.enqueue("other@mail.ru", "Reminder", "body")
+        outbox.start()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + 5
+        while await collection.count_documents({Emails.status: EmailStatus.sent}) < 2:
+            assert loop.time() < deadline, "emails were not sent"
+            await asyncio.sleep(0.05)
+        await outbox.stop()
+        retried = await collection.find_one({Emails.attempts: 2})
+        assert retried is not None and "451" in retried[Emails.last_error]
+
+    asyncio.run(run())
+    assert sorted(m.rcpt_tos[0] for m in mailbox.messages) == ["client@mail.ru", "other@mail.ru"]
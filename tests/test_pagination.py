@@ -0,0 +1,36 @@
+import pytest
+from bson.objectid import ObjectId
+
+from fast_api.exceptions import InvalidPageToken, InvalidFieldSelector
+from fast_api.pagination import encode_page_token, decode_page_token, fields_projection
+
+
+def test_page_token_round_trip():
+    last_id = ObjectId()
+    token = encode_page_token(last_id)
+    assert str(last_id) not in token
+    assert decode_page_token(token) == last_id
+
+
+@pytest.mark.parametrize("token", ["", "not-a-token", encode_page_token(ObjectId())[:-3]])
+def test_invalid_page_token(token):
+    with pytest.raises(InvalidPageToken):
+        decode_page_token(token)
+
+
+def test_fields_projection():
+    assert fields_projection(None) is None
+    assert fields_projection("id") is None
+    assert fields_projection("status, products.product_name,id") == {
+        "status": 1,
+        "products.product_name": 1,
+    }
+    assert fields_projection("products.x,products_count") == {"products.x": 1, "products_count": 1}
+
+
+@pytest.mark.parametrize(
+    "fields", ["$where", "a..b", "status,{}", "products,products.x", "a.b.c,status,a.b"]
+)
+def test_invalid_fields_selector(fields):
+    with pytest.raises(InvalidFieldSelector):
+        fields_projection(fields)
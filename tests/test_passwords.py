@@ -0,0 +1,46 @@
+import asyncio
+import time
+
+from fast_api.user.passwords import PasswordPool
+
+
+# Stands in for bcrypt: holds a thread, not the event loop.
+def slow_hash(password: str) -> str:
+    time.sleep(0.05)
+    return password[::-1]
+
+
+def test_pool_caps_concurrency_and_keeps_the_loop_free():
+    async def run():
+        pool = PasswordPool(workers=2, queue_warning=100)
+        lags = []
+
+        async def ticker():
+            for _ in range(20):
+                started = time.perf_counter()
+                await asyncio.sleep(0.01)
+                lags.append(time.perf_counter() - started - 0.01)
+
+        results, _ = await asyncio.gather(
+            asyncio.gather(*(pool.run(slow_hash, f"pw{i}") for i in range(8))),
+            ticker(),
+        )
+        pool.shutdown()
+        assert results == [f"pw{i}"[::-1] for i in range(8)]
+        stats = pool.stats()
+        assert stats["completed"] == 8
+        assert stats["max_waiting"] == 6  # two started at once
+        assert stats["running"] == stats["waiting"] == 0
+        # Four rounds of 50 ms ran, but the loop never stalled for one.
+        assert max(lags) < 0.04
+
+    asyncio.run(run())
+
+
+def test_pool_counters_are_served_with_the_websocket_stats():
+    from fast_api.user.passwords import password_pool
+    from fast_api.websocket import router as ws_router
+
+    stats = asyncio.run(ws_router.home())
+    assert stats["password_pool"]["workers"] == password_pool.workers
+    assert "connections" in stats["stats"]
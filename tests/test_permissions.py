@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from fast_api import redis as cache
+from fast_api.user import permissions
+from fast_api.user.permissions import PermissionRegistry, compile_permissions
+
+
+@pytest.fixture
+def fake_redis():
+    cache.set_redis(fakeredis.FakeAsyncRedis(decode_responses=True))
+    yield
+    cache.set_redis(None)
+
+
+def test_compile_permissions():
+    role = {"permissions": [{"permission_name": "get_role"}, {"permission_name": "update_role"}, "broken"]}
+    assert compile_permissions(role) == frozenset({"get_role", "update_role"})
+    assert compile_permissions({}) == frozenset()
+    assert compile_permissions(None) is None
+
+
+def test_other_worker_write_clears_registry(fake_redis):
+    async def run():
+        registry = PermissionRegistry(check_interval=0)
+        await registry.sync()
+        registry.put("company1", "loader", frozenset({"get_role"}))
+        registry.put("company1", "ghost", None)
+        assert registry.get("company1", "loader") == frozenset({"get_role"})
+        assert registry.get("company1", "ghost") is None
+        assert registry.get("company1", "director") is False
+
+        await registry.sync()
+        assert len(registry) == 2
+        # Another worker changed a role.
+        await permissions.invalidate_permissions()
+        await registry.sync()
+        assert len(registry) == 0
+
+    asyncio.run(run())
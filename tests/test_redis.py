@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from fast_api import redis as cache
+
+
+@pytest.fixture
+def fake_redis():
+    cache.set_redis(fakeredis.FakeAsyncRedis(decode_responses=True))
+    yield
+    cache.set_redis(None)
+
+
+def test_get_set_and_delete(fake_redis):
+    async def run():
+        assert await cache.cache_get("missing") is None
+        assert await cache.cache_set("user:1", {"role": "admin"}, ttl=60)
+        assert await cache.cache_get("user:1") == {"role": "admin"}
+        assert await cache.cache_delete("user:1") == 1
+        assert await cache.cache_get("user:1") is None
+
+    asyncio.run(run())
+
+
+def test_pipelined_many(fake_redis):
+    async def run():
+        await cache.cache_set_many({"a": 1, "b": [2]}, ttl=60)
+        assert await cache.cache_get_many(["a", "b", "c"]) == {"a": 1, "b": [2], "c": None}
+        assert await cache.cache_incr("version") == 1
+
+    asyncio.run(run())
+
+
+def test_unreachable_redis_is_a_cache_miss():
+    cache.set_redis(cache.Redis(host="127.0.0.1", port=1, socket_connect_timeout=0.1))
+    try:
+        async def run():
+            assert await cache.cache_get("key", timeout=0.2) is None
+            assert await cache.cache_set("key", 1, timeout=0.2) is False
+
+        asyncio.run(run())
+    finally:
+        cache.set_redis(None)
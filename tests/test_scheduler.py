@@ -0,0 +1,73 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from fast_api.pagination import CursorParams
+from fast_api.scheduler.jobs import JobScheduler, func_ref, next_run, resolve
+
+
+calls = []
+
+
+async def remind(order_id):
+    calls.append(order_id)
+
+
+def test_jobs_are_stored_by_reference():
+    assert resolve(func_ref(remind)) is remind
+
+
+def test_missed_runs_are_coalesced():
+    start = datetime(2023, 9, 1, 10, 0)
+    assert next_run(start, 1800, start) == datetime(2023, 9, 1, 10, 30)
+    assert next_run(start, 1800, datetime(2023, 9, 1, 12, 10)) == datetime(2023, 9, 1, 12, 30)
+
+
+def test_each_due_job_runs_on_one_worker(mongo):
+    async def run():
+        collection = mongo.motor()["scheduled_jobs"]
+        worker_a, worker_b = JobScheduler(collection), JobScheduler(collection)
+        now = datetime.now()
+        await worker_a.add_job(
+            remind, "order_o1_notification", timedelta(minutes=30),
+            start_at=now - timedelta(minutes=1), args=["o1"], company="c1",
+        )
+        await worker_a.add_job(
+            remind, "order_o2_notification", timedelta(minutes=30),
+            start_at=now - timedelta(minutes=1), end_at=now, args=["o2"], company="c2",
+        )
+        ran = await asyncio.gather(worker_a.run_pending(), worker_b.run_pending())
+        assert sum(ran) == 2 and sorted(calls) == ["o1", "o2"]
+        # o2 has passed its end and is gone; o1 waits for its next run
+        jobs = await worker_b.get_jobs()
+        assert [job["id"] for job in jobs] == ["order_o1_notification"]
+        assert jobs[0]["next_run_at"] > now and jobs[0]["runs"] == 1
+        assert await worker_b.get_jobs(company="c2") == []
+
+    asyncio.run(run())
+
+
+def test_jobs_are_paged_soonest_first(mongo):
+    async def run():
+        collection = mongo.motor()["paged_jobs"]
+        scheduler = JobScheduler(collection)
+        start = datetime(2023, 9, 1, 10, 0)
+        # Two jobs share a run time, so the page boundary falls between equal keys.
+        for i, minutes in enumerate([30, 10, 20, 10, 40]):
+            await scheduler.add_job(
+                remind, f"job{i}", timedelta(hours=1),
+                start_at=start + timedelta(minutes=minutes), company="c1",
+            )
+        await scheduler.add_job(remind, "other", timedelta(hours=1), start_at=start, company="c2")
+        ids, token = [], None
+        while True:
+            page = await scheduler.get_jobs_page("c1", CursorParams(limit=2, page_token=token, include_total=False))
+            ids.extend(job["id"] for job in page["items"])
+            token = page["next_page_token"]
+            if token is None:
+                break
+        assert ids == ["job1", "job3", "job2", "job0", "job4"]
+        assert "args" not in page["items"][0]
+
+    asyncio.run(run())
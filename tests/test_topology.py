@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from fast_api.warehouse import topology
+from fast_api.warehouse.topology import WarehouseTopology, build_topology, get_topology, invalidate_topology
+
+
+@pytest.fixture(autouse=True)
+def no_snapshots():
+    topology._snapshots.clear()
+    topology._locks.clear()
+    yield
+    topology._snapshots.clear()
+    topology._locks.clear()
+
+
+def test_zone_is_chosen_by_duration_and_conditions():
+    snapshot = WarehouseTopology("w1", 0)
+    snapshot.categories = [{"id": "short", "category_time": 5}, {"id": "long", "category_time": 50}]
+    snapshot.zones = {"short": [{"id": "z1"}], "long": [{"id": "z2"}, {"id": "z3"}]}
+    snapshot.conditions = {"z3": {"cold"}}
+    assert snapshot.find_zone(3, None) == ("short", "z1")
+    assert snapshot.find_zone(10, None) == ("long", "z2")
+    assert snapshot.find_zone(10, [{"condition_id": "cold"}]) == ("long", "z3")
+    assert snapshot.find_zone(10, [{"condition_id": "dry"}]) is None
+    assert snapshot.find_zone(100, None) is None
+
+
+def test_concurrent_requests_build_one_snapshot_per_version(monkeypatch):
+    builds = []
+
+    async def build(warehouse_id, version):
+        builds.append(version)
+        await asyncio.sleep(0.01)
+        return WarehouseTopology(warehouse_id, version)
+
+    monkeypatch.setattr(topology, "build_topology", build)
+
+    async def run():
+        warehouse = {"_id": "w1", "topology_version": 3}
+        snapshots = await asyncio.gather(*[get_topology(warehouse) for _ in range(10)])
+        assert len({id(snapshot) for snapshot in snapshots}) == 1 and builds == [3]
+        assert await get_topology(warehouse) is snapshots[0]
+        moved = await get_topology({"_id": "w1", "topology_version": 4})
+        assert moved.version == 4 and builds == [3, 4]
+
+    asyncio.run(run())
+
+
+def test_snapshot_is_built_from_the_tree_and_dropped_on_invalidation(mongo, use_database, warehouse_tree):
+    async def run():
+        database = mongo.motor()
+        use_database(database, topology)
+        warehouse, cell_ids = await warehouse_tree(database, [(10, 100), (4, 100)])
+        warehouse_id = str(warehouse["_id"])
+
+        snapshot = await build_topology(warehouse_id, 0)
+        category_id, zone_id = snapshot.find_zone(50, None)
+        assert snapshot.engine.ids == cell_ids
+        assert snapshot.engine.cell(snapshot.engine.best_fit(3, 1, zone_ids=[zone_id]))["id"] == cell_ids[1]
+
+        assert await get_topology(warehouse) is await get_topology(warehouse)
+        await invalidate_topology(warehouse_id)
+        warehouse = await database["warehouse"].find_one({"_id": warehouse["_id"]})
+        assert warehouse["topology_version"] == 1
+        assert (await get_topology(warehouse)).version == 1
+
+    asyncio.run(run())
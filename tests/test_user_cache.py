@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from fast_api import redis as cache
+from fast_api.user import cache as user_cache
+from fast_api.user.cache import UserCache
+from fast_api.user.models import DBUser
+
+
+def _user(email="worker@mail.ru"):
+    return DBUser(
+        id="u1",
+        firstname="Ivan",
+        lastname="Ivanov",
+        email=email,
+        telephone="+77000000000",
+        role="loader",
+        company="company1",
+        hashed_password="hash",
+    )
+
+
+@pytest.fixture
+def fake_redis():
+    cache.set_redis(fakeredis.FakeAsyncRedis(decode_responses=True))
+    user_cache.local_users.clear()
+    yield
+    user_cache.local_users.clear()
+    cache.set_redis(None)
+
+
+def test_lru_evicts_least_recently_used():
+    users = UserCache(size=2, ttl=60)
+    users.put("a", _user("a@mail.ru"))
+    users.put("b", _user("b@mail.ru"))
+    users.get("a")
+    users.put("c", _user("c@mail.ru"))
+    assert users.get("b") is None
+    assert users.get("a") is not None and users.get("c") is not None
+
+
+def test_expired_entries_are_misses():
+    users = UserCache(size=2, ttl=-1)
+    users.put("a", _user())
+    assert users.get("a") is None
+    assert len(users) == 0
+
+
+def test_shared_level_and_invalidation(fake_redis):
+    async def run():
+        user = _user()
+        cached = await user_cache.cache_user(user.email, user)
+        assert "hashed_password" not in await cache.cache_get("user:" + user.email)
+        # Another worker only has the shared copy.
+        user_cache.local_users.clear()
+        assert await user_cache.get_cached_user(user.email) == cached
+        assert cached.id == user.id and not hasattr(cached, "hashed_password")
+        await user_cache.invalidate_users([user.email])
+        assert await user_cache.get_cached_user(user.email) is None
+
+    asyncio.run(run())
+
+
+def test_claims_token_is_revoked_by_invalidation(fake_redis):
+    from fastapi import HTTPException
+    from fast_api.dependencies import principal_from_claims
+    from fast_api.user.utils import token_claims
+
+    async def run():
+        user = _user()
+        payload = {"sub": user.email, **await token_claims(user)}
+        principal = await principal_from_claims(user.email, payload)
+        assert (principal.id, principal.role, principal.company) == ("u1", "loader", "company1")
+        await user_cache.invalidate_users([user.email])
+        with pytest.raises(HTTPException) as error:
+            await principal_from_claims(user.email, payload)
+        assert error.value.status_code == 401
+
+    asyncio.run(run())
+
+
+def test_revoked_claims_token_stays_revoked_after_eviction(fake_redis):
+    from fastapi import HTTPException
+    from fast_api.dependencies import principal_from_claims
+    from fast_api.user.utils import token_claims
+    from fast_api.user.constants import Token
+    from fast_api.user.versions import _key
+
+    async def run():
+        user = _user()
+        payload = {"sub": user.email, **await token_claims(user)}
+        await user_cache.invalidate_users([user.email])
+        # Redis drops the counter, then a new token restarts it
+        await cache.cache_delete(_key(user.email))
+        assert (await token_claims(user))[Token.version] > payload[Token.version]
+        with pytest.raises(HTTPException) as error:
+            await principal_from_claims(user.email, payload)
+        assert error.value.status_code == 401
+
+    asyncio.run(run())
@@ -0,0 +1,291 @@
+import asyncio
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from fast_api import redis as cache
+from fast_api.websocket import connection as ws_connection
+from fast_api.websocket.connection import Connection, OverflowPolicy, SendStats
+from fast_api.websocket.constants import order_channel, role_channel, warehouse_channel
+from fast_api.websocket.envelope import Encoding, choose_encoding, loads, msgpack
+from fast_api.websocket.manager import ConnectionManager
+from fast_api.order.constants import OrderStatus
+from fast_api.websocket import service as ws_service
+from fast_api.websocket.service import SocketUser, channel_for_topic, default_channels
+
+
+class FakeWebSocket:
+    def __init__(self, delay=0.0):
+        self.sent = []
+        self.delay = delay
+        self.closed = False
+
+    async def accept(self, subprotocol=None):
+        self.subprotocol = subprotocol
+
+    async def send_text(self, message):
+        await asyncio.sleep(self.delay)
+        self.sent.append(message)
+
+    async def send_bytes(self, message):
+        await asyncio.sleep(self.delay)
+        self.sent.append(message)
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_redis():
+    cache.set_redis(fakeredis.FakeAsyncRedis(decode_responses=True))
+    yield
+    cache.set_redis(None)
+
+
+# Envelopes received by a socket, with batch frames unpacked.
+def _messages(socket):
+    messages = []
+    for frame in socket.sent:
+        frame = loads(frame)
+        messages.extend(frame["messages"] if frame["type"] == "batch" else [frame])
+    return messages
+
+
+def _data(socket):
+    return [message["data"] for message in _messages(socket)]
+
+
+async def _wait_for(predicate, timeout=2.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not predicate():
+        assert loop.time() < deadline, "message was not delivered"
+        await asyncio.sleep(0.01)
+
+
+def test_message_reaches_a_user_on_another_worker(fake_redis):
+    async def run():
+        worker_a, worker_b = ConnectionManager(), ConnectionManager()
+        await worker_a.start()
+        await worker_b.start()
+        await worker_a.backplane.subscribed.wait()
+        await worker_b.backplane.subscribed.wait()
+        worker_a.inbox = worker_b.inbox = None  # the inbox has its own test against MongoDB
+
+        socket = FakeWebSocket()
+        connection = await worker_b.connect("u1", socket, [warehouse_channel("w1")])
+        await worker_a.send_message("u1", "hello")
+        await worker_a.send_to_warehouse("w1", "to the warehouse")
+        await worker_a.send_message("u2", "nobody")
+        await _wait_for(lambda: len(_messages(socket)) == 2)
+        hello, warehouse = _messages(socket)
+        assert (hello["type"], hello["data"]) == ("notification", "hello")
+        assert (warehouse["type"], warehouse["data"]) == ("event", "to the warehouse")
+        assert warehouse["channel"] == warehouse_channel("w1")
+        assert (await worker_a.get_active_connections())["active_connections"] == ["u1"]
+
+        await worker_b.disconnect(connection)
+        assert (await worker_a.get_active_connections())["active_connections"] == []
+        await worker_a.stop()
+        await worker_b.stop()
+
+    asyncio.run(run())
+
+
+def test_heartbeat_restores_presence_lost_by_redis(fake_redis):
+    async def run():
+        worker = ConnectionManager()
+        await worker.start()
+        await worker.backplane.subscribed.wait()
+        worker.inbox = None
+        await worker.connect("u1", FakeWebSocket())
+        await worker.connect("u2", FakeWebSocket())
+        await cache.get_redis().flushall()  # e.g. Redis restarted without persistence
+        assert (await worker.get_active_connections())["active_connections"] == []
+
+        await worker.backplane._heartbeat()
+        assert (await worker.get_active_connections())["active_connections"] == ["u1", "u2"]
+        assert await cache.get_redis().ttl(worker.backplane.presence_key) > 0
+        await worker.stop()
+
+    asyncio.run(run())
+
+
+def test_without_redis_delivery_stays_local():
+    async def run():
+        manager = ConnectionManager()
+        socket = FakeWebSocket()
+        await manager.connect("u1", socket)
+        await manager.send_message("u1", "hello")
+        await manager.send_message_to_all("everyone")
+        await _wait_for(lambda: len(_messages(socket)) == 2)
+        assert _data(socket) == ["hello", "everyone"]
+
+    asyncio.run(run())
+
+
+def test_slow_client_does_not_hold_up_the_others():
+    async def run():
+        manager = ConnectionManager(batch_window=0)
+        slow, fast = FakeWebSocket(delay=10), FakeWebSocket()
+        slow_connection = await manager.connect("slow", slow)
+        fast_connection = await manager.connect("fast", fast)
+        for i in range(3):
+            await manager.send_message_to_all(str(i))
+            await asyncio.sleep(0.01)
+        await _wait_for(lambda: len(_messages(fast)) == 3, timeout=0.5)
+        assert manager.get_stats()["queued"] == 2  # one is being sent to the slow client
+        await manager.disconnect(slow_connection)
+        await manager.disconnect(fast_connection)
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize(
+    "policy,expected,dropped,coalesced",
+    [
+        (OverflowPolicy.drop_oldest, [{"n": "a:2"}, {"n": "b:1"}, {"n": "a:3"}], 1, 0),
+        (OverflowPolicy.drop_newest, [{"n": "a:1"}, {"n": "a:2"}, {"n": "b:1"}], 1, 0),
+        (OverflowPolicy.coalesce, [{"n": "a:3"}, {"n": "a:2"}, {"n": "b:1"}], 0, 1),
+    ],
+)
+def test_overflow_policies(policy, expected, dropped, coalesced):
+    async def run():
+        stats = SendStats()
+        connection = Connection("u1", FakeWebSocket(), stats, queue_size=3, policy=policy)
+        for channel, message in [("a", "a:1"), ("a", "a:2"), ("b", "b:1"), ("a", "a:3")]:
+            assert connection.put(channel, {"n": message})
+        assert [message for _, message in connection.queue] == expected
+        assert (stats.dropped, stats.coalesced) == (dropped, coalesced)
+
+    asyncio.run(run())
+
+
+def test_client_over_the_limit_is_evicted(monkeypatch):
+    monkeypatch.setattr(ws_connection, "WS_SLOW_CONSUMER_SECONDS", 0)
+
+    async def run():
+        manager = ConnectionManager(batch_window=0)
+        socket = FakeWebSocket(delay=10)
+        connection = await manager.connect("u1", socket)
+        connection.queue_size = 1
+        for i in range(4):
+            await manager.send_message("u1", str(i))
+            await asyncio.sleep(0.01)
+        await _wait_for(lambda: "u1" not in manager.active_connections)
+        assert manager.stats.evicted == 1
+        assert socket.closed
+
+    asyncio.run(run())
+
+
+def test_client_whose_send_times_out_is_evicted(monkeypatch):
+    monkeypatch.setattr(ws_connection, "WS_SEND_TIMEOUT", 0.05)
+
+    async def run():
+        manager = ConnectionManager(batch_window=0)
+        socket = FakeWebSocket(delay=10)
+        await manager.connect("u1", socket)
+        await manager.send_message("u1", "never arrives")
+        await _wait_for(lambda: "u1" not in manager.active_connections)
+        assert (manager.stats.evicted, manager.stats.send_errors) == (1, 1)
+        assert socket.closed
+
+    asyncio.run(run())
+
+
+def test_topics_reach_only_their_subscribers():
+    async def run():
+        manager = ConnectionManager()
+        tab, phone, other = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        tab_connection = await manager.connect("u1", tab, [order_channel("o1")])
+        await manager.connect("u1", phone)
+        await manager.connect("u2", other)
+        manager.subscribe(await manager.connect("u3", FakeWebSocket()), order_channel("o2"))
+
+        await manager.send_message("u1", "to both sockets")
+        await manager.send_to_order("o1", "order news")
+        await _wait_for(lambda: len(_messages(tab)) == 2 and len(_messages(phone)) == 1)
+        assert _data(tab) == ["to both sockets", "order news"]
+        assert _data(phone) == ["to both sockets"] and other.sent == []
+
+        await manager.disconnect(tab_connection)
+        assert order_channel("o1") not in manager.channels
+        assert manager.get_stats()["users"] == 3
+        assert len(manager.active_connections["u1"]) == 1
+
+    asyncio.run(run())
+
+
+def test_role_topics_stay_inside_the_company():
+    async def run():
+        user = SocketUser({"_id": "u1", "role": "loader", "company": "c1", "warehouse": "w"}, "w1")
+        assert await channel_for_topic(user, "role:loader") == role_channel("c1", "loader")
+        assert await channel_for_topic(user, "role:director") is None
+        assert await channel_for_topic(user, "warehouse:w1") == warehouse_channel("w1")
+        assert await channel_for_topic(user, "warehouse:w2") is None
+        assert await channel_for_topic(user, "nonsense") is None
+
+    asyncio.run(run())
+
+
+def test_only_orders_in_progress_are_joined_on_connect(mongo, monkeypatch):
+    async def run():
+        orders = mongo.motor()["orders"]
+        monkeypatch.setattr(ws_service, "orders_collection", orders)
+        result = await orders.insert_many([
+            {"salesman_id": "u1", "status": status}
+            for status in (OrderStatus.recorded, OrderStatus.completed, OrderStatus.failed, OrderStatus.divided)
+        ])
+        user = SocketUser({"_id": "u1", "role": "salesman", "company": "c1"}, None)
+        channels = await default_channels(user)
+        joined = [channel for channel in channels if channel.startswith(order_channel(""))]
+        assert joined == [order_channel(str(result.inserted_ids[0]))]
+
+    asyncio.run(run())
+
+
+def test_messages_within_the_window_share_a_frame():
+    async def run():
+        manager = ConnectionManager(batch_window=0.05)
+        socket = FakeWebSocket()
+        await manager.connect("u1", socket)
+        for i in range(5):
+            await manager.send_message_to_all(i)
+        await _wait_for(lambda: len(_messages(socket)) == 5)
+        assert len(socket.sent) == 1 and loads(socket.sent[0])["type"] == "batch"
+        assert _data(socket) == [0, 1, 2, 3, 4]
+        assert (manager.stats.sent, manager.stats.frames) == (5, 1)
+
+    asyncio.run(run())
+
+
+def test_encoding_is_negotiated_in_the_handshake():
+    assert choose_encoding([]) is None
+    assert choose_encoding(["json"]) == Encoding.json
+    expected = Encoding.msgpack if msgpack is not None else Encoding.json
+    assert choose_encoding(["msgpack", "json"]) == expected
+
+
+@pytest.mark.parametrize("query", ["", "?token=bad", "?token=other"])
+def test_unauthenticated_sockets_are_refused(monkeypatch, query):
+    from fastapi import FastAPI, HTTPException
+    from fastapi.testclient import TestClient
+    from starlette.websockets import WebSocketDisconnect
+
+    from fast_api.user.models import Principal
+    from fast_api.websocket import router as ws_router
+
+    async def get_current_user(token):
+        if token != "other":
+            raise HTTPException(status_code=401)
+        return Principal(id="u2", email="other@mail.ru", role="admin", company="company1")
+
+    monkeypatch.setattr(ws_router, "get_current_user", get_current_user)
+    app = FastAPI()
+    app.include_router(ws_router.router)
+    with pytest.raises(WebSocketDisconnect) as error:
+        with TestClient(app).websocket_connect("/websocket/ws/u1" + query) as socket:
+            socket.receive_text()
+    assert error.value.code == 1008